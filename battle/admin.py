@@ -4,6 +4,8 @@ from battle.models import (
     Battle,
     BattleTeam,
     BattleCoreState,
+    NPCBattleTeam,
+    NPCBattleCoreState,
     BattleTurn,
     BattleAction,
     DiceRoll,
@@ -14,6 +16,8 @@ from battle.models import (
     NPCCore,
     NPCCoreEquippedMove,
     OperatorArenaProgress,
+    SettlementJob,
+    BattleWorker,
 )
 
 
@@ -31,7 +35,7 @@ class BattleTurnInline(admin.TabularInline):
 
 @admin.register(Battle)
 class BattleAdmin(admin.ModelAdmin):
-    list_display = ("id", "battle_type", "status", "operator_1", "operator_2", "winner", "current_turn", "created_at")
+    list_display = ("id", "battle_type", "status", "operator_1", "operator_2", "winner", "current_turn", "idle_deadline", "created_at")
     list_filter = ("battle_type", "status", "created_at")
     search_fields = ("id", "operator_1__call_sign", "operator_2__call_sign")
     readonly_fields = ("id", "created_at", "updated_at")
@@ -53,6 +57,21 @@ class BattleTeamAdmin(admin.ModelAdmin):
     inlines = [BattleCoreStateInline]
 
 
+class NPCBattleCoreStateInline(admin.TabularInline):
+    model = NPCBattleCoreState
+    extra = 0
+    readonly_fields = ("id",)
+
+
+@admin.register(NPCBattleTeam)
+class NPCBattleTeamAdmin(admin.ModelAdmin):
+    list_display = ("id", "battle", "call_sign", "difficulty_rating", "energy_pool", "physical_pool", "active_core_index")
+    list_filter = ("battle__status",)
+    search_fields = ("call_sign",)
+    readonly_fields = ("id", "created_at", "updated_at")
+    inlines = [NPCBattleCoreStateInline]
+
+
 @admin.register(BattleCoreState)
 class BattleCoreStateAdmin(admin.ModelAdmin):
     list_display = ("id", "team", "core", "position", "current_hp", "max_hp", "is_knocked_out")
@@ -246,3 +265,20 @@ class OperatorArenaProgressAdmin(admin.ModelAdmin):
     list_filter = ('current_rank',)
     search_fields = ('operator__call_sign',)
     readonly_fields = ('id', 'created_at', 'updated_at')
+
+
+@admin.register(SettlementJob)
+class SettlementJobAdmin(admin.ModelAdmin):
+    """Arena results queued for settlement."""
+    list_display = ("id", "operator", "won", "status", "battle", "created_at", "settled_at")
+    list_filter = ("status", "won")
+    search_fields = ("operator__call_sign",)
+    readonly_fields = ("id", "created_at", "updated_at")
+
+
+@admin.register(BattleWorker)
+class BattleWorkerAdmin(admin.ModelAdmin):
+    """Server processes in the battle affinity ring."""
+    list_display = ("worker_id", "url", "heartbeat_at")
+    search_fields = ("worker_id", "url")
+    readonly_fields = ("created_at", "updated_at")
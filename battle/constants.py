@@ -1,5 +1,9 @@
 # battle/constants.py
 # Constants for the Battle system
+#
+# The runtime tunables from the NPC AI section on are read with
+# getattr(settings, NAME, DEFAULT), so each can be overridden in Django
+# settings under the same name.
 
 # Battle Types
 BATTLE_TYPE_PVP = "PVP"
@@ -242,3 +246,72 @@ DEFENSIVE_EFFECTS = {'guard', 'shield_wall', 'aegis', 'armor', 'dodge', 'time_di
 
 # Effect types that are debuffs on the enemy
 DEBUFF_EFFECTS = {'accuracy_down', 'stun', 'confusion'}
+
+# ──────────────────────────────────────────────
+# NPC AI
+# ──────────────────────────────────────────────
+# The lookahead policy (battle/services/npc_search.py) scales with
+# NPCOperator.difficulty_rating (1-10): how many NPC decisions it looks
+# ahead, how many positions it may search, and how often it falls back to
+# the simple heuristic policy instead.
+NPC_AI_MAX_DEPTH = 4                # depth = min(MAX_DEPTH, 1 + rating // 3)
+NPC_AI_NODES_PER_RATING = 200       # search nodes per decision, per rating point (~4 ms)
+NPC_AI_MAX_NODES = 2000             # hard cap per decision, whatever the rating (~40 ms)
+NPC_AI_TARGET_MS = 100              # worst-case decision time the node budgets are sized for
+NPC_AI_HEURISTIC_CHANCE = {1: 0.5, 2: 0.35, 3: 0.2, 4: 0.1}  # rating -> chance to skip the search
+
+# ──────────────────────────────────────────────
+# Engine pool
+# ──────────────────────────────────────────────
+# Turn resolution runs on its own bounded thread pool instead of the default
+# sync_to_async executor (battle/services/engine_pool.py); the queue limits
+# are where a busy process starts refusing turns instead of queueing them.
+BATTLE_ENGINE_WORKERS = 4           # engine threads per process
+BATTLE_ENGINE_MAX_QUEUE = 64        # turns waiting for a thread before new ones are refused
+BATTLE_NPC_AI_PROCESSES = 0         # NPC search worker processes (0: search on the engine thread)
+BATTLE_NPC_AI_MAX_QUEUE = 16        # searches waiting for a process before they run in-thread
+
+# ──────────────────────────────────────────────
+# Worker affinity
+# ──────────────────────────────────────────────
+# With BATTLE_WORKER_URL set, server processes share battles through a
+# consistent-hash ring (battle/services/affinity.py). BATTLE_RING_REPLICAS
+# must be the same on every worker or they disagree on owners.
+BATTLE_WORKER_HEARTBEAT = 5         # seconds between heartbeats / ring refreshes
+BATTLE_WORKER_TIMEOUT = 15          # seconds without a heartbeat before a worker leaves the ring
+BATTLE_RING_REPLICAS = 64           # virtual points per worker on the ring
+
+# ──────────────────────────────────────────────
+# Turn journal
+# ──────────────────────────────────────────────
+# BattleTurn rows journal each battle's state (battle/services/turn_log.py);
+# a full snapshot is stored every JOURNAL_SNAPSHOT_INTERVAL turns and deltas
+# in between, which battle/services/recovery.py replays after a crash.
+JOURNAL_SNAPSHOT_INTERVAL = 10      # turns between full state snapshots
+BATTLE_RECOVERY_BATCH = 100         # ACTIVE battles checked per recovery transaction batch
+
+# ──────────────────────────────────────────────
+# Reconnect catch-up
+# ──────────────────────────────────────────────
+# Each battle keeps its recent outbound messages so a reconnecting client
+# gets only what it missed (battle/services/event_buffer.py); one that has
+# fallen further behind than the buffer gets the full state instead.
+BATTLE_EVENT_BUFFER_SIZE = 64       # messages kept per battle
+BATTLE_EVENT_BUFFERS = 1024         # battles whose buffers a process keeps
+
+# ──────────────────────────────────────────────
+# Idle battles
+# ──────────────────────────────────────────────
+# ACTIVE battles with no command for their idle timeout are marked
+# ABANDONED (and settled as arena losses) by battle/services/reaper.py.
+# Battle.idle_timeout overrides BATTLE_IDLE_TIMEOUT per battle.
+BATTLE_IDLE_TIMEOUT = 1800          # seconds without a command before a battle is abandoned
+BATTLE_REAPER_INTERVAL = 60         # seconds between sweeps
+BATTLE_REAPER_BATCH = 500           # battles abandoned per transaction
+
+# ──────────────────────────────────────────────
+# Settlement
+# ──────────────────────────────────────────────
+# Arena results are queued as SettlementJob rows and applied in batches
+# (battle/services/settlement.py).
+SETTLEMENT_BATCH = 200              # jobs applied per transaction
@@ -0,0 +1,24 @@
+# battle/defaults.py
+"""
+Field defaults for battle models.
+
+Migrations reference these callables by import path, so they live apart
+from battle/services and import nothing from it.
+"""
+import secrets
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from battle.constants import BATTLE_IDLE_TIMEOUT
+
+
+def new_seed() -> int:
+    """A fresh RNG seed that fits a signed 64-bit database column."""
+    return secrets.randbits(63)
+
+
+def idle_deadline() -> datetime:
+    """Idle deadline of a battle created now, at the default idle timeout."""
+    return timezone.now() + timedelta(seconds=getattr(settings, 'BATTLE_IDLE_TIMEOUT', BATTLE_IDLE_TIMEOUT))
@@ -0,0 +1,30 @@
+# battle/lifespan.py
+"""
+ASGI lifespan handler for battle workers.
+
+On startup the worker begins its background recovery pass over the
+battles it owns (battle/services/recovery.py). On shutdown the worker leaves the affinity ring and writes back every
+battle session it holds (battle/services/affinity.py), while the event
+loop, database connections and app registry are still up.
+
+Servers that do not send lifespan events (Daphne) never call this: the
+first battle socket starts recovery instead, and affinity.py describes
+what covers a worker that exits without the shutdown step.
+"""
+from battle.services import affinity, recovery
+
+
+async def lifespan_application(scope, receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await recovery.ensure_started()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            try:
+                await affinity.leave()
+            except Exception as e:
+                await send({'type': 'lifespan.shutdown.failed', 'message': str(e)})
+            else:
+                await send({'type': 'lifespan.shutdown.complete'})
+            return
@@ -0,0 +1,38 @@
+# battle/management/commands/reap_battles.py
+"""
+Management command to abandon idle ACTIVE battles and settle them as
+arena losses (see battle/services/reaper.py). Server workers run the same
+sweep periodically; this runs it over every battle, until none are left.
+
+Usage: python manage.py reap_battles [--batch 500]
+"""
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from battle.constants import BATTLE_REAPER_BATCH
+from battle.services import reaper, settlement
+
+
+class Command(BaseCommand):
+    help = 'Marks idle ACTIVE battles ABANDONED and settles arena losses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int,
+                            help='Battles per transaction (default: settings.BATTLE_REAPER_BATCH, '
+                                 f'else {BATTLE_REAPER_BATCH})')
+
+    def handle(self, *args, **options):
+        batch = options['batch'] or getattr(settings, 'BATTLE_REAPER_BATCH', BATTLE_REAPER_BATCH)
+        total = 0
+        while True:
+            battle_ids = reaper.sweep(batch=batch)
+            async_to_sync(reaper.notify)(battle_ids)
+            total += len(battle_ids)
+            if len(battle_ids) < batch:
+                break
+        settled = settlement.drain()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} idle battles abandoned, {settled} arena results settled'
+        ))
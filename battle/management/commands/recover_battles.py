@@ -0,0 +1,30 @@
+# battle/management/commands/recover_battles.py
+"""
+Management command to check ACTIVE battles against their turn journal and
+repair rows that disagree with it (see battle/services/recovery.py).
+Server workers run the same check, over the battles they own, after they start.
+
+Usage: python manage.py recover_battles [--dry-run]
+"""
+from django.core.management.base import BaseCommand
+
+from battle.services.recovery import recover_active_battles
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds ACTIVE battles from their turn journal'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report battles that disagree with their journal without changing them',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        scanned, repaired = recover_active_battles(apply=not dry_run)
+
+        verb = 'would be repaired' if dry_run else 'repaired'
+        self.stdout.write(self.style.SUCCESS(
+            f'{scanned} active battles checked, {repaired} {verb}'
+        ))
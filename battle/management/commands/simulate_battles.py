@@ -0,0 +1,74 @@
+# battle/management/commands/simulate_battles.py
+"""
+Management command to run headless Monte Carlo battles between two teams.
+Both sides are driven by the NPC AI; team A plays the player side.
+
+Team specs:
+    operator:<operator id>     top 3 active cores in the operator's garage
+    npc:<npc id|call sign>     an arena NPC roster
+    json:<path>                an ad-hoc team file
+
+Usage: python manage.py simulate_battles npc:RUST npc:SOCKET -n 5000
+       python manage.py simulate_battles operator:<id> json:teams/tank.json --seed 42 --json
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from battle.services import simulator
+
+
+class Command(BaseCommand):
+    help = 'Simulates battles between two teams and reports win rates and damage distributions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('team_a', help='Player-side team spec')
+        parser.add_argument('team_b', help='NPC-side team spec')
+        parser.add_argument('-n', '--battles', type=int, default=1000,
+                            help='Number of battles to simulate (default: 1000)')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes (default: CPU count, 1 = in-process)')
+        parser.add_argument('--seed', type=int, default=None,
+                            help='Base RNG seed; battle i uses seed + i')
+        parser.add_argument('--max-turns', type=int, default=simulator.DEFAULT_MAX_TURNS,
+                            help='Turn limit before a battle is scored as a draw')
+        parser.add_argument('--json', action='store_true',
+                            help='Print the raw summary as JSON')
+
+    def handle(self, *args, **options):
+        try:
+            team_a = simulator.load_team(options['team_a'])
+            team_b = simulator.load_team(options['team_b'])
+            summary = simulator.simulate(
+                team_a, team_b,
+                battles=options['battles'],
+                workers=options['workers'],
+                seed=options['seed'],
+                max_turns=options['max_turns'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+
+        names = summary['teams']
+        self.stdout.write(self.style.SUCCESS(
+            f"{names['a']} vs {names['b']}: {summary['battles']} battles (seed {summary['seed']})"
+        ))
+        self.stdout.write(
+            f"  Win rate: {names['a']} {summary['win_rate']['a']:.1%}, "
+            f"{names['b']} {summary['win_rate']['b']:.1%}, "
+            f"draws {summary['win_rate']['draw']:.1%}"
+        )
+        self.stdout.write(f"  Turns: {self._format(summary['turns'])}")
+        for key, label in (('a', names['a']), ('b', names['b'])):
+            self.stdout.write(f"  {label} damage per hit: {self._format(summary['damage_per_hit'][key])}")
+            self.stdout.write(f"  {label} damage per battle: {self._format(summary['damage_per_battle'][key])}")
+
+    def _format(self, dist):
+        return (
+            f"mean {dist['mean']}, min {dist['min']}, p10 {dist['p10']}, "
+            f"p50 {dist['p50']}, p90 {dist['p90']}, max {dist['max']}"
+        )
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:36
+
+import battle.defaults
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battle', '0003_npcoperator_npccore_operatorarenaprogress_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='battle',
+            name='rng_cursor',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='battle',
+            name='rng_seed',
+            field=models.BigIntegerField(default=battle.defaults.new_seed),
+        ),
+    ]
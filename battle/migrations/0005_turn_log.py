@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battle', '0004_battle_rng_stream'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='battleaction',
+            name='details',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='battleaction',
+            name='side',
+            field=models.CharField(choices=[('player', 'Player'), ('npc', 'NPC')], default='player', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='diceroll',
+            name='core_ref',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='diceroll',
+            name='side',
+            field=models.CharField(choices=[('player', 'Player'), ('npc', 'NPC')], default='player', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='battleaction',
+            name='action_type',
+            field=models.CharField(choices=[('MOVE', 'Move'), ('SWITCH', 'Switch'), ('PASS', 'Pass'), ('REACTION', 'Reaction'), ('GAIN_RESOURCE', 'Gain Resource')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='diceroll',
+            name='core_state',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='dice_rolls', to='battle.battlecorestate'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battle', '0005_turn_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='battle',
+            name='loadout',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
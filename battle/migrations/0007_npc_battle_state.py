@@ -0,0 +1,151 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:52
+
+import django.core.validators
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+SCRATCH_KEYS = (
+    'npc_id', 'npc_name', 'npc_difficulty', 'npc_team',
+    'pending_player_dice', 'pending_npc_dice', 'pending_ko_switch',
+)
+
+
+def move_npc_state_out_of_rewards(apps, schema_editor):
+    """Turn rewards['npc_team'] and the pending_* flags into rows and columns."""
+    from battle.constants import MOVE_EFFECT_MAP
+
+    Battle = apps.get_model('battle', 'Battle')
+    BattleTeam = apps.get_model('battle', 'BattleTeam')
+    NPCOperator = apps.get_model('battle', 'NPCOperator')
+    NPCCore = apps.get_model('battle', 'NPCCore')
+    NPCBattleTeam = apps.get_model('battle', 'NPCBattleTeam')
+    NPCBattleCoreState = apps.get_model('battle', 'NPCBattleCoreState')
+
+    for battle in Battle.objects.exclude(rewards={}).iterator():
+        rewards = battle.rewards or {}
+        if not any(key in rewards for key in SCRATCH_KEYS):
+            continue
+
+        npc_team = rewards.get('npc_team') or {}
+        if npc_team:
+            npc = NPCOperator.objects.filter(id=rewards.get('npc_id')).first()
+            team = NPCBattleTeam.objects.create(
+                battle=battle,
+                npc=npc,
+                call_sign=rewards.get('npc_name') or (npc.call_sign if npc else ''),
+                difficulty_rating=rewards.get('npc_difficulty') or (npc.difficulty_rating if npc else 1),
+                energy_pool=npc_team.get('energy_pool', 0),
+                physical_pool=npc_team.get('physical_pool', 0),
+                active_core_index=npc_team.get('active_core_index', 0),
+                dice_pending=bool(rewards.get('pending_npc_dice')),
+            )
+            cores = npc_team.get('cores', [])
+            known = set(
+                str(pk) for pk in NPCCore.objects.filter(
+                    id__in=[core['id'] for core in cores]
+                ).values_list('id', flat=True)
+            )
+            NPCBattleCoreState.objects.bulk_create([
+                NPCBattleCoreState(
+                    team=team,
+                    npc_core_id=core['id'] if str(core['id']) in known else None,
+                    core_ref=str(core['id']),
+                    position=i,
+                    current_hp=core.get('current_hp', 0),
+                    max_hp=core.get('max_hp') or core.get('stats', {}).get('hp', 0),
+                    is_knocked_out=core.get('is_knocked_out', False),
+                    last_dice_roll=core.get('last_dice_roll'),
+                    status_effects=core.get('status_effects', []),
+                )
+                for i, core in enumerate(cores)
+            ])
+
+            # Battles from before loadouts kept NPC stats and moves here too
+            if not battle.loadout and cores and 'stats' in cores[0]:
+                battle.loadout = {'npc': [
+                    {
+                        'id': str(core['id']),
+                        'name': core['name'],
+                        'core_type': core.get('core_type', ''),
+                        'rarity': core.get('rarity', ''),
+                        'lvl': core.get('lvl', 1),
+                        'image_url': core.get('image_url', ''),
+                        'max_hp': core['stats']['hp'],
+                        'stats': core['stats'],
+                        'equipped_moves': [
+                            {**move, 'effect': MOVE_EFFECT_MAP.get(move['name'])}
+                            for move in core.get('equipped_moves', [])
+                        ],
+                    }
+                    for core in cores
+                ]}
+
+        BattleTeam.objects.filter(battle=battle).update(
+            dice_pending=bool(rewards.get('pending_player_dice')),
+            ko_switch_pending=bool(rewards.get('pending_ko_switch')),
+        )
+
+        battle.rewards = {k: v for k, v in rewards.items() if k not in SCRATCH_KEYS}
+        battle.save(update_fields=['rewards', 'loadout'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battle', '0006_battle_loadout'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='battleteam',
+            name='dice_pending',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='battleteam',
+            name='ko_switch_pending',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='NPCBattleTeam',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('call_sign', models.CharField(blank=True, default='', max_length=120)),
+                ('difficulty_rating', models.PositiveIntegerField(default=1)),
+                ('energy_pool', models.PositiveIntegerField(default=0)),
+                ('physical_pool', models.PositiveIntegerField(default=0)),
+                ('active_core_index', models.PositiveIntegerField(default=0, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(2)])),
+                ('dice_pending', models.BooleanField(default=False)),
+                ('battle', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='npc_team', to='battle.battle')),
+                ('npc', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='battle_teams', to='battle.npcoperator')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='NPCBattleCoreState',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('core_ref', models.CharField(max_length=64)),
+                ('position', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(2)])),
+                ('current_hp', models.PositiveIntegerField(default=0)),
+                ('max_hp', models.PositiveIntegerField(default=0)),
+                ('is_knocked_out', models.BooleanField(default=False)),
+                ('last_dice_roll', models.PositiveIntegerField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(8)])),
+                ('status_effects', models.JSONField(blank=True, default=list)),
+                ('npc_core', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='battle_states', to='battle.npccore')),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='core_states', to='battle.npcbattleteam')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('team', 'position'), name='uniq_npc_team_position')],
+            },
+        ),
+        migrations.RunPython(move_npc_state_out_of_rewards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battle', '0007_npc_battle_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BattleWorker',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('worker_id', models.CharField(max_length=120, primary_key=True, serialize=False)),
+                ('url', models.CharField(max_length=255)),
+                ('heartbeat_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:12
+
+import battle.defaults
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battle', '0008_battle_worker'),
+        ('codex', '0006_move_is_signature_alter_move_core_type_identity_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='battle',
+            name='idle_deadline',
+            field=models.DateTimeField(default=battle.defaults.idle_deadline),
+        ),
+        migrations.AddField(
+            model_name='battle',
+            name='idle_timeout',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='battle',
+            index=models.Index(fields=['status', 'idle_deadline'], name='battle_idle_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:15
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('battle', '0009_battle_idle_deadline'),
+        ('codex', '0006_move_is_signature_alter_move_core_type_identity_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SettlementJob',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('won', models.BooleanField()),
+                ('npc', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('DONE', 'Done')], db_index=True, default='PENDING', max_length=10)),
+                ('settled_at', models.DateTimeField(blank=True, null=True)),
+                ('battle', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='settlement_jobs', to='battle.battle')),
+                ('operator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='settlement_jobs', to='codex.operator')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
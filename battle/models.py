@@ -3,6 +3,7 @@ import uuid
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from codex.models import TimestampedModel
+from battle.defaults import new_seed, idle_deadline
 
 
 # ============================================================================
@@ -61,6 +62,20 @@ class Battle(TimestampedModel):
     current_turn = models.PositiveIntegerField(default=0)
     rewards = models.JSONField(default=dict, blank=True)
 
+    # Static stats and moves for both sides, compiled at creation
+    # (see battle/services/loadout.py)
+    loadout = models.JSONField(default=dict, blank=True)
+
+    # Deterministic random stream (see battle/services/battle_rng.py)
+    rng_seed = models.BigIntegerField(default=new_seed)
+    rng_cursor = models.PositiveBigIntegerField(default=0)
+
+    # Idle reaping (see battle/services/reaper.py): an ACTIVE battle with no
+    # command before idle_deadline is abandoned. idle_timeout (seconds)
+    # overrides BATTLE_IDLE_TIMEOUT for this battle.
+    idle_timeout = models.PositiveIntegerField(null=True, blank=True)
+    idle_deadline = models.DateTimeField(default=idle_deadline)
+
     # Optional mission reference
     mission = models.ForeignKey(
         "Mission",
@@ -70,6 +85,11 @@ class Battle(TimestampedModel):
         related_name="battles"
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "idle_deadline"], name="battle_idle_idx"),
+        ]
+
     def __str__(self):
         return f"Battle {self.id} - {self.battle_type} ({self.status})"
 
@@ -99,6 +119,11 @@ class BattleTeam(TimestampedModel):
         validators=[MinValueValidator(0), MaxValueValidator(2)]
     )
 
+    # Dice rolled (last_dice_roll on the core states) but not yet allocated
+    dice_pending = models.BooleanField(default=False)
+    # Active core was knocked out and the player must pick a replacement
+    ko_switch_pending = models.BooleanField(default=False)
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -162,6 +187,91 @@ class BattleCoreState(TimestampedModel):
         return f"{self.core.name} (pos {self.position}) - {self.current_hp}/{self.max_hp} HP"
 
 
+class NPCBattleTeam(TimestampedModel):
+    """
+    The NPC side of a PVE battle. Same per-turn state as BattleTeam, which
+    cannot be used because it requires an Operator.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    battle = models.OneToOneField(
+        Battle,
+        on_delete=models.CASCADE,
+        related_name="npc_team"
+    )
+    npc = models.ForeignKey(
+        "NPCOperator",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="battle_teams"
+    )
+
+    # Copied from the NPCOperator when the battle starts
+    call_sign = models.CharField(max_length=120, blank=True, default="")
+    difficulty_rating = models.PositiveIntegerField(default=1)
+
+    energy_pool = models.PositiveIntegerField(default=0)
+    physical_pool = models.PositiveIntegerField(default=0)
+    active_core_index = models.PositiveIntegerField(
+        default=0,
+        validators=[MinValueValidator(0), MaxValueValidator(2)]
+    )
+
+    # Dice rolled (last_dice_roll on the core states) but not yet allocated
+    dice_pending = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"NPC team {self.call_sign} in Battle {self.battle_id}"
+
+
+class NPCBattleCoreState(TimestampedModel):
+    """An NPC core's state during battle. Mirrors BattleCoreState."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    team = models.ForeignKey(
+        NPCBattleTeam,
+        on_delete=models.CASCADE,
+        related_name="core_states"
+    )
+    npc_core = models.ForeignKey(
+        "NPCCore",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="battle_states"
+    )
+    # Core id in the battle's loadout (kept if the NPCCore is deleted)
+    core_ref = models.CharField(max_length=64)
+
+    position = models.PositiveIntegerField(
+        validators=[MinValueValidator(0), MaxValueValidator(2)]
+    )
+
+    current_hp = models.PositiveIntegerField(default=0)
+    max_hp = models.PositiveIntegerField(default=0)
+    is_knocked_out = models.BooleanField(default=False)
+
+    last_dice_roll = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(1), MaxValueValidator(8)]
+    )
+
+    status_effects = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["team", "position"],
+                name="uniq_npc_team_position"
+            ),
+        ]
+
+    def __str__(self):
+        return f"NPC core {self.core_ref} (pos {self.position}) - {self.current_hp}/{self.max_hp} HP"
+
+
 class BattleTurn(TimestampedModel):
     """Record of a single turn within a battle."""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -203,6 +313,12 @@ class BattleAction(TimestampedModel):
         ("SWITCH", "Switch"),
         ("PASS", "Pass"),
         ("REACTION", "Reaction"),
+        ("GAIN_RESOURCE", "Gain Resource"),
+    ]
+
+    SIDE_CHOICES = [
+        ("player", "Player"),
+        ("npc", "NPC"),
     ]
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -217,6 +333,11 @@ class BattleAction(TimestampedModel):
         max_length=20,
         choices=ACTION_TYPE_CHOICES
     )
+    side = models.CharField(
+        max_length=10,
+        choices=SIDE_CHOICES,
+        default="player"
+    )
 
     # Optional move reference (for MOVE actions)
     move = models.ForeignKey(
@@ -255,6 +376,9 @@ class BattleAction(TimestampedModel):
     # Order of action within the turn
     sequence = models.PositiveIntegerField(default=0)
 
+    # Remaining result fields (effects, heals, NPC core ids, switch target)
+    details = models.JSONField(default=dict, blank=True)
+
     class Meta:
         ordering = ["sequence"]
 
@@ -279,11 +403,20 @@ class DiceRoll(TimestampedModel):
         on_delete=models.CASCADE,
         related_name="dice_rolls"
     )
+    side = models.CharField(
+        max_length=10,
+        choices=BattleAction.SIDE_CHOICES,
+        default="player"
+    )
+    # Null for NPC cores, which have no BattleCoreState; core_ref has the id
     core_state = models.ForeignKey(
         BattleCoreState,
         on_delete=models.CASCADE,
-        related_name="dice_rolls"
+        related_name="dice_rolls",
+        null=True,
+        blank=True
     )
+    core_ref = models.CharField(max_length=64, blank=True, default="")
 
     # The actual d8 roll result (1-8)
     roll_value = models.PositiveIntegerField(
@@ -649,3 +782,66 @@ class OperatorArenaProgress(TimestampedModel):
 
     def __str__(self):
         return f"{self.operator.call_sign} - Rank {self.current_rank}"
+
+
+class SettlementJob(TimestampedModel):
+    """
+    Outbox row for an arena result awaiting settlement: written in the same
+    transaction as the battle's end, applied in batches afterwards by
+    battle/services/settlement.py. `npc` is the NPC's reward snapshot
+    taken when the job was queued.
+    """
+    STATUS_CHOICES = [
+        ("PENDING", "Pending"),
+        ("DONE", "Done"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    battle = models.ForeignKey(
+        Battle,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="settlement_jobs"
+    )
+    operator = models.ForeignKey(
+        "codex.Operator",
+        on_delete=models.CASCADE,
+        related_name="settlement_jobs"
+    )
+    won = models.BooleanField()
+    npc = models.JSONField(default=dict)
+
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default="PENDING",
+        db_index=True
+    )
+    settled_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        outcome = "win" if self.won else "loss"
+        return f"Settlement {outcome} for {self.operator_id} ({self.status})"
+
+
+# ============================================================================
+# Worker Models
+# ============================================================================
+
+class BattleWorker(TimestampedModel):
+    """
+    A server process taking battle websockets. Workers with a recent
+    heartbeat form the consistent-hash ring that assigns battles to
+    processes (battle/services/affinity.py).
+    """
+    worker_id = models.CharField(max_length=120, primary_key=True)
+
+    # Base websocket URL clients use to reach this process directly
+    url = models.CharField(max_length=255)
+
+    heartbeat_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.worker_id} ({self.url})"
@@ -1,7 +1,56 @@
 # battle/routing.py
+"""
+Websocket routing for battles.
+
+BattleAffinityMiddleware sits in front of the URL router. Before a
+consumer is created it checks which worker owns the battle
+(battle/services/affinity.py). If another worker owns it, the socket is
+accepted only to receive a worker_redirect with the owner's URL, and is
+then closed. The battle is never loaded on a worker that does not own it.
+"""
+import json
+import re
+
+from channels.routing import URLRouter
 from django.urls import re_path
+
 from . import consumers
+from .services import affinity
+
+
+BATTLE_PATH = re.compile(r'^/?ws/battle/(?P<battle_id>[0-9a-f-]+)/$')
 
 websocket_urlpatterns = [
     re_path(r'ws/battle/(?P<battle_id>[0-9a-f-]+)/$', consumers.BattleConsumer.as_asgi()),
 ]
+
+
+class BattleAffinityMiddleware:
+    """Redirect battle sockets to the worker that owns the battle."""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    async def __call__(self, scope, receive, send):
+        match = BATTLE_PATH.match(scope.get('path', ''))
+        if scope['type'] == 'websocket' and match:
+            await affinity.ensure_started()
+            url = affinity.owner_url(match['battle_id'])
+            if url:
+                await self.redirect(f"{url.rstrip('/')}/{match.group(0).lstrip('/')}", receive, send)
+                return
+        return await self.inner(scope, receive, send)
+
+    async def redirect(self, url, receive, send):
+        message = await receive()
+        if message['type'] != 'websocket.connect':
+            return
+        await send({'type': 'websocket.accept'})
+        await send({
+            'type': 'websocket.send',
+            'text': json.dumps({'type': 'worker_redirect', 'url': url}),
+        })
+        await send({'type': 'websocket.close', 'code': consumers.REDIRECT_CLOSE_CODE})
+
+
+websocket_application = BattleAffinityMiddleware(URLRouter(websocket_urlpatterns))
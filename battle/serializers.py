@@ -1,7 +1,7 @@
 # battle/serializers.py
 from rest_framework import serializers
 from .models import Mail, NPCOperator, NPCCore, NPCCoreEquippedMove, OperatorArenaProgress
-from codex.serializers.move import MoveListSerializer
+from codex.serializers.move import CatalogMoveField
 
 
 class MailListSerializer(serializers.ModelSerializer):
@@ -39,7 +39,7 @@ class MailMarkReadSerializer(serializers.Serializer):
 
 class NPCCoreEquippedMoveSerializer(serializers.ModelSerializer):
     """Serialize equipped moves on NPC cores."""
-    move = MoveListSerializer(read_only=True)
+    move = CatalogMoveField()
 
     class Meta:
         model = NPCCoreEquippedMove
@@ -0,0 +1,193 @@
+# battle/services/affinity.py
+"""
+Battle-to-worker affinity.
+
+A battle's in-memory state (BattleSession, loadout, actor) lives in one
+server process. With several workers behind a load balancer, every socket
+for a battle has to end up on that process, or each worker it lands on
+pays a cold load and the copies race each other.
+
+Each worker that sets BATTLE_WORKER_URL (the websocket base URL that
+reaches it directly, e.g. ws://10.0.0.5:8001) registers a BattleWorker
+row and refreshes its heartbeat every BATTLE_WORKER_HEARTBEAT seconds.
+Workers with a fresh heartbeat form a consistent-hash ring, and a battle
+belongs to the worker its id hashes to. Adding or removing one worker
+moves only that worker's share of battles.
+
+    - connect: battle/routing.py looks up the owner before the consumer
+      runs. A socket that reaches the wrong worker gets a worker_redirect
+      to the owner's URL and is closed, so only the owner ever loads the
+      battle, once.
+    - join/leave: every heartbeat re-reads the live workers. When the
+      ring changes, each battle this worker holds but no longer owns gets
+      a battle.handoff group message. The battle's actor flushes and drops
+      the session once, then its consumers redirect their clients to the
+      new owner, which rehydrates from the flushed rows.
+    - shutdown: leave() drops the worker's row and flushes every session
+      it holds, so the battles' new owners start from current state. It
+      runs on the ASGI lifespan shutdown (battle/lifespan.py), while the
+      database and app registry are still up. Servers without lifespan
+      events (Daphne) skip it: the ring drops the worker once its
+      heartbeat is BATTLE_WORKER_TIMEOUT old, and sessions are already
+      written back at the end of every command.
+
+Without BATTLE_WORKER_URL every battle is local (single-process mode).
+"""
+import asyncio
+import bisect
+import hashlib
+import os
+import socket
+from datetime import timedelta
+from typing import Optional
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.utils import timezone
+
+from battle.constants import BATTLE_WORKER_HEARTBEAT, BATTLE_WORKER_TIMEOUT, BATTLE_RING_REPLICAS
+
+
+# ============================================================================
+# Consistent-hash ring
+# ============================================================================
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Consistent-hash ring with `replicas` virtual points per node."""
+
+    def __init__(self, nodes, replicas: int = BATTLE_RING_REPLICAS):
+        self.nodes = frozenset(nodes)
+        points = sorted(
+            (_hash(f'{node}#{i}'), node)
+            for node in self.nodes
+            for i in range(replicas)
+        )
+        self._keys = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key: str) -> Optional[str]:
+        if not self._keys:
+            return None
+        i = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._nodes[i]
+
+
+# ============================================================================
+# This worker
+# ============================================================================
+
+WORKER_ID = getattr(settings, 'BATTLE_WORKER_ID', None) or f'{socket.gethostname()}:{os.getpid()}'
+
+_ring = HashRing([])
+_urls: dict[str, str] = {}
+_heartbeat: Optional[asyncio.Task] = None
+
+
+def worker_url() -> Optional[str]:
+    return getattr(settings, 'BATTLE_WORKER_URL', None)
+
+
+def enabled() -> bool:
+    return bool(worker_url())
+
+
+def owner_of(battle_id) -> str:
+    """Worker id owning a battle; this worker when affinity is off or the ring is empty."""
+    return _ring.node_for(str(battle_id)) or WORKER_ID
+
+
+def is_local(battle_id) -> bool:
+    return owner_of(battle_id) == WORKER_ID
+
+
+def owner_url(battle_id) -> Optional[str]:
+    """Base URL of the worker owning a battle, or None if it is this one."""
+    owner = owner_of(battle_id)
+    return None if owner == WORKER_ID else _urls.get(owner)
+
+
+# ============================================================================
+# Membership
+# ============================================================================
+
+async def ensure_started() -> None:
+    """Register this worker and start heartbeating (once per event loop)."""
+    global _heartbeat
+    if not enabled():
+        return
+    if _heartbeat is None or _heartbeat.done():
+        await refresh()
+        _heartbeat = asyncio.get_running_loop().create_task(_heartbeat_loop())
+
+
+async def _heartbeat_loop() -> None:
+    interval = getattr(settings, 'BATTLE_WORKER_HEARTBEAT', BATTLE_WORKER_HEARTBEAT)
+    while True:
+        await asyncio.sleep(interval)
+        await refresh()
+
+
+async def refresh() -> None:
+    """Heartbeat, re-read the live workers and hand off battles that moved."""
+    global _ring, _urls
+    workers = await _beat()
+    if set(workers) == _ring.nodes:
+        _urls = workers
+        return
+
+    replicas = getattr(settings, 'BATTLE_RING_REPLICAS', BATTLE_RING_REPLICAS)
+    _ring, _urls = HashRing(workers, replicas), workers
+    await _hand_off()
+
+
+@database_sync_to_async
+def _beat() -> dict[str, str]:
+    from battle.models import BattleWorker
+
+    now = timezone.now()
+    timeout = getattr(settings, 'BATTLE_WORKER_TIMEOUT', BATTLE_WORKER_TIMEOUT)
+    BattleWorker.objects.update_or_create(
+        worker_id=WORKER_ID, defaults={'url': worker_url(), 'heartbeat_at': now}
+    )
+    return dict(
+        BattleWorker.objects.filter(
+            heartbeat_at__gte=now - timedelta(seconds=timeout)
+        ).values_list('worker_id', 'url')
+    )
+
+
+async def _hand_off() -> None:
+    from battle.services import battle_session
+
+    channel_layer = get_channel_layer()
+    for battle_id in battle_session.held_battle_ids():
+        url = owner_url(battle_id)
+        if url:
+            await channel_layer.group_send(f'battle_{battle_id}', {
+                'type': 'battle.handoff',
+                'url': url,
+            })
+
+
+async def leave() -> None:
+    """Server shutdown: stop heartbeating, leave the ring and persist every held session."""
+    global _heartbeat
+    if _heartbeat is not None:
+        _heartbeat.cancel()
+        _heartbeat = None
+    if enabled():
+        await _leave()
+
+
+@database_sync_to_async
+def _leave() -> None:
+    from battle.models import BattleWorker
+    from battle.services import battle_session
+
+    BattleWorker.objects.filter(worker_id=WORKER_ID).delete()
+    battle_session.flush_all()
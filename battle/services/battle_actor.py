@@ -0,0 +1,154 @@
+# battle/services/battle_actor.py
+"""
+Per-battle command actor.
+
+Every socket attached to a battle submits its inbound messages to the
+battle's actor, which runs them one at a time, in arrival order, on a single
+asyncio task. Two handlers for the same battle never interleave across
+await points, whichever sockets the messages came from.
+
+Retries are absorbed before they reach the engine:
+
+    - coalescing: a command identical to one still queued or running
+      from the same socket (same message type and payload) is not queued
+      again; the duplicate waits for the original and reports COALESCED
+    - stale rejection: a command stamped with a turn number is dropped
+      with STALE if the battle has moved to another turn by the time it
+      comes up, so a retried action never lands on the next turn
+
+Actors live in the process that holds the battle's session and are
+reference-counted by socket like sessions; the worker task exits once the
+last socket detaches and the queue is drained. A draining actor stays
+registered until its worker returns, so a socket attaching meanwhile reuses
+it and the battle never has two workers.
+"""
+import asyncio
+import json
+from typing import Awaitable, Callable, Optional
+
+
+DONE = 'done'
+COALESCED = 'coalesced'
+STALE = 'stale'
+
+
+class BattleActor:
+    """Serializes one battle's commands."""
+
+    def __init__(self, battle_id: str, current_turn: Callable[[], Optional[int]]):
+        self.battle_id = battle_id
+        self.refcount = 0
+        self._current_turn = current_turn
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._pending: dict[str, asyncio.Future] = {}
+        self._worker: Optional[asyncio.Task] = None
+
+    async def submit(self, key: str, turn_number: Optional[int],
+                     run: Callable[[], Awaitable[None]]) -> str:
+        """
+        Queue `run` and wait for it. Returns DONE, COALESCED or STALE;
+        exceptions raised by `run` propagate to the submitter only.
+        """
+        original = self._pending.get(key)
+        if original is not None:
+            await asyncio.wait([original])
+            return COALESCED
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        self._queue.put_nowait((key, turn_number, run, future))
+        self._ensure_worker()
+        return await future
+
+    def stop(self) -> None:
+        """Let the worker finish what is queued, then exit."""
+        self._queue.put_nowait(None)
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        try:
+            await self._drain()
+        finally:
+            _forget(self)
+
+    async def _drain(self) -> None:
+        while True:
+            command = await self._queue.get()
+            if command is None:
+                if self.refcount > 0 or not self._queue.empty():
+                    continue  # Reattached, or commands queued after the stop
+                return
+
+            key, turn_number, run, future = command
+            try:
+                if self._is_stale(turn_number):
+                    outcome = STALE
+                else:
+                    await run()
+                    outcome = DONE
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(outcome)
+            finally:
+                self._pending.pop(key, None)
+
+    def _is_stale(self, turn_number: Optional[int]) -> bool:
+        if turn_number is None:
+            return False
+        current = self._current_turn()
+        return current is not None and turn_number != current
+
+
+def command_key(content: dict, origin: str) -> str:
+    """Identity of a message for coalescing: the socket it came from, its type and payload."""
+    return f'{origin}:{json.dumps(content, sort_keys=True, default=str)}'
+
+
+# ============================================================================
+# Process-wide actor registry
+# ============================================================================
+
+_actors: dict[str, BattleActor] = {}
+
+
+def attach(battle_id: str, current_turn: Callable[[], Optional[int]]) -> BattleActor:
+    """
+    The battle's actor, created on first use (or reused while it drains).
+    Event-loop only, so the registry needs no lock.
+    """
+    battle_id = str(battle_id)
+    actor = _actors.get(battle_id)
+    if actor is None:
+        actor = _actors[battle_id] = BattleActor(battle_id, current_turn)
+    actor.refcount += 1
+    return actor
+
+
+def detach(battle_id: str) -> None:
+    """
+    Drop a socket's reference; the last one stops the actor, which leaves
+    the registry once its worker has drained the queue.
+    """
+    battle_id = str(battle_id)
+    actor = _actors.get(battle_id)
+    if actor is None:
+        return
+    actor.refcount -= 1
+    if actor.refcount > 0:
+        return
+    if actor._worker is None or actor._worker.done():
+        del _actors[battle_id]
+    else:
+        actor.stop()
+
+
+def _forget(actor: BattleActor) -> None:
+    """Unregister an actor whose worker has exited with no socket attached."""
+    if actor.refcount <= 0 and _actors.get(actor.battle_id) is actor:
+        del _actors[actor.battle_id]
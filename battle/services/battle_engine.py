@@ -1,27 +1,77 @@
 # battle/services/battle_engine.py
 """
 Core battle logic service. Server-authoritative battle engine.
+
+Game rules live in battle_kernel; the turn functions here are thin adapters
+that load kernel state from the battle's rows, run the kernel and write the
+new state back onto the battle, team and core state objects in memory. They
+never save; persistence is the caller's job (see BattleSession.flush()).
+Related rows are read through the prefetch caches a BattleSession sets up,
+so a turn costs no queries once the session is loaded.
 """
-import random
 from typing import Optional
 from django.db import transaction
 
 from battle.models import (
-    Battle, BattleTeam, BattleCoreState, BattleTurn, BattleAction, DiceRoll,
-    NPCOperator, NPCCore
+    Battle, BattleTeam, BattleCoreState, NPCOperator, NPCBattleTeam, NPCBattleCoreState
 )
+from battle.services import battle_kernel, battle_session, loadout, settlement
+from battle.services.battle_rng import battle_stream
+from battle.services.battle_kernel import calculate_damage  # noqa: F401 (re-exported)
 from codex.models import Operator, Core
 
 
+# ============================================================================
+# Cached state accessors
+# ============================================================================
+
+def _get_player_team(battle: Battle) -> Optional[BattleTeam]:
+    """Player team, read from the prefetch cache when the battle has one."""
+    teams = list(battle.teams.all())
+    return teams[0] if teams else None
+
+
+def _get_npc_team(battle: Battle) -> Optional[NPCBattleTeam]:
+    """NPC team, read from the select_related cache when the battle has one."""
+    try:
+        return battle.npc_team
+    except NPCBattleTeam.DoesNotExist:
+        return None
+
+
+def _get_team(battle: Battle, team_side: str):
+    return _get_player_team(battle) if team_side == 'player' else _get_npc_team(battle)
+
+
+def _get_core_states(team) -> list:
+    """Team core states (BattleCoreState or NPCBattleCoreState) ordered by position."""
+    return sorted(team.core_states.all(), key=lambda state: state.position)
+
+
+def _get_core_state(team: BattleTeam, position: int) -> Optional[BattleCoreState]:
+    for state in team.core_states.all():
+        if state.position == position:
+            return state
+    return None
+
+
 def create_battle_from_npc(operator_id: str, npc_id: str) -> Battle:
     """
     Initialize a new Battle between a player and an NPC.
-    Creates Battle, BattleTeams, and BattleCoreStates for both sides.
+    Creates Battle, BattleTeams, and BattleCoreStates for both sides, and
+    compiles the battle's static loadout (stats, moves, effects).
     """
     operator = Operator.objects.get(id=operator_id)
-    npc = NPCOperator.objects.prefetch_related(
-        'cores', 'cores__equipped_moves', 'cores__equipped_moves__move'
-    ).get(id=npc_id)
+    npc = NPCOperator.objects.prefetch_related('cores', 'cores__equipped_moves').get(id=npc_id)
+    npc_cores = sorted(npc.cores.all(), key=lambda core: core.team_position)
+
+    # Get player's cores from their garage loadout
+    player_cores = list(
+        Core.objects.filter(garage__operator=operator, decommed=False)
+        .select_related('battle_info')
+        .prefetch_related('coreequippedmove_set')
+        .order_by('created_at')[:3]
+    )
 
     with transaction.atomic():
         # Create the battle
@@ -29,7 +79,8 @@ def create_battle_from_npc(operator_id: str, npc_id: str) -> Battle:
             operator_1=operator,
             battle_type="PVE",
             status="ACTIVE",
-            current_turn=0
+            current_turn=0,
+            loadout=loadout.compile_loadout(player_cores, npc_cores),
         )
 
         # Create player team
@@ -41,15 +92,6 @@ def create_battle_from_npc(operator_id: str, npc_id: str) -> Battle:
             active_core_index=0
         )
 
-        # Get player's cores from their garage loadout
-        garage = operator.garage
-        player_cores = list(
-            Core.objects.filter(garage=garage, decommed=False)
-            .select_related('battle_info')
-            .prefetch_related('equipped_moves', 'coreequippedmove_set__move')
-            .order_by('created_at')[:3]
-        )
-
         # Create battle states for player cores
         for i, core in enumerate(player_cores):
             battle_info = core.battle_info
@@ -62,88 +104,146 @@ def create_battle_from_npc(operator_id: str, npc_id: str) -> Battle:
                 is_knocked_out=False
             )
 
-        # Create NPC team (using operator record for consistency, even though NPC)
-        # For NPCs, we create a pseudo-team. They don't have a real Operator.
-        # We'll store the NPC reference differently - using the battle's operator_2=None
-        # and tracking NPC ID in battle metadata
-
-        # Create a simple team for NPC - we need to handle this specially
-        # For now, we'll create NPC core states without a real Core model reference
-        npc_team = create_npc_battle_team(battle, npc)
+        create_npc_battle_team(battle, npc)
 
         return battle
 
 
-def create_npc_battle_team(battle: Battle, npc: NPCOperator) -> BattleTeam:
+def create_npc_battle_team(battle: Battle, npc: NPCOperator) -> NPCBattleTeam:
     """
-    Create a battle team for an NPC opponent.
-    NPC cores are stored as NPCCore, not real Core objects.
-    We'll store their data directly in BattleCoreState.
+    Create the NPC side of a battle: an NPCBattleTeam and one
+    NPCBattleCoreState per NPC core, at full HP. Stats and moves come from
+    the battle's loadout.
     """
-    # For NPC teams, we need a placeholder operator or handle differently
-    # Since Battle requires an operator, we'll use a special approach:
-    # Store NPC data in the battle's rewards JSON field for now
-    battle.rewards['npc_id'] = str(npc.id)
-    battle.rewards['npc_name'] = npc.call_sign
-    battle.save(update_fields=['rewards'])
-
-    # For NPC team, we still need a BattleTeam but with special handling
-    # Create a "virtual" team entry - we'll need to query NPCCores separately
-    # Actually, looking at the model, BattleTeam requires an operator FK.
-    # Let's store NPC battle state in the battle's rewards field as JSON instead
-
-    npc_cores = list(npc.cores.prefetch_related('equipped_moves__move').order_by('team_position'))
-
-    # Store NPC team state in battle rewards
-    npc_team_state = {
+    team = NPCBattleTeam.objects.create(
+        battle=battle,
+        npc=npc,
+        call_sign=npc.call_sign,
+        difficulty_rating=npc.difficulty_rating,
+    )
+    NPCBattleCoreState.objects.bulk_create([
+        NPCBattleCoreState(
+            team=team,
+            npc_core_id=record['id'],
+            core_ref=record['id'],
+            position=i,
+            current_hp=record['max_hp'],
+            max_hp=record['max_hp'],
+        )
+        for i, record in enumerate(loadout.get_loadout(battle)['npc'])
+    ])
+    return team
+
+
+# ============================================================================
+# Kernel adapters
+# ============================================================================
+
+def _fresh_core(record: dict, position: int) -> dict:
+    """Kernel core dict at full HP from a static loadout record."""
+    return {
+        **record,
+        'position': position,
+        'current_hp': record['max_hp'],
+        'is_knocked_out': False,
+        'status_effects': [],
+        'last_dice_roll': None,
+    }
+
+
+def build_core_state(core: Core, position: int) -> dict:
+    """Fresh kernel core dict for a player Core at full HP."""
+    return _fresh_core(loadout.player_core_record(core), position)
+
+
+def build_npc_team_state(npc: NPCOperator) -> dict:
+    """Fresh kernel team dict for an NPC roster (pools empty, full HP)."""
+    npc_cores = npc.cores.prefetch_related('equipped_moves').order_by('team_position')
+
+    return {
         'energy_pool': 0,
         'physical_pool': 0,
         'active_core_index': 0,
-        'cores': []
+        'cores': [
+            _fresh_core(loadout.npc_core_record(core), core.team_position)
+            for core in npc_cores
+        ],
     }
 
-    for core in npc_cores:
-        core_state = {
-            'id': str(core.id),
-            'name': core.name,
-            'core_type': core.core_type,
-            'rarity': core.rarity,
-            'lvl': core.lvl,
-            'image_url': core.image_url,
-            'position': core.team_position,
-            'current_hp': core.hp,
-            'max_hp': core.hp,
-            'is_knocked_out': False,
-            'status_effects': [],
-            'stats': {
-                'hp': core.hp,
-                'physical': core.physical,
-                'energy': core.energy,
-                'defense': core.defense,
-                'shield': core.shield,
-                'speed': core.speed,
-            },
-            'equipped_moves': [
-                {
-                    'id': str(em.move.id),
-                    'name': em.move.name,
-                    'slot': em.slot,
-                    'dmg_type': em.move.dmg_type,
-                    'dmg': em.move.dmg,
-                    'accuracy': em.move.accuracy,
-                    'resource_cost': em.move.resource_cost,
-                    'type': em.move.type,
-                    'core_type_identity': em.move.core_type_identity,
-                }
-                for em in core.equipped_moves.all()
-            ]
-        }
-        npc_team_state['cores'].append(core_state)
 
-    battle.rewards['npc_team'] = npc_team_state
-    battle.save(update_fields=['rewards'])
+def _core_dict(state, record: dict) -> dict:
+    return {
+        **record,
+        'position': state.position,
+        'current_hp': state.current_hp,
+        'max_hp': state.max_hp,
+        'is_knocked_out': state.is_knocked_out,
+        'status_effects': list(state.status_effects or []),
+        'last_dice_roll': state.last_dice_roll,
+    }
 
-    return None  # No actual BattleTeam record for NPC
+
+def _team_dict(team, records: list[dict]) -> Optional[dict]:
+    """Kernel team: per-turn state from the team rows joined with the loadout."""
+    if team is None:
+        return None
+    return {
+        'energy_pool': team.energy_pool,
+        'physical_pool': team.physical_pool,
+        'active_core_index': team.active_core_index,
+        'cores': [
+            _core_dict(state, records[state.position])
+            for state in _get_core_states(team)
+        ],
+    }
+
+
+def load_state(battle: Battle) -> dict:
+    """Build kernel state from the battle's (cached) rows and its loadout."""
+    records = loadout.get_loadout(battle)
+    return {
+        'current_turn': battle.current_turn,
+        'teams': {
+            'player': _team_dict(_get_player_team(battle), records['player']),
+            'npc': _team_dict(_get_npc_team(battle), records['npc']),
+        },
+    }
+
+
+def store_state(battle: Battle, state: dict) -> None:
+    """Write kernel state back onto the battle's rows (in memory, no save)."""
+    for side in battle_kernel.SIDES:
+        _store_team(_get_team(battle, side), state['teams'][side])
+
+
+def _store_team(team, data: Optional[dict]) -> None:
+    if team is None or not data:
+        return
+    team.energy_pool = data['energy_pool']
+    team.physical_pool = data['physical_pool']
+    team.active_core_index = data['active_core_index']
+
+    cores_by_position = {core['position']: core for core in data['cores']}
+    for core_state in _get_core_states(team):
+        core = cores_by_position.get(core_state.position)
+        if core is None:
+            continue
+        core_state.current_hp = core['current_hp']
+        core_state.is_knocked_out = core['is_knocked_out']
+        core_state.status_effects = core['status_effects']
+        core_state.last_dice_roll = core.get('last_dice_roll')
+
+
+def _turn_log(battle: Battle):
+    """
+    The battle's TurnLog, synced to the current turn, or None when the
+    battle is not held by a session (nothing is recorded then).
+    """
+    session = battle_session.get_session(battle.id)
+    if session is None or session.battle is not battle:
+        return None
+    session.turn_log.sync(load_state)
+    return session.turn_log
 
 
 def validate_action(battle: Battle, team_side: str, action_type: str, action_data: dict) -> tuple[bool, str]:
@@ -159,478 +259,30 @@ def validate_action(battle: Battle, team_side: str, action_type: str, action_dat
     Returns:
         (is_valid, error_message)
     """
-    if team_side == 'player':
-        team = battle.teams.first()
-        if not team:
-            return False, "Player team not found"
-
-        active_core_state = team.core_states.filter(position=team.active_core_index).first()
-        if not active_core_state:
-            return False, "Active core not found"
-
-        if active_core_state.is_knocked_out:
-            if action_type != 'switch':
-                return False, "Active core is knocked out - must switch"
-    else:
+    if team_side != 'player':
         # NPC validation happens in npc_ai
-        pass
-
-    if action_type == 'gain_resource':
         return True, ""
 
-    if action_type == 'move':
-        move_id = action_data.get('move_id')
-        if not move_id:
-            return False, "No move specified"
-
-        if team_side == 'player':
-            # Check if the move is equipped
-            core = active_core_state.core
-            equipped = core.coreequippedmove_set.filter(move_id=move_id).first()
-            if not equipped:
-                return False, "Move not equipped on active core"
-
-            move = equipped.move
-
-            # Check resource cost
-            if move.dmg_type == 'ENERGY':
-                if team.energy_pool < move.resource_cost:
-                    return False, f"Not enough energy ({team.energy_pool}/{move.resource_cost})"
-            else:  # PHYSICAL
-                if team.physical_pool < move.resource_cost:
-                    return False, f"Not enough physical ammo ({team.physical_pool}/{move.resource_cost})"
-
-    elif action_type == 'switch':
-        new_index = action_data.get('new_core_index')
-        if new_index is None:
-            return False, "No core index specified for switch"
-
-        if team_side == 'player':
-            if new_index < 0 or new_index > 2:
-                return False, "Invalid core index"
-
-            target_state = team.core_states.filter(position=new_index).first()
-            if not target_state:
-                return False, "Target core not found"
-
-            if target_state.is_knocked_out:
-                return False, "Cannot switch to knocked out core"
-
-            if new_index == team.active_core_index:
-                return False, "Already active core"
-
-    return True, ""
+    return battle_kernel.validate_action(load_state(battle), team_side, action_type, action_data)
 
 
 def execute_move(battle: Battle, team_side: str, move_data: dict) -> dict:
     """
     Execute a move action. Returns result data.
-    Branches on Attack vs non-Attack moves (status effects).
+    Player moves pass {'move_id'}; NPC moves pass the chosen {'move': {...}}.
     """
-    from battle.constants import MOVE_EFFECT_MAP
-    from battle.services import status_effects
-
-    result = {
-        'action_type': 'move',
-        'success': False,
-        'damage_dealt': 0,
-        'was_critical': False,
-        'accuracy_check': False,
-        'stab': False,
-        'move_name': '',
-        'source_core': '',
-        'target_core': '',
-        'effect_applied': None,
-        'effect_message': None,
-        'dodged_by': None,
-        'stunned': False,
-        'confused_self_hit': False,
-        'heal_amount': 0,
-    }
-
-    if team_side == 'player':
-        player_team = battle.teams.first()
-        active_state = player_team.core_states.filter(position=player_team.active_core_index).first()
-        core = active_state.core
-
-        equipped = core.coreequippedmove_set.filter(move_id=move_data['move_id']).first()
-        move = equipped.move
-
-        # Check if attacker is stunned
-        attacker_effects = list(active_state.status_effects or [])
-        if status_effects.check_stun(attacker_effects):
-            # Remove the stun effect and skip turn
-            active_state.status_effects = [e for e in attacker_effects if e['effect_type'] != 'stun']
-            active_state.save()
-            result.update({
-                'success': True,
-                'stunned': True,
-                'move_name': move.name,
-                'source_core': core.name,
-            })
-            return result
-
-        # Check confusion — may hit self
-        if status_effects.check_confusion(attacker_effects):
-            # Deduct resource cost
-            if move.dmg_type == 'ENERGY':
-                player_team.energy_pool -= move.resource_cost
-            else:
-                player_team.physical_pool -= move.resource_cost
-            player_team.save()
-
-            self_dmg = max(1, int(active_state.max_hp * 0.10))
-            active_state.current_hp = max(0, active_state.current_hp - self_dmg)
-            if active_state.current_hp <= 0:
-                active_state.is_knocked_out = True
-            active_state.save()
-
-            result.update({
-                'success': True,
-                'confused_self_hit': True,
-                'damage_dealt': self_dmg,
-                'move_name': move.name,
-                'source_core': core.name,
-                'target_core': core.name,
-            })
-            return result
-
-        # Deduct resource cost
-        if move.dmg_type == 'ENERGY':
-            player_team.energy_pool -= move.resource_cost
-        else:
-            player_team.physical_pool -= move.resource_cost
-        player_team.save()
-
-        # Check if this is a status effect move
-        effect_def = MOVE_EFFECT_MAP.get(move.name)
-        if effect_def and move.type != 'Attack':
-            return _apply_status_move(
-                battle, result, effect_def, move.name,
-                user_side='player', active_state=active_state, core=core
-            )
-
-        # Attack move — get NPC target
-        npc_team = battle.rewards.get('npc_team', {})
-        npc_active_idx = npc_team.get('active_core_index', 0)
-        npc_cores = npc_team.get('cores', [])
-        target_core = npc_cores[npc_active_idx] if npc_cores else None
-
-        if target_core and not target_core.get('is_knocked_out'):
-            # Check defender dodge effects
-            defender_effects = target_core.get('status_effects', [])
-            dodged, dodge_name = status_effects.check_dodge(defender_effects)
-            if dodged:
-                target_core['status_effects'] = status_effects.remove_expired(defender_effects)
-                battle.rewards['npc_team'] = npc_team
-                battle.save(update_fields=['rewards'])
-                result.update({
-                    'success': True,
-                    'accuracy_check': False,
-                    'dodged_by': dodge_name,
-                    'move_name': move.name,
-                    'source_core': core.name,
-                    'target_core': target_core['name'],
-                })
-                return result
-
-            # Get attacker stats
-            attacker_stats = core.battle_info
-
-            # Get defender stat modifiers from effects
-            stat_mods = status_effects.get_stat_modifier(defender_effects)
-            modified_defender_stats = dict(target_core['stats'])
-            for stat_name, multiplier in stat_mods.items():
-                if stat_name in modified_defender_stats:
-                    modified_defender_stats[stat_name] = int(modified_defender_stats[stat_name] * multiplier)
-
-            # Get attacker accuracy modifier from debuffs
-            acc_mod = status_effects.get_accuracy_modifier(attacker_effects)
-
-            damage = calculate_damage(
-                attacker_stats={'physical': attacker_stats.physical, 'energy': attacker_stats.energy},
-                defender_stats=modified_defender_stats,
-                move={'dmg': move.dmg, 'dmg_type': move.dmg_type, 'accuracy': move.accuracy * acc_mod},
-                attacker_level=core.lvl,
-                attacker_type=core.type,
-                move_type_identity=move.core_type_identity,
-            )
-
-            # Apply damage reduction from defensive effects
-            if damage['hit']:
-                dmg_mod = status_effects.get_damage_modifier(defender_effects)
-                damage['damage'] = max(1, int(damage['damage'] * dmg_mod))
-
-            target_core['current_hp'] = max(0, target_core['current_hp'] - damage['damage'])
-            if target_core['current_hp'] <= 0:
-                target_core['is_knocked_out'] = True
-
-            battle.rewards['npc_team'] = npc_team
-            battle.save(update_fields=['rewards'])
-
-            result.update({
-                'success': True,
-                'damage_dealt': damage['damage'],
-                'was_critical': damage['critical'],
-                'accuracy_check': damage['hit'],
-                'stab': damage.get('stab', False),
-                'move_name': move.name,
-                'source_core': core.name,
-                'target_core': target_core['name'],
-            })
-    else:
-        # NPC attacking player
-        npc_team = battle.rewards.get('npc_team', {})
-        npc_active_idx = npc_team.get('active_core_index', 0)
-        npc_cores = npc_team.get('cores', [])
-        attacker = npc_cores[npc_active_idx] if npc_cores else None
-
-        if not attacker:
-            return result
-
-        move = move_data.get('move')
-        if not move:
-            return result
-
-        # Check if NPC attacker is stunned
-        attacker_effects = attacker.get('status_effects', [])
-        if status_effects.check_stun(attacker_effects):
-            attacker['status_effects'] = [e for e in attacker_effects if e['effect_type'] != 'stun']
-            battle.rewards['npc_team'] = npc_team
-            battle.save(update_fields=['rewards'])
-            result.update({
-                'success': True,
-                'stunned': True,
-                'move_name': move['name'],
-                'source_core': attacker['name'],
-            })
-            return result
-
-        # Check NPC confusion
-        if status_effects.check_confusion(attacker_effects):
-            if move['dmg_type'] == 'ENERGY':
-                npc_team['energy_pool'] = max(0, npc_team.get('energy_pool', 0) - move['resource_cost'])
-            else:
-                npc_team['physical_pool'] = max(0, npc_team.get('physical_pool', 0) - move['resource_cost'])
-
-            self_dmg = max(1, int(attacker['max_hp'] * 0.10))
-            attacker['current_hp'] = max(0, attacker['current_hp'] - self_dmg)
-            if attacker['current_hp'] <= 0:
-                attacker['is_knocked_out'] = True
-
-            battle.rewards['npc_team'] = npc_team
-            battle.save(update_fields=['rewards'])
-            result.update({
-                'success': True,
-                'confused_self_hit': True,
-                'damage_dealt': self_dmg,
-                'move_name': move['name'],
-                'source_core': attacker['name'],
-                'target_core': attacker['name'],
-            })
-            return result
-
-        # Deduct NPC resources
-        if move['dmg_type'] == 'ENERGY':
-            npc_team['energy_pool'] = max(0, npc_team.get('energy_pool', 0) - move['resource_cost'])
-        else:
-            npc_team['physical_pool'] = max(0, npc_team.get('physical_pool', 0) - move['resource_cost'])
-
-        # Check if this is a status effect move
-        effect_def = MOVE_EFFECT_MAP.get(move['name'])
-        if effect_def and move.get('type') != 'Attack':
-            return _apply_npc_status_move(
-                battle, result, effect_def, move['name'],
-                npc_team=npc_team, attacker=attacker
-            )
-
-        # Attack move — get player target
-        player_team = battle.teams.first()
-        target_state = player_team.core_states.filter(position=player_team.active_core_index).first()
-
-        if target_state and not target_state.is_knocked_out:
-            # Check defender dodge effects
-            defender_effects = list(target_state.status_effects or [])
-            dodged, dodge_name = status_effects.check_dodge(defender_effects)
-            if dodged:
-                target_state.status_effects = status_effects.remove_expired(defender_effects)
-                target_state.save()
-                battle.rewards['npc_team'] = npc_team
-                battle.save(update_fields=['rewards'])
-                result.update({
-                    'success': True,
-                    'accuracy_check': False,
-                    'dodged_by': dodge_name,
-                    'move_name': move['name'],
-                    'source_core': attacker['name'],
-                    'target_core': target_state.core.name,
-                })
-                return result
-
-            # Get defender stat modifiers from effects
-            stat_mods = status_effects.get_stat_modifier(defender_effects)
-            base_defense = target_state.core.battle_info.defense
-            base_shield = target_state.core.battle_info.shield
-            modified_defender_stats = {
-                'defense': int(base_defense * stat_mods.get('defense', 1.0)),
-                'shield': int(base_shield * stat_mods.get('shield', 1.0)),
-            }
-
-            # Get attacker accuracy modifier from debuffs
-            acc_mod = status_effects.get_accuracy_modifier(attacker_effects)
-            modified_move = dict(move)
-            modified_move['accuracy'] = move['accuracy'] * acc_mod
-
-            damage = calculate_damage(
-                attacker_stats=attacker['stats'],
-                defender_stats=modified_defender_stats,
-                move=modified_move,
-                attacker_level=attacker.get('lvl', 5),
-                attacker_type=attacker.get('core_type', ''),
-                move_type_identity=move.get('core_type_identity', ''),
-            )
-
-            # Apply damage reduction from defensive effects
-            if damage['hit']:
-                dmg_mod = status_effects.get_damage_modifier(defender_effects)
-                damage['damage'] = max(1, int(damage['damage'] * dmg_mod))
-
-            target_state.current_hp = max(0, target_state.current_hp - damage['damage'])
-            if target_state.current_hp <= 0:
-                target_state.is_knocked_out = True
-            target_state.save()
-
-            result.update({
-                'success': True,
-                'damage_dealt': damage['damage'],
-                'was_critical': damage['critical'],
-                'accuracy_check': damage['hit'],
-                'stab': damage.get('stab', False),
-                'move_name': move['name'],
-                'source_core': attacker['name'],
-                'target_core': target_state.core.name,
-            })
-
-        battle.rewards['npc_team'] = npc_team
-        battle.save(update_fields=['rewards'])
-
-    return result
-
-
-def _apply_status_move(battle, result, effect_def, move_name, user_side, active_state, core):
-    """Apply a status effect move for the player side."""
-    from battle.services import status_effects
-    import random as _random
-
-    result.update({
-        'success': True,
-        'move_name': move_name,
-        'source_core': core.name,
-    })
-
-    # Check apply chance
-    if _random.random() > effect_def.get('apply_chance', 1.0):
-        result['effect_message'] = f"{move_name} failed to take effect!"
-        return result
-
-    # Instant heal
-    if effect_def['effect_type'] == 'heal':
-        heal_amt = int(active_state.max_hp * effect_def.get('value', 0.25))
-        active_state.current_hp = min(active_state.max_hp, active_state.current_hp + heal_amt)
-        active_state.save()
-        result['heal_amount'] = heal_amt
-        result['effect_applied'] = 'heal'
-        result['effect_message'] = f"{core.name} {effect_def['message']} Restored {heal_amt} HP!"
-        return result
-
-    effect_data = {
-        'effect_type': effect_def['effect_type'],
-        'turns_remaining': effect_def.get('turns_remaining', 1),
-        'value': effect_def.get('value', 0),
-        'source_move': move_name,
-    }
-
-    if effect_def.get('target') == 'self':
-        effects = list(active_state.status_effects or [])
-        effects, msg = status_effects.apply_effect(effects, effect_data)
-        active_state.status_effects = effects
-        active_state.save()
-    else:
-        # Apply to enemy (NPC)
-        npc_team = battle.rewards.get('npc_team', {})
-        npc_active_idx = npc_team.get('active_core_index', 0)
-        npc_cores = npc_team.get('cores', [])
-        target = npc_cores[npc_active_idx] if npc_cores else None
-        if target:
-            effects = target.get('status_effects', [])
-            effects, msg = status_effects.apply_effect(effects, effect_data)
-            target['status_effects'] = effects
-            result['target_core'] = target['name']
-        battle.rewards['npc_team'] = npc_team
-        battle.save(update_fields=['rewards'])
-
-    result['effect_applied'] = effect_def['effect_type']
-    result['effect_message'] = f"{core.name} {effect_def['message']}"
-    return result
-
-
-def _apply_npc_status_move(battle, result, effect_def, move_name, npc_team, attacker):
-    """Apply a status effect move for the NPC side."""
-    from battle.services import status_effects
-    import random as _random
-
-    result.update({
-        'success': True,
-        'move_name': move_name,
-        'source_core': attacker['name'],
-    })
-
-    # Check apply chance
-    if _random.random() > effect_def.get('apply_chance', 1.0):
-        result['effect_message'] = f"{move_name} failed to take effect!"
-        battle.rewards['npc_team'] = npc_team
-        battle.save(update_fields=['rewards'])
-        return result
-
-    # Instant heal
-    if effect_def['effect_type'] == 'heal':
-        heal_amt = int(attacker['max_hp'] * effect_def.get('value', 0.25))
-        attacker['current_hp'] = min(attacker['max_hp'], attacker['current_hp'] + heal_amt)
-        battle.rewards['npc_team'] = npc_team
-        battle.save(update_fields=['rewards'])
-        result['heal_amount'] = heal_amt
-        result['effect_applied'] = 'heal'
-        result['effect_message'] = f"{attacker['name']} {effect_def['message']} Restored {heal_amt} HP!"
-        return result
-
-    effect_data = {
-        'effect_type': effect_def['effect_type'],
-        'turns_remaining': effect_def.get('turns_remaining', 1),
-        'value': effect_def.get('value', 0),
-        'source_move': move_name,
-    }
-
-    if effect_def.get('target') == 'self':
-        effects = attacker.get('status_effects', [])
-        effects, msg = status_effects.apply_effect(effects, effect_data)
-        attacker['status_effects'] = effects
-        battle.rewards['npc_team'] = npc_team
-        battle.save(update_fields=['rewards'])
-    else:
-        # Apply to player
-        player_team = battle.teams.first()
-        target_state = player_team.core_states.filter(position=player_team.active_core_index).first()
-        if target_state:
-            effects = list(target_state.status_effects or [])
-            effects, msg = status_effects.apply_effect(effects, effect_data)
-            target_state.status_effects = effects
-            target_state.save()
-            result['target_core'] = target_state.core.name
-        battle.rewards['npc_team'] = npc_team
-        battle.save(update_fields=['rewards'])
-
-    result['effect_applied'] = effect_def['effect_type']
-    result['effect_message'] = f"{attacker['name']} {effect_def['message']}"
+    log = _turn_log(battle)
+    state = load_state(battle)
+    move = move_data.get('move') or battle_kernel.find_equipped_move(
+        battle_kernel.get_active_core(state['teams'][team_side]), move_data.get('move_id')
+    )
+    with battle_stream(battle) as rng:
+        state, result = battle_kernel.apply_action(
+            state, team_side, {**move_data, 'action_type': 'move'}, rng
+        )
+    store_state(battle, state)
+    if log:
+        log.record_action(team_side, {'action_type': 'move', 'move': move}, result)
     return result
 
 
@@ -638,56 +290,20 @@ def execute_switch(battle: Battle, team_side: str, new_index: int) -> dict:
     """
     Execute a switch action. Clears status effects on the outgoing core.
     """
-    from battle.services import status_effects
-
-    result = {
-        'action_type': 'switch',
-        'success': False,
-        'new_active_core': '',
-        'old_active_core': '',
-    }
-
-    if team_side == 'player':
-        team = battle.teams.first()
-        old_state = team.core_states.filter(position=team.active_core_index).first()
-        new_state = team.core_states.filter(position=new_index).first()
-
-        if new_state and not new_state.is_knocked_out:
-            # Clear effects on outgoing core
-            if old_state and old_state.status_effects:
-                old_state.status_effects = status_effects.clear_effects(old_state.status_effects)
-                old_state.save()
-
-            team.active_core_index = new_index
-            team.save()
+    log = _turn_log(battle)
+    state, result = battle_kernel.resolve_switch(load_state(battle), team_side, new_index)
+    store_state(battle, state)
+    if log:
+        log.record_action(team_side, {'action_type': 'switch', 'new_core_index': new_index}, result)
+    return result
 
-            result.update({
-                'success': True,
-                'new_active_core': new_state.core.name,
-                'old_active_core': old_state.core.name if old_state else '',
-            })
-    else:
-        npc_team = battle.rewards.get('npc_team', {})
-        npc_cores = npc_team.get('cores', [])
-        old_idx = npc_team.get('active_core_index', 0)
-
-        if 0 <= new_index < len(npc_cores):
-            target = npc_cores[new_index]
-            if not target.get('is_knocked_out'):
-                # Clear effects on outgoing NPC core
-                if old_idx < len(npc_cores):
-                    npc_cores[old_idx]['status_effects'] = []
-
-                npc_team['active_core_index'] = new_index
-                battle.rewards['npc_team'] = npc_team
-                battle.save(update_fields=['rewards'])
-
-                result.update({
-                    'success': True,
-                    'new_active_core': target['name'],
-                    'old_active_core': npc_cores[old_idx]['name'] if old_idx < len(npc_cores) else '',
-                })
 
+def execute_pass(battle: Battle, team_side: str) -> dict:
+    """Record a pass. Nothing else happens."""
+    result = {'action_type': 'pass', 'success': True}
+    log = _turn_log(battle)
+    if log:
+        log.record_action(team_side, {'action_type': 'pass'}, result)
     return result
 
 
@@ -716,6 +332,9 @@ def execute_gain_resource(battle: Battle, team_side: str) -> dict:
         pools = allocate_dice(battle, 'npc', npc_allocations)
         result['pools'] = pools
 
+    log = _turn_log(battle)
+    if log:
+        log.record_action(team_side, {'action_type': 'gain_resource'}, result)
     return result
 
 
@@ -727,205 +346,51 @@ def process_turn_effects(battle: Battle) -> list:
     Returns:
         List of effect event dicts for the frontend (heals, expirations).
     """
-    from battle.services import status_effects
-
-    events = []
-
-    # Player side
-    player_team = battle.teams.first()
-    if player_team:
-        active_state = player_team.core_states.filter(
-            position=player_team.active_core_index
-        ).first()
-        if active_state and active_state.status_effects:
-            effects = list(active_state.status_effects)
-            effects, heal_amt, expired = status_effects.process_turn_start_effects(
-                effects, active_state.max_hp
-            )
-            if heal_amt > 0:
-                active_state.current_hp = min(active_state.max_hp, active_state.current_hp + heal_amt)
-                events.append({
-                    'team': 'player',
-                    'core_name': active_state.core.name,
-                    'type': 'heal',
-                    'amount': heal_amt,
-                })
-            for name in expired:
-                events.append({
-                    'team': 'player',
-                    'core_name': active_state.core.name,
-                    'type': 'effect_expired',
-                    'effect_name': name,
-                })
-            active_state.status_effects = effects
-            active_state.save()
-
-    # NPC side
-    npc_team = battle.rewards.get('npc_team', {})
-    npc_active_idx = npc_team.get('active_core_index', 0)
-    npc_cores = npc_team.get('cores', [])
-    if npc_cores and npc_active_idx < len(npc_cores):
-        npc_core = npc_cores[npc_active_idx]
-        npc_effects = npc_core.get('status_effects', [])
-        if npc_effects:
-            npc_effects, heal_amt, expired = status_effects.process_turn_start_effects(
-                npc_effects, npc_core.get('max_hp', 100)
-            )
-            if heal_amt > 0:
-                npc_core['current_hp'] = min(npc_core['max_hp'], npc_core['current_hp'] + heal_amt)
-                events.append({
-                    'team': 'enemy',
-                    'core_name': npc_core['name'],
-                    'type': 'heal',
-                    'amount': heal_amt,
-                })
-            for name in expired:
-                events.append({
-                    'team': 'enemy',
-                    'core_name': npc_core['name'],
-                    'type': 'effect_expired',
-                    'effect_name': name,
-                })
-            npc_core['status_effects'] = npc_effects
-            battle.rewards['npc_team'] = npc_team
-            battle.save(update_fields=['rewards'])
-
+    _turn_log(battle)
+    state, events = battle_kernel.tick_effects(load_state(battle))
+    store_state(battle, state)
     return events
 
 
-def calculate_damage(attacker_stats: dict, defender_stats: dict, move: dict,
-                     attacker_level: int = 5,
-                     attacker_type: str = '', move_type_identity: str = '') -> dict:
-    """
-    Calculate damage using Pokémon-inspired Gen V+ formula adapted for CoDEX stat ranges.
-
-    Formula:
-        level_factor = (2 * level / 5) + 2
-        stat_ratio = (attack + S) / (defense + S)
-        damage = (level_factor * base_damage * stat_ratio) / 3 + 2
-        damage *= uniform(0.85, 1.0)
-        damage *= STAB (1.25x if core type matches move type identity)
-        crit: 6.25% chance, 1.5x
-    """
-    from battle.constants import (
-        DAMAGE_STAT_SMOOTHING, DAMAGE_DIVISOR, DAMAGE_FLAT_BONUS,
-        DAMAGE_VARIANCE_MIN, DAMAGE_VARIANCE_MAX,
-        BASE_CRITICAL_CHANCE, CRITICAL_HIT_MULTIPLIER, MIN_DAMAGE,
-        STAB_MULTIPLIER,
-    )
-
-    base_damage = move.get('dmg', 0)
-    dmg_type = move.get('dmg_type', 'PHYSICAL')
-    accuracy = move.get('accuracy', 1.0)
-
-    # Accuracy check
-    hit = random.random() <= accuracy
-    if not hit:
-        return {'damage': 0, 'critical': False, 'hit': False, 'stab': False}
-
-    # Get relevant stats
-    if dmg_type == 'ENERGY':
-        attack = attacker_stats.get('energy', 10)
-        defense = defender_stats.get('shield', 10)
-    else:
-        attack = attacker_stats.get('physical', 10)
-        defense = defender_stats.get('defense', 10)
-
-    # Prevent division by zero
-    defense = max(1, defense)
-
-    # Pokémon-inspired damage formula
-    level_factor = (2 * attacker_level / 5) + 2
-    stat_ratio = (attack + DAMAGE_STAT_SMOOTHING) / (defense + DAMAGE_STAT_SMOOTHING)
-    damage = (level_factor * base_damage * stat_ratio) / DAMAGE_DIVISOR + DAMAGE_FLAT_BONUS
-
-    # Random variance (85-100%, matching Pokémon)
-    variance = random.uniform(DAMAGE_VARIANCE_MIN, DAMAGE_VARIANCE_MAX)
-    damage *= variance
-
-    # STAB: Same-Type Attack Bonus
-    stab = (
-        bool(attacker_type) and bool(move_type_identity)
-        and attacker_type == move_type_identity
-    )
-    if stab:
-        damage *= STAB_MULTIPLIER
-
-    # Critical hit check (6.25% chance, 1.5x damage)
-    critical = random.random() < BASE_CRITICAL_CHANCE
-    if critical:
-        damage *= CRITICAL_HIT_MULTIPLIER
-
-    # Round to integer
-    damage = max(MIN_DAMAGE, int(damage))
-
-    return {'damage': damage, 'critical': critical, 'hit': True, 'stab': stab}
-
-
 def check_team_defeated(battle: Battle, team_side: str) -> bool:
     """
     Check if all cores on a team are knocked out.
     """
-    if team_side == 'player':
-        team = battle.teams.first()
-        if not team:
-            return True
-        return all(
-            state.is_knocked_out
-            for state in team.core_states.all()
-        )
-    else:
-        npc_team = battle.rewards.get('npc_team', {})
-        npc_cores = npc_team.get('cores', [])
-        return all(core.get('is_knocked_out', False) for core in npc_cores)
+    team = _get_team(battle, team_side)
+    if not team:
+        return True
+    return all(
+        state.is_knocked_out
+        for state in _get_core_states(team)
+    )
 
 
 def serialize_battle_state(battle: Battle) -> dict:
     """
     Serialize the full battle state for frontend consumption.
     """
-    player_team = battle.teams.first()
-    npc_team = battle.rewards.get('npc_team', {})
+    records = loadout.get_loadout(battle)
+    player_team = _get_player_team(battle)
 
     player_data = None
     if player_team:
         player_cores = []
-        for state in player_team.core_states.select_related('core', 'core__battle_info').prefetch_related('core__coreequippedmove_set__move').order_by('position'):
-            core = state.core
+        for state in _get_core_states(player_team):
+            record = records['player'][state.position]
             player_cores.append({
-                'id': str(core.id),
-                'name': core.name,
-                'type': core.type,
-                'rarity': core.rarity,
-                'lvl': core.lvl,
-                'image_url': core.image_url,
+                'id': record['id'],
+                'name': record['name'],
+                'type': record['core_type'],
+                'rarity': record['rarity'],
+                'lvl': record['lvl'],
+                'image_url': record['image_url'],
                 'position': state.position,
                 'current_hp': state.current_hp,
                 'max_hp': state.max_hp,
                 'is_knocked_out': state.is_knocked_out,
                 'status_effects': state.status_effects or [],
-                'stats': {
-                    'hp': core.battle_info.hp,
-                    'physical': core.battle_info.physical,
-                    'energy': core.battle_info.energy,
-                    'defense': core.battle_info.defense,
-                    'shield': core.battle_info.shield,
-                    'speed': core.battle_info.speed,
-                },
-                'equipped_moves': [
-                    {
-                        'id': str(em.move.id),
-                        'name': em.move.name,
-                        'slot': em.slot,
-                        'dmg_type': em.move.dmg_type,
-                        'dmg': em.move.dmg,
-                        'accuracy': em.move.accuracy,
-                        'resource_cost': em.move.resource_cost,
-                        'type': em.move.type,
-                        'core_type_identity': em.move.core_type_identity,
-                    }
-                    for em in core.coreequippedmove_set.all()
-                ]
+                'stats': record['stats'],
+                'equipped_moves': record['equipped_moves'],
             })
 
         player_data = {
@@ -935,14 +400,57 @@ def serialize_battle_state(battle: Battle) -> dict:
             'cores': player_cores,
         }
 
+    npc_row = _get_npc_team(battle)
+    npc_team = _team_dict(npc_row, records['npc'])
+    if npc_team:
+        npc_team = {
+            **npc_team,
+            'cores': [
+                {k: v for k, v in core.items() if k != 'moves_by_id'}
+                for core in npc_team['cores']
+            ],
+        }
+
     return {
         'battle_id': str(battle.id),
         'status': battle.status,
         'current_turn': battle.current_turn,
         'player_team': player_data,
         'enemy_team': npc_team,
-        'npc_id': battle.rewards.get('npc_id'),
-        'npc_name': battle.rewards.get('npc_name'),
+        'npc_id': str(npc_row.npc_id) if npc_row and npc_row.npc_id else None,
+        'npc_name': npc_row.call_sign if npc_row else None,
+    }
+
+
+def serialize_battle_view(battle: Battle) -> dict:
+    """
+    The parts of serialize_battle_state() that change during a battle, in
+    the same shape, so state_patch diffs of two views apply to the full
+    state the client holds.
+    """
+    return {
+        'status': battle.status,
+        'current_turn': battle.current_turn,
+        'player_team': _team_view(_get_player_team(battle)),
+        'enemy_team': _team_view(_get_npc_team(battle)),
+    }
+
+
+def _team_view(team) -> Optional[dict]:
+    if team is None:
+        return None
+    return {
+        'energy_pool': team.energy_pool,
+        'physical_pool': team.physical_pool,
+        'active_core_index': team.active_core_index,
+        'cores': [
+            {
+                'current_hp': state.current_hp,
+                'is_knocked_out': state.is_knocked_out,
+                'status_effects': [dict(e) for e in state.status_effects or []],
+            }
+            for state in _get_core_states(team)
+        ],
     }
 
 
@@ -951,38 +459,34 @@ def roll_dice_for_team(battle: Battle, team_side: str) -> list[dict]:
     Roll d8 for each non-KO'd core on a team.
     Returns list of dice roll data.
     """
-    rolls = []
-
-    if team_side == 'player':
-        team = battle.teams.first()
-        for state in team.core_states.filter(is_knocked_out=False):
-            roll_value = random.randint(1, 8)
-            state.last_dice_roll = roll_value
-            state.save(update_fields=['last_dice_roll'])
-            rolls.append({
-                'core_id': str(state.core.id),
-                'core_name': state.core.name,
-                'roll_value': roll_value,
-                'allocated_to': None,
-            })
-    else:
-        npc_team = battle.rewards.get('npc_team', {})
-        for core in npc_team.get('cores', []):
-            if not core.get('is_knocked_out'):
-                roll_value = random.randint(1, 8)
-                core['last_dice_roll'] = roll_value
-                rolls.append({
-                    'core_id': core['id'],
-                    'core_name': core['name'],
-                    'roll_value': roll_value,
-                    'allocated_to': None,
-                })
-        battle.rewards['npc_team'] = npc_team
-        battle.save(update_fields=['rewards'])
-
+    log = _turn_log(battle)
+    with battle_stream(battle) as rng:
+        state, rolls = battle_kernel.roll_dice(load_state(battle), team_side, rng)
+    store_state(battle, state)
+    _get_team(battle, team_side).dice_pending = True
+    if log:
+        log.record_dice(team_side, rolls)
     return rolls
 
 
+def pending_dice(battle: Battle, team_side: str) -> list[dict]:
+    """The team's rolls from roll_dice_for_team that have not been allocated yet."""
+    team = _get_team(battle, team_side)
+    if not team or not team.dice_pending:
+        return []
+    records = loadout.get_loadout(battle)[team_side]
+    return [
+        {
+            'core_id': records[state.position]['id'],
+            'core_name': records[state.position]['name'],
+            'roll_value': state.last_dice_roll,
+            'allocated_to': None,
+        }
+        for state in _get_core_states(team)
+        if not state.is_knocked_out and state.last_dice_roll
+    ]
+
+
 def allocate_dice(battle: Battle, team_side: str, allocations: list[dict]) -> dict:
     """
     Allocate dice rolls to energy or physical pools.
@@ -993,49 +497,27 @@ def allocate_dice(battle: Battle, team_side: str, allocations: list[dict]) -> di
     Returns:
         Updated pool totals
     """
-    if team_side == 'player':
-        team = battle.teams.first()
-
-        for alloc in allocations:
-            state = team.core_states.filter(core_id=alloc['core_id']).first()
-            if state and state.last_dice_roll:
-                if alloc['pool'] == 'energy':
-                    team.energy_pool += state.last_dice_roll
-                else:
-                    team.physical_pool += state.last_dice_roll
-
-        team.save()
-        return {
-            'energy_pool': team.energy_pool,
-            'physical_pool': team.physical_pool,
-        }
-    else:
-        npc_team = battle.rewards.get('npc_team', {})
-
-        for alloc in allocations:
-            for core in npc_team.get('cores', []):
-                if core['id'] == alloc['core_id'] and core.get('last_dice_roll'):
-                    if alloc['pool'] == 'energy':
-                        npc_team['energy_pool'] = npc_team.get('energy_pool', 0) + core['last_dice_roll']
-                    else:
-                        npc_team['physical_pool'] = npc_team.get('physical_pool', 0) + core['last_dice_roll']
-
-        battle.rewards['npc_team'] = npc_team
-        battle.save(update_fields=['rewards'])
-
-        return {
-            'energy_pool': npc_team.get('energy_pool', 0),
-            'physical_pool': npc_team.get('physical_pool', 0),
-        }
+    state, pools = battle_kernel.allocate_dice(load_state(battle), team_side, allocations)
+    store_state(battle, state)
+    _get_team(battle, team_side).dice_pending = False
+    log = _turn_log(battle)
+    if log:
+        log.record_allocation(team_side, allocations)
+    return pools
 
 
 def end_battle(battle: Battle, winner_side: str) -> dict:
     """
-    Finalize the battle and return rewards.
+    Finalize the battle and return rewards (from the cached NPC; they are
+    paid out by battle/services/settlement.py).
     """
+    log = _turn_log(battle)
+    if log:
+        log.close(load_state)
+
     battle.status = 'COMPLETED'
 
-    npc_id = battle.rewards.get('npc_id')
+    npc_team = _get_npc_team(battle)
     result = {
         'winner': winner_side,
         'rewards': {},
@@ -1043,16 +525,9 @@ def end_battle(battle: Battle, winner_side: str) -> dict:
 
     if winner_side == 'player':
         # Player won - award rewards
-        if npc_id:
-            try:
-                npc = NPCOperator.objects.get(id=npc_id)
-                result['rewards'] = {
-                    'bits': npc.reward_bits,
-                    'exp': npc.reward_exp,
-                }
-                battle.winner = battle.operator_1
-            except NPCOperator.DoesNotExist:
-                pass
-
-    battle.save()
+        npc = npc_team.npc if npc_team else None
+        if npc:
+            result['rewards'] = settlement.rewards(npc)
+            battle.winner = battle.operator_1
+
     return result
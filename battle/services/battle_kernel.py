@@ -0,0 +1,636 @@
+# battle/services/battle_kernel.py
+"""
+Pure-Python battle kernel. No Django, no database.
+
+All game rules live here and operate on plain dict state:
+
+    state = {
+        'current_turn': int,
+        'teams': {
+            'player': team,
+            'npc': team,
+        },
+    }
+
+    team = {
+        'energy_pool': int,
+        'physical_pool': int,
+        'active_core_index': int,
+        'cores': [
+            {
+                'id', 'name', 'core_type', 'lvl', 'position',
+                'current_hp', 'max_hp', 'is_knocked_out',
+                'status_effects': [...], 'last_dice_roll',
+                'stats': {...}, 'equipped_moves': [...],
+            },
+        ],
+    }
+
+Both sides have the same shape, so npc_ai policies work on either side. Public functions follow
+(state, action, rng) -> (new_state, events): the input state is never
+mutated, and `events` is the result payload the frontend already consumes.
+`rng` is anything with random()/uniform()/randint() — the `random` module
+itself, or a seeded stream for simulation and replay.
+
+battle_engine adapts these functions to Battle/BattleTeam/BattleCoreState.
+"""
+import random
+
+from battle.constants import (
+    MOVE_EFFECT_MAP,
+    DAMAGE_STAT_SMOOTHING, DAMAGE_DIVISOR, DAMAGE_FLAT_BONUS,
+    DAMAGE_VARIANCE_MIN, DAMAGE_VARIANCE_MAX,
+    BASE_CRITICAL_CHANCE, CRITICAL_HIT_MULTIPLIER, MIN_DAMAGE,
+    STAB_MULTIPLIER, DICE_MIN, DICE_MAX,
+)
+from battle.services import status_effects
+
+
+SIDES = ('player', 'npc')
+
+# Labels used in effect_tick events (the frontend calls the NPC side "enemy")
+EVENT_TEAM_LABELS = {'player': 'player', 'npc': 'enemy'}
+
+# Side names in error messages
+SIDE_NAMES = {'player': 'Player', 'npc': 'NPC'}
+
+CONFUSION_SELF_DAMAGE = 0.10
+
+
+# ============================================================================
+# State helpers
+# ============================================================================
+
+def opponent_of(side: str) -> str:
+    return 'npc' if side == 'player' else 'player'
+
+
+def copy_state(state: dict) -> dict:
+    """
+    Copy everything a turn can change. Stats and equipped moves never change
+    during a battle, so they are shared rather than copied.
+    """
+    return {
+        **state,
+        'teams': {side: _copy_team(team) for side, team in state['teams'].items()},
+    }
+
+
+def _copy_team(team):
+    if not team:
+        return team
+    return {
+        **team,
+        'cores': [
+            {**core, 'status_effects': [dict(e) for e in core.get('status_effects', [])]}
+            for core in team.get('cores', [])
+        ],
+    }
+
+
+def new_battle_state(player_team: dict, npc_team: dict) -> dict:
+    """Fresh battle state: empty pools, first core active, every core at full HP."""
+    return {
+        'current_turn': 0,
+        'teams': {
+            'player': _fresh_team(player_team),
+            'npc': _fresh_team(npc_team),
+        },
+    }
+
+
+def _fresh_team(team: dict) -> dict:
+    return {
+        **team,
+        'energy_pool': 0,
+        'physical_pool': 0,
+        'active_core_index': 0,
+        'cores': [
+            {
+                **core,
+                'position': i,
+                'current_hp': core['max_hp'],
+                'is_knocked_out': False,
+                'status_effects': [],
+                'last_dice_roll': None,
+            }
+            for i, core in enumerate(team.get('cores', []))
+        ],
+    }
+
+
+def get_active_core(team):
+    """Return the team's active core dict, or None."""
+    if not team:
+        return None
+    cores = team.get('cores', [])
+    idx = team.get('active_core_index', 0)
+    return cores[idx] if 0 <= idx < len(cores) else None
+
+
+def find_equipped_move(core, move_id):
+    """Find a move dict on a core by id."""
+    if not core:
+        return None
+    if 'moves_by_id' in core:
+        return core['moves_by_id'].get(str(move_id))
+    for move in core.get('equipped_moves', []):
+        if str(move['id']) == str(move_id):
+            return move
+    return None
+
+
+def effect_of(move: dict):
+    """A move's status effect: resolved in the loadout, else looked up by name."""
+    if 'effect' in move:
+        return move['effect']
+    return MOVE_EFFECT_MAP.get(move['name'])
+
+
+def can_afford(team: dict, move: dict) -> bool:
+    if move.get('dmg_type') == 'ENERGY':
+        return team.get('energy_pool', 0) >= move.get('resource_cost', 0)
+    return team.get('physical_pool', 0) >= move.get('resource_cost', 0)
+
+
+def _pay(team: dict, move: dict) -> None:
+    if move.get('dmg_type') == 'ENERGY':
+        team['energy_pool'] = max(0, team.get('energy_pool', 0) - move.get('resource_cost', 0))
+    else:
+        team['physical_pool'] = max(0, team.get('physical_pool', 0) - move.get('resource_cost', 0))
+
+
+def _take_damage(core: dict, amount: int) -> None:
+    core['current_hp'] = max(0, core['current_hp'] - amount)
+    if core['current_hp'] <= 0:
+        core['is_knocked_out'] = True
+
+
+# ============================================================================
+# Validation
+# ============================================================================
+
+def validate_action(state: dict, side: str, action_type: str, action_data: dict) -> tuple[bool, str]:
+    """
+    Validate an action before execution.
+
+    Returns:
+        (is_valid, error_message)
+    """
+    team = state['teams'].get(side)
+    if not team:
+        return False, f"{SIDE_NAMES.get(side, side)} team not found"
+
+    active = get_active_core(team)
+    if not active:
+        return False, "Active core not found"
+
+    if active.get('is_knocked_out') and action_type != 'switch':
+        return False, "Active core is knocked out - must switch"
+
+    if action_type == 'gain_resource':
+        return True, ""
+
+    if action_type == 'move':
+        move_id = action_data.get('move_id')
+        if not move_id:
+            return False, "No move specified"
+
+        move = find_equipped_move(active, move_id)
+        if not move:
+            return False, "Move not equipped on active core"
+
+        if move['dmg_type'] == 'ENERGY':
+            if team['energy_pool'] < move['resource_cost']:
+                return False, f"Not enough energy ({team['energy_pool']}/{move['resource_cost']})"
+        else:  # PHYSICAL
+            if team['physical_pool'] < move['resource_cost']:
+                return False, f"Not enough physical ammo ({team['physical_pool']}/{move['resource_cost']})"
+
+    elif action_type == 'switch':
+        new_index = action_data.get('new_core_index')
+        if new_index is None:
+            return False, "No core index specified for switch"
+
+        if new_index < 0 or new_index > 2:
+            return False, "Invalid core index"
+
+        cores = team.get('cores', [])
+        if new_index >= len(cores):
+            return False, "Target core not found"
+
+        if cores[new_index].get('is_knocked_out'):
+            return False, "Cannot switch to knocked out core"
+
+        if new_index == team['active_core_index']:
+            return False, "Already active core"
+
+    return True, ""
+
+
+# ============================================================================
+# Actions
+# ============================================================================
+
+def apply_action(state: dict, side: str, action: dict, rng=random) -> tuple[dict, dict]:
+    """
+    Apply one action for `side`.
+
+    Args:
+        action: {'action_type': 'move'|'switch'|'gain_resource'|'pass', ...}
+            move: 'move' (move dict) or 'move_id'
+            switch: 'new_core_index'
+
+    Returns:
+        (new_state, result)
+    """
+    action_type = action.get('action_type')
+
+    if action_type == 'move':
+        move = action.get('move')
+        if move is None:
+            move = find_equipped_move(get_active_core(state['teams'][side]), action.get('move_id'))
+        return resolve_move(state, side, move, rng)
+    if action_type == 'switch':
+        return resolve_switch(state, side, action.get('new_core_index', 0))
+    if action_type == 'gain_resource':
+        state, rolls = roll_dice(state, side, rng)
+        return state, {'action_type': 'gain_resource', 'success': True, 'rolls': rolls}
+    return state, {'action_type': 'pass', 'success': True}
+
+
+def _move_result() -> dict:
+    return {
+        'action_type': 'move',
+        'success': False,
+        'damage_dealt': 0,
+        'was_critical': False,
+        'accuracy_check': False,
+        'stab': False,
+        'move_name': '',
+        'source_core': '',
+        'target_core': '',
+        'effect_applied': None,
+        'effect_message': None,
+        'dodged_by': None,
+        'stunned': False,
+        'confused_self_hit': False,
+        'heal_amount': 0,
+    }
+
+
+def resolve_move(state: dict, side: str, move: dict, rng=random) -> tuple[dict, dict]:
+    """
+    Execute a move for `side` against the opposing active core.
+    Branches on Attack vs non-Attack moves (status effects).
+    """
+    state = copy_state(state)
+    result = _move_result()
+
+    team = state['teams'].get(side)
+    attacker = get_active_core(team)
+    if not attacker or not move:
+        return state, result
+
+    # Check if attacker is stunned
+    attacker_effects = attacker.get('status_effects', [])
+    if status_effects.check_stun(attacker_effects):
+        # Remove the stun effect and skip turn
+        attacker['status_effects'] = [e for e in attacker_effects if e['effect_type'] != 'stun']
+        result.update({
+            'success': True,
+            'stunned': True,
+            'move_name': move['name'],
+            'source_core': attacker['name'],
+        })
+        return state, result
+
+    # Check confusion — may hit self
+    if status_effects.check_confusion(attacker_effects, rng):
+        _pay(team, move)
+        self_dmg = max(1, int(attacker['max_hp'] * CONFUSION_SELF_DAMAGE))
+        _take_damage(attacker, self_dmg)
+        result.update({
+            'success': True,
+            'confused_self_hit': True,
+            'damage_dealt': self_dmg,
+            'move_name': move['name'],
+            'source_core': attacker['name'],
+            'target_core': attacker['name'],
+        })
+        return state, result
+
+    # Deduct resource cost
+    _pay(team, move)
+
+    # Check if this is a status effect move
+    effect_def = effect_of(move)
+    if effect_def and move.get('type') != 'Attack':
+        _apply_status_move(state, side, result, effect_def, move['name'], attacker, rng)
+        return state, result
+
+    # Attack move — target the opposing active core
+    target = get_active_core(state['teams'].get(opponent_of(side)))
+    if not target or target.get('is_knocked_out'):
+        return state, result
+
+    # Check defender dodge effects
+    defender_effects = target.get('status_effects', [])
+    dodged, dodge_name = status_effects.check_dodge(defender_effects)
+    if dodged:
+        target['status_effects'] = status_effects.remove_expired(defender_effects)
+        result.update({
+            'success': True,
+            'accuracy_check': False,
+            'dodged_by': dodge_name,
+            'move_name': move['name'],
+            'source_core': attacker['name'],
+            'target_core': target['name'],
+        })
+        return state, result
+
+    # Get defender stat modifiers from effects
+    stat_mods = status_effects.get_stat_modifier(defender_effects)
+    modified_defender_stats = dict(target['stats'])
+    for stat_name, multiplier in stat_mods.items():
+        if stat_name in modified_defender_stats:
+            modified_defender_stats[stat_name] = int(modified_defender_stats[stat_name] * multiplier)
+
+    # Get attacker accuracy modifier from debuffs
+    acc_mod = status_effects.get_accuracy_modifier(attacker_effects)
+    modified_move = dict(move)
+    modified_move['accuracy'] = move['accuracy'] * acc_mod
+
+    damage = calculate_damage(
+        attacker_stats=attacker['stats'],
+        defender_stats=modified_defender_stats,
+        move=modified_move,
+        attacker_level=attacker.get('lvl', 5),
+        attacker_type=attacker.get('core_type', ''),
+        move_type_identity=move.get('core_type_identity', ''),
+        rng=rng,
+    )
+
+    # Apply damage reduction from defensive effects
+    if damage['hit']:
+        dmg_mod = status_effects.get_damage_modifier(defender_effects)
+        damage['damage'] = max(1, int(damage['damage'] * dmg_mod))
+
+    _take_damage(target, damage['damage'])
+
+    result.update({
+        'success': True,
+        'damage_dealt': damage['damage'],
+        'was_critical': damage['critical'],
+        'accuracy_check': damage['hit'],
+        'stab': damage.get('stab', False),
+        'move_name': move['name'],
+        'source_core': attacker['name'],
+        'target_core': target['name'],
+    })
+    return state, result
+
+
+def _apply_status_move(state, side, result, effect_def, move_name, user, rng) -> None:
+    """Apply a status effect move. Mutates `state` and `result` in place."""
+    result.update({
+        'success': True,
+        'move_name': move_name,
+        'source_core': user['name'],
+    })
+
+    # Check apply chance
+    if rng.random() > effect_def.get('apply_chance', 1.0):
+        result['effect_message'] = f"{move_name} failed to take effect!"
+        return
+
+    # Instant heal
+    if effect_def['effect_type'] == 'heal':
+        heal_amt = int(user['max_hp'] * effect_def.get('value', 0.25))
+        user['current_hp'] = min(user['max_hp'], user['current_hp'] + heal_amt)
+        result['heal_amount'] = heal_amt
+        result['effect_applied'] = 'heal'
+        result['effect_message'] = f"{user['name']} {effect_def['message']} Restored {heal_amt} HP!"
+        return
+
+    effect_data = {
+        'effect_type': effect_def['effect_type'],
+        'turns_remaining': effect_def.get('turns_remaining', 1),
+        'value': effect_def.get('value', 0),
+        'source_move': move_name,
+    }
+
+    if effect_def.get('target') == 'self':
+        user['status_effects'], _ = status_effects.apply_effect(
+            user.get('status_effects', []), effect_data
+        )
+    else:
+        target = get_active_core(state['teams'].get(opponent_of(side)))
+        if target:
+            target['status_effects'], _ = status_effects.apply_effect(
+                target.get('status_effects', []), effect_data
+            )
+            result['target_core'] = target['name']
+
+    result['effect_applied'] = effect_def['effect_type']
+    result['effect_message'] = f"{user['name']} {effect_def['message']}"
+
+
+def resolve_switch(state: dict, side: str, new_index: int) -> tuple[dict, dict]:
+    """
+    Switch the active core. Clears status effects on the outgoing core.
+    """
+    state = copy_state(state)
+    result = {
+        'action_type': 'switch',
+        'success': False,
+        'new_active_core': '',
+        'old_active_core': '',
+    }
+
+    team = state['teams'].get(side)
+    if not team:
+        return state, result
+
+    cores = team.get('cores', [])
+    if not 0 <= new_index < len(cores) or cores[new_index].get('is_knocked_out'):
+        return state, result
+
+    old = get_active_core(team)
+    if old:
+        old['status_effects'] = status_effects.clear_effects(old.get('status_effects', []))
+
+    team['active_core_index'] = new_index
+    result.update({
+        'success': True,
+        'new_active_core': cores[new_index]['name'],
+        'old_active_core': old['name'] if old else '',
+    })
+    return state, result
+
+
+def roll_dice(state: dict, side: str, rng=random) -> tuple[dict, list[dict]]:
+    """
+    Roll d8 for each non-KO'd core on a team.
+    Returns the new state and the list of dice roll data.
+    """
+    state = copy_state(state)
+    rolls = []
+
+    team = state['teams'].get(side) or {}
+    for core in team.get('cores', []):
+        if core.get('is_knocked_out'):
+            continue
+        roll_value = rng.randint(DICE_MIN, DICE_MAX)
+        core['last_dice_roll'] = roll_value
+        rolls.append({
+            'core_id': core['id'],
+            'core_name': core['name'],
+            'roll_value': roll_value,
+            'allocated_to': None,
+        })
+
+    return state, rolls
+
+
+def allocate_dice(state: dict, side: str, allocations: list[dict]) -> tuple[dict, dict]:
+    """
+    Allocate dice rolls to energy or physical pools.
+
+    Args:
+        allocations: [{'core_id': str, 'pool': 'energy'|'physical'}, ...]
+
+    Returns:
+        (new_state, updated pool totals)
+    """
+    state = copy_state(state)
+    team = state['teams'].get(side) or {}
+    cores_by_id = {str(core['id']): core for core in team.get('cores', [])}
+
+    for alloc in allocations:
+        core = cores_by_id.get(str(alloc['core_id']))
+        if core and core.get('last_dice_roll'):
+            if alloc['pool'] == 'energy':
+                team['energy_pool'] = team.get('energy_pool', 0) + core['last_dice_roll']
+            else:
+                team['physical_pool'] = team.get('physical_pool', 0) + core['last_dice_roll']
+
+    return state, {
+        'energy_pool': team.get('energy_pool', 0),
+        'physical_pool': team.get('physical_pool', 0),
+    }
+
+
+def tick_effects(state: dict) -> tuple[dict, list]:
+    """
+    Process status effects at the start of a new turn for both sides.
+    Ticks durations, applies regen, removes expired effects.
+
+    Returns:
+        (new_state, list of effect event dicts for the frontend)
+    """
+    state = copy_state(state)
+    events = []
+
+    for side in SIDES:
+        core = get_active_core(state['teams'].get(side))
+        if not core or not core.get('status_effects'):
+            continue
+
+        label = EVENT_TEAM_LABELS[side]
+        effects, heal_amt, expired = status_effects.process_turn_start_effects(
+            core['status_effects'], core.get('max_hp', 100)
+        )
+        if heal_amt > 0:
+            core['current_hp'] = min(core['max_hp'], core['current_hp'] + heal_amt)
+            events.append({
+                'team': label,
+                'core_name': core['name'],
+                'type': 'heal',
+                'amount': heal_amt,
+            })
+        for name in expired:
+            events.append({
+                'team': label,
+                'core_name': core['name'],
+                'type': 'effect_expired',
+                'effect_name': name,
+            })
+        core['status_effects'] = effects
+
+    return state, events
+
+
+def is_team_defeated(state: dict, side: str) -> bool:
+    """Check if all cores on a team are knocked out."""
+    team = state['teams'].get(side)
+    if not team:
+        return True
+    return all(core.get('is_knocked_out', False) for core in team.get('cores', []))
+
+
+# ============================================================================
+# Damage
+# ============================================================================
+
+def calculate_damage(attacker_stats: dict, defender_stats: dict, move: dict,
+                     attacker_level: int = 5,
+                     attacker_type: str = '', move_type_identity: str = '',
+                     rng=random) -> dict:
+    """
+    Calculate damage using Pokémon-inspired Gen V+ formula adapted for CoDEX stat ranges.
+
+    Formula:
+        level_factor = (2 * level / 5) + 2
+        stat_ratio = (attack + S) / (defense + S)
+        damage = (level_factor * base_damage * stat_ratio) / 3 + 2
+        damage *= uniform(0.85, 1.0)
+        damage *= STAB (1.25x if core type matches move type identity)
+        crit: 6.25% chance, 1.5x
+    """
+    base_damage = move.get('dmg', 0)
+    dmg_type = move.get('dmg_type', 'PHYSICAL')
+    accuracy = move.get('accuracy', 1.0)
+
+    # Accuracy check
+    hit = rng.random() <= accuracy
+    if not hit:
+        return {'damage': 0, 'critical': False, 'hit': False, 'stab': False}
+
+    # Get relevant stats
+    if dmg_type == 'ENERGY':
+        attack = attacker_stats.get('energy', 10)
+        defense = defender_stats.get('shield', 10)
+    else:
+        attack = attacker_stats.get('physical', 10)
+        defense = defender_stats.get('defense', 10)
+
+    # Prevent division by zero
+    defense = max(1, defense)
+
+    # Pokémon-inspired damage formula
+    level_factor = (2 * attacker_level / 5) + 2
+    stat_ratio = (attack + DAMAGE_STAT_SMOOTHING) / (defense + DAMAGE_STAT_SMOOTHING)
+    damage = (level_factor * base_damage * stat_ratio) / DAMAGE_DIVISOR + DAMAGE_FLAT_BONUS
+
+    # Random variance (85-100%, matching Pokémon)
+    variance = rng.uniform(DAMAGE_VARIANCE_MIN, DAMAGE_VARIANCE_MAX)
+    damage *= variance
+
+    # STAB: Same-Type Attack Bonus
+    stab = (
+        bool(attacker_type) and bool(move_type_identity)
+        and attacker_type == move_type_identity
+    )
+    if stab:
+        damage *= STAB_MULTIPLIER
+
+    # Critical hit check (6.25% chance, 1.5x damage)
+    critical = rng.random() < BASE_CRITICAL_CHANCE
+    if critical:
+        damage *= CRITICAL_HIT_MULTIPLIER
+
+    # Round to integer
+    damage = max(MIN_DAMAGE, int(damage))
+
+    return {'damage': damage, 'critical': critical, 'hit': True, 'stab': stab}
@@ -0,0 +1,72 @@
+# battle/services/battle_rng.py
+"""
+Deterministic, counter-based random stream for battles. No Django.
+
+Every Battle owns a seed and a cursor. Draw n of a battle is a pure function
+of (seed, n) — SplitMix64 of the seed advanced n steps — so the stream needs
+no hidden generator state: persisting the cursor is enough to resume it in
+another process, and replaying a battle's actions from its seed with cursor 0
+reproduces every dice roll, accuracy check, crit, variance roll, confusion
+check, status-effect chance and NPC move choice bit-exactly.
+
+BattleRng implements the subset of the `random` module API the kernel and
+npc_ai use (random, uniform, randint, choice), so it drops in wherever they
+take an `rng`.
+"""
+from contextlib import contextmanager
+
+
+_MASK64 = (1 << 64) - 1
+_GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+_FLOAT_SCALE = 1.0 / (1 << 53)
+
+
+def _mix(seed: int, counter: int) -> int:
+    z = (seed + (counter + 1) * _GOLDEN_GAMMA) & _MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
+
+
+class BattleRng:
+    """Seeded random stream positioned at `cursor` draws from the start."""
+
+    def __init__(self, seed: int, cursor: int = 0):
+        self.seed = seed
+        self.cursor = cursor
+
+    def random(self) -> float:
+        """Float in [0.0, 1.0), consuming one draw."""
+        value = _mix(self.seed, self.cursor) >> 11
+        self.cursor += 1
+        return value * _FLOAT_SCALE
+
+    def uniform(self, a: float, b: float) -> float:
+        return a + (b - a) * self.random()
+
+    def randint(self, a: int, b: int) -> int:
+        """Integer in [a, b] inclusive."""
+        return a + int(self.random() * (b - a + 1))
+
+    def choice(self, seq):
+        if not seq:
+            raise IndexError('Cannot choose from an empty sequence')
+        return seq[int(self.random() * len(seq))]
+
+
+@contextmanager
+def battle_stream(battle):
+    """
+    Draw from a battle's stream and advance its persisted cursor.
+
+        with battle_stream(battle) as rng:
+            state, rolls = battle_kernel.roll_dice(state, side, rng)
+
+    Works on anything with rng_seed / rng_cursor attributes; the cursor is
+    written back to the object (not saved) when the block exits.
+    """
+    rng = BattleRng(battle.rng_seed, battle.rng_cursor)
+    try:
+        yield rng
+    finally:
+        battle.rng_cursor = rng.cursor
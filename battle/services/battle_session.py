@@ -0,0 +1,365 @@
+# battle/services/battle_session.py
+"""
+In-memory battle session state.
+
+A BattleSession holds the Battle row, the player's BattleTeam and its
+BattleCoreStates, and the NPCBattleTeam and its NPCBattleCoreStates for as
+long as a socket is attached to the battle (static stats and moves come from
+the battle's loadout). The engine reads and mutates
+these cached objects instead of re-querying on every step, and the session
+writes the accumulated changes back in one batched flush at turn boundaries.
+
+The Battle row is written only while its status is still the one the
+session last read or wrote (a conditional UPDATE). If another writer moved
+it in between (the idle reaper abandoning the battle), flush() raises
+SessionConflict and its transaction writes nothing.
+"""
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from battle.models import Battle, BattleTeam, BattleCoreState, NPCBattleTeam, NPCBattleCoreState
+from battle.services.loadout import evict_loadout
+from battle.services.turn_log import TurnLog
+
+
+BATTLE_FIELDS = ['status', 'current_turn', 'winner', 'rng_cursor', 'idle_deadline']
+TEAM_FIELDS = ['energy_pool', 'physical_pool', 'active_core_index', 'dice_pending', 'ko_switch_pending']
+NPC_TEAM_FIELDS = ['energy_pool', 'physical_pool', 'active_core_index', 'dice_pending']
+CORE_STATE_FIELDS = ['current_hp', 'is_knocked_out', 'last_dice_roll', 'status_effects']
+
+
+class SessionConflict(Exception):
+    """The Battle row's status changed under the session; nothing was written."""
+
+
+class BattleSession:
+    """Cached battle state for the lifetime of the sockets attached to it."""
+
+    def __init__(self, battle: Battle):
+        self.battle = battle
+        self.refcount = 0
+        self.turn_log = TurnLog(battle)
+        self._flushed = self._fingerprint()
+        self._status = battle.status  # As last read or written
+        self._closing: Optional[threading.Event] = None  # Set once the final flush is done
+
+    @classmethod
+    def load(cls, battle_id: str) -> 'BattleSession':
+        """
+        Load (or rehydrate) a session from the database.
+
+        Raises:
+            Battle.DoesNotExist: If the battle does not exist
+        """
+        # Core stats and moves come from the battle's loadout, not the core rows
+        core_states = BattleCoreState.objects.order_by('position')
+
+        teams = BattleTeam.objects.select_related('operator').prefetch_related(
+            Prefetch('core_states', queryset=core_states)
+        )
+
+        battle = Battle.objects.select_related(
+            'operator_1', 'npc_team', 'npc_team__npc'
+        ).prefetch_related(
+            Prefetch('teams', queryset=teams),
+            Prefetch('npc_team__core_states', queryset=NPCBattleCoreState.objects.order_by('position')),
+        ).get(id=battle_id)
+
+        return cls(battle)
+
+    @property
+    def player_team(self) -> Optional[BattleTeam]:
+        teams = list(self.battle.teams.all())
+        return teams[0] if teams else None
+
+    @property
+    def core_states(self) -> list[BattleCoreState]:
+        team = self.player_team
+        return list(team.core_states.all()) if team else []
+
+    @property
+    def npc_team(self) -> Optional[NPCBattleTeam]:
+        try:
+            return self.battle.npc_team
+        except NPCBattleTeam.DoesNotExist:
+            return None
+
+    @property
+    def npc_core_states(self) -> list[NPCBattleCoreState]:
+        team = self.npc_team
+        return list(team.core_states.all()) if team else []
+
+    def _fingerprint(self) -> dict:
+        """Capture the persisted fields so flush() only writes what changed."""
+        battle = self.battle
+        team = self.player_team
+        npc_team = self.npc_team
+        return {
+            'battle': tuple(
+                battle.winner_id if f == 'winner' else _freeze(getattr(battle, f))
+                for f in BATTLE_FIELDS
+            ),
+            'team': tuple(getattr(team, f) for f in TEAM_FIELDS) if team else None,
+            'core_states': _core_fingerprints(self.core_states),
+            'npc_team': tuple(getattr(npc_team, f) for f in NPC_TEAM_FIELDS) if npc_team else None,
+            'npc_core_states': _core_fingerprints(self.npc_core_states),
+        }
+
+    def is_dirty(self) -> bool:
+        return self._fingerprint() != self._flushed
+
+    def flush(self) -> None:
+        """
+        Write all changed rows and the turn journal (finished turns plus a
+        checkpoint of the turn in progress) back in a single transaction,
+        so the journal never lags the rows it describes.
+
+        Raises:
+            SessionConflict: If the battle's status changed in the database
+        """
+        current = self._fingerprint()
+        if current == self._flushed and not self.turn_log.has_pending():
+            return
+
+        from battle.services.battle_engine import load_state
+
+        # No savepoint when a turn_resolver call already holds the transaction
+        with transaction.atomic(savepoint=False):
+            self.turn_log.write(load_state)
+
+            if current['battle'] != self._flushed['battle']:
+                self._write_battle()
+
+            team = self.player_team
+            if team and current['team'] != self._flushed['team']:
+                team.save(update_fields=TEAM_FIELDS + ['updated_at'])
+
+            changed = _changed(self.core_states, current['core_states'], self._flushed['core_states'])
+            if changed:
+                BattleCoreState.objects.bulk_update(changed, CORE_STATE_FIELDS)
+
+            npc_team = self.npc_team
+            if npc_team and current['npc_team'] != self._flushed['npc_team']:
+                npc_team.save(update_fields=NPC_TEAM_FIELDS + ['updated_at'])
+
+            changed = _changed(
+                self.npc_core_states, current['npc_core_states'], self._flushed['npc_core_states']
+            )
+            if changed:
+                NPCBattleCoreState.objects.bulk_update(changed, CORE_STATE_FIELDS)
+
+        self._flushed = current
+        self._status = self.battle.status
+
+    def _write_battle(self) -> None:
+        battle = self.battle
+        values = {
+            'winner_id' if f == 'winner' else f: battle.winner_id if f == 'winner' else getattr(battle, f)
+            for f in BATTLE_FIELDS
+        }
+        values['updated_at'] = timezone.now()
+        written = Battle.objects.filter(pk=battle.pk, status=self._status).update(**values)
+        if not written:
+            raise SessionConflict(f"Battle {battle.pk} is no longer {self._status}")
+        battle.updated_at = values['updated_at']
+
+    def discard_changes(self, status: str) -> None:
+        """Adopt `status` from the database and treat the cached state as written."""
+        self.battle.status = status
+        self._status = status
+        self._flushed = self._fingerprint()
+        self.turn_log = TurnLog(self.battle)
+
+
+def _core_fingerprints(states) -> dict:
+    return {
+        state.pk: tuple(_freeze(getattr(state, f)) for f in CORE_STATE_FIELDS)
+        for state in states
+    }
+
+
+def _changed(states, current: dict, flushed: dict) -> list:
+    return [state for state in states if current[state.pk] != flushed.get(state.pk)]
+
+
+def _freeze(value):
+    """Turn JSON-ish values into something comparable by value."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+# ============================================================================
+# Process-wide session registry
+# ============================================================================
+
+_sessions: dict[str, BattleSession] = {}
+_recovering: dict[str, threading.Event] = {}  # Set once the recovery has committed
+_lock = threading.Lock()
+
+
+def open_session(battle_id: str) -> Optional[BattleSession]:
+    """
+    Attach to a battle's session, loading it from the database if this
+    process does not hold it yet. Returns None if the battle does not exist.
+
+    A session still writing itself back (closing), or a recovery of the
+    battle in progress, is waited for, so the load reads the rows it
+    committed.
+    """
+    battle_id = str(battle_id)
+    while True:
+        with _lock:
+            session = _sessions.get(battle_id)
+            pending = _recovering.get(battle_id)
+            if pending is None and session is not None:
+                pending = session._closing
+            if pending is None:
+                if session is None:
+                    try:
+                        session = BattleSession.load(battle_id)
+                    except Battle.DoesNotExist:
+                        return None
+                    _sessions[battle_id] = session
+                session.refcount += 1
+                return session
+        pending.wait()
+
+
+def get_session(battle_id: str) -> Optional[BattleSession]:
+    """Return the in-memory session for a battle without attaching to it."""
+    return _sessions.get(str(battle_id))
+
+
+def held_battle_ids() -> list[str]:
+    """Ids of the battles this process holds sessions for."""
+    with _lock:
+        return list(_sessions)
+
+
+def flush_all() -> None:
+    """Write every held session back (process shutdown)."""
+    with _lock:
+        sessions = [session for session in _sessions.values() if session._closing is None]
+    for session in sessions:
+        try:
+            session.flush()
+        except SessionConflict:
+            # Abandoned meanwhile; the database has the final word
+            pass
+
+
+def abandon_session(battle_id: str) -> None:
+    """
+    The reaper marked the battle ABANDONED in the database: drop the
+    session without writing it back. Called from the battle's actor (or a
+    command it is running), so no other command is using the session.
+    """
+    session = _drop(battle_id)
+    if session is not None:
+        session.discard_changes('ABANDONED')
+
+
+def discard_session(battle_id: str) -> None:
+    """
+    A command failed part-way through a turn: drop the session without
+    writing it back, so the next open_session() loads the committed rows
+    instead of the half-applied turn. Called from the battle's actor.
+    """
+    session = _drop(battle_id)
+    if session is not None:
+        session.discard_changes(session._status)
+
+
+def _drop(battle_id: str) -> Optional[BattleSession]:
+    battle_id = str(battle_id)
+    with _lock:
+        session = _sessions.pop(battle_id, None)
+    if session is not None:
+        evict_loadout(battle_id)
+    return session
+
+
+def hand_off_session(battle_id: str) -> None:
+    """
+    The battle moved to another worker: write the session back once and
+    drop it, so the new owner loads current rows and nothing here writes
+    after it. Called from the battle's actor, before any socket is
+    redirected.
+    """
+    battle_id = str(battle_id)
+    with _lock:
+        session = _sessions.get(battle_id)
+        if session is None or session._closing is not None:
+            return
+        session._closing = threading.Event()
+    _write_back(battle_id, session)
+
+
+@contextmanager
+def unheld(battle_id: str):
+    """
+    Yield True if this process holds no session for the battle and is not
+    already recovering it, marking it as recovering so open_session() waits
+    until the block ends; False (nothing held off) otherwise.
+    """
+    battle_id = str(battle_id)
+    with _lock:
+        free = battle_id not in _sessions and battle_id not in _recovering
+        if free:
+            done = _recovering[battle_id] = threading.Event()
+    if not free:
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        with _lock:
+            del _recovering[battle_id]
+        done.set()
+
+
+def close_session(battle_id: str, session: Optional[BattleSession] = None) -> None:
+    """
+    Detach from a battle's session (`session`, when given: a socket whose
+    session was dropped must not detach from the one that replaced it).
+    When the last socket detaches, the session is flushed and evicted so
+    the next connect rehydrates from the DB.
+    """
+    battle_id = str(battle_id)
+    with _lock:
+        held = _sessions.get(battle_id)
+        if held is None or (session is not None and held is not session):
+            return
+        session = held
+        session.refcount -= 1
+        if session.refcount > 0 or session._closing is not None:
+            return
+        session._closing = threading.Event()
+    _write_back(battle_id, session)
+
+
+def _write_back(battle_id: str, session: BattleSession) -> None:
+    """
+    Final flush of a closing session. It stays registered until the flush
+    has committed, so open_session() waits for it instead of loading rows
+    the flush has not written yet.
+    """
+    try:
+        session.flush()
+    except SessionConflict:
+        # Abandoned meanwhile; the database has the final word
+        pass
+    finally:
+        evict_loadout(battle_id)
+        with _lock:
+            if _sessions.get(battle_id) is session:
+                del _sessions[battle_id]
+        session._closing.set()
@@ -0,0 +1,189 @@
+# battle/services/engine_pool.py
+"""
+Executors for battle computation.
+
+Turn resolution used to share Django's default sync_to_async executor with
+every other piece of sync work in the process, so one slow NPC decision
+held up database calls for unrelated sockets. Battle work now has its own
+pools:
+
+    - engine: a bounded thread pool that runs turn_resolver calls (with
+      the same connection cleanup as database_sync_to_async). When
+      BATTLE_ENGINE_MAX_QUEUE turns are already waiting for a thread, new
+      ones are refused with EngineBusy instead of piling up.
+    - npc_ai: an optional process pool (BATTLE_NPC_AI_PROCESSES > 0) for the
+      lookahead search, which is pure Python on kernel state and so can
+      leave the process and the GIL. When it is disabled, or when
+      BATTLE_NPC_AI_MAX_QUEUE searches are already waiting, the search
+      runs on the calling engine thread instead.
+
+Both pools count pending work (queued or running), the deepest the queue
+has been, completions and refusals; metrics() reports them per pool.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+
+from battle.constants import (
+    BATTLE_ENGINE_WORKERS, BATTLE_ENGINE_MAX_QUEUE,
+    BATTLE_NPC_AI_PROCESSES, BATTLE_NPC_AI_MAX_QUEUE,
+)
+
+
+class EngineBusy(Exception):
+    """The engine queue is full; the command was not run and can be retried."""
+
+
+class _Pool:
+    """Pending-work accounting shared by both pools."""
+
+    def __init__(self, name: str, workers: int, max_queue: int):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self.pending = 0          # queued or running
+        self.peak_queued = 0
+        self.completed = 0
+        self.refused = 0
+        self._lock = threading.Lock()
+
+    def _admit(self) -> bool:
+        with self._lock:
+            if self.pending - self.workers >= self.max_queue:
+                self.refused += 1
+                return False
+            self.pending += 1
+            self.peak_queued = max(self.peak_queued, self.pending - self.workers)
+            return True
+
+    def _done(self) -> None:
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queued': max(0, self.pending - self.workers),
+                'running': min(self.pending, self.workers),
+                'peak_queued': self.peak_queued,
+                'max_queue': self.max_queue,
+                'completed': self.completed,
+                'refused': self.refused,
+            }
+
+
+class EngineThreadPool(_Pool):
+    """Bounded thread pool for turn resolution."""
+
+    def __init__(self, workers: int, max_queue: int):
+        super().__init__('engine', workers, max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='battle-engine')
+
+    async def run(self, fn, *args):
+        """
+        Run fn(*args) on an engine thread.
+
+        Raises:
+            EngineBusy: If the queue is full
+        """
+        if not self._admit():
+            raise EngineBusy(f'{self.name} queue full')
+        try:
+            return await database_sync_to_async(
+                fn, thread_sensitive=False, executor=self._executor
+            )(*args)
+        finally:
+            self._done()
+
+
+class SearchProcessPool(_Pool):
+    """Optional process pool for NPC search; runs in the caller's thread when off or full."""
+
+    def __init__(self, processes: int, max_queue: int):
+        super().__init__('npc_ai', processes, max_queue)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def call(self, fn, *args):
+        """fn(*args) in a worker process if one is available, otherwise here."""
+        if self.workers <= 0 or not self._admit():
+            return fn(*args)
+        try:
+            return self._get_executor().submit(fn, *args).result()
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool next time
+            with self._executor_lock:
+                self._executor = None
+            return fn(*args)
+        finally:
+            self._done()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                # spawn: workers import only the pure search modules, not a
+                # copy of this process's threads and connections
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+            return self._executor
+
+
+# ============================================================================
+# Process-wide pools
+# ============================================================================
+
+_engine: Optional[EngineThreadPool] = None
+_search: Optional[SearchProcessPool] = None
+_lock = threading.Lock()
+
+
+def _setting(name: str, default: int) -> int:
+    return int(getattr(settings, name, default))
+
+
+def engine() -> EngineThreadPool:
+    global _engine
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                _engine = EngineThreadPool(
+                    _setting('BATTLE_ENGINE_WORKERS', BATTLE_ENGINE_WORKERS),
+                    _setting('BATTLE_ENGINE_MAX_QUEUE', BATTLE_ENGINE_MAX_QUEUE),
+                )
+    return _engine
+
+
+def search() -> SearchProcessPool:
+    global _search
+    if _search is None:
+        with _lock:
+            if _search is None:
+                _search = SearchProcessPool(
+                    _setting('BATTLE_NPC_AI_PROCESSES', BATTLE_NPC_AI_PROCESSES),
+                    _setting('BATTLE_NPC_AI_MAX_QUEUE', BATTLE_NPC_AI_MAX_QUEUE),
+                )
+    return _search
+
+
+async def run(fn, *args):
+    """Run battle work on the engine pool. Raises EngineBusy if it is saturated."""
+    return await engine().run(fn, *args)
+
+
+def run_search(fn, *args):
+    """Run an NPC search function (pure, picklable arguments) on the npc_ai pool."""
+    return search().call(fn, *args)
+
+
+def metrics() -> dict:
+    """Queue depth and throughput counters per pool."""
+    return {pool.name: pool.metrics() for pool in (engine(), search())}
@@ -0,0 +1,103 @@
+# battle/services/event_buffer.py
+"""
+Per-battle buffer of sequenced outbound events.
+
+Every game message a battle sends (everything a TurnResult emits with a
+view) goes through the battle's EventBuffer. The buffer stamps it with
+`seq`, one higher per message, and with the battle-level `state_version`
+and `state_patch` against the previous message's view. It keeps the last
+BATTLE_EVENT_BUFFER_SIZE stamped messages.
+
+A client that reconnects (or sees a gap in `seq`) sends the last seq it
+processed. If every later message is still buffered, it gets exactly
+those, unchanged, and its patch chain continues where it stopped.
+Otherwise it gets a full battle_state. The buffer is shared by every
+socket of the battle, so a full state never resets it: a state change no
+message carried (a session reloaded from the database) is appended as a
+state_sync message instead, which the other sockets catch up through.
+
+Buffers outlive the sockets of a battle (a phone dropping its connection
+detaches the last socket), so the registry keeps the most recently used
+BATTLE_EVENT_BUFFERS of them. It is touched from the event loop only and
+needs no lock.
+"""
+from collections import OrderedDict, deque
+from typing import Optional
+
+from django.conf import settings
+
+from battle.constants import BATTLE_EVENT_BUFFER_SIZE, BATTLE_EVENT_BUFFERS
+from battle.services import state_patch
+
+
+class EventBuffer:
+    """Bounded ring of one battle's sequenced messages."""
+
+    def __init__(self, capacity: int):
+        self.seq = 0
+        self.version = 0
+        self.view: Optional[dict] = None
+        self._events: deque = deque(maxlen=capacity)
+        self._floor = 0  # lowest last_seq the buffer can still catch up from
+
+    def append(self, message: dict, view: dict) -> dict:
+        """Stamp `message` with seq / state_version / state_patch and keep it."""
+        if self.view is not None:
+            ops = state_patch.diff(self.view, view)
+            if ops:
+                self.version += 1
+                message['state_patch'] = ops
+        self.view = view
+        self.seq += 1
+        message['seq'] = self.seq
+        message['state_version'] = self.version
+
+        if len(self._events) == self._events.maxlen:
+            self._floor = self._events[0]['seq']
+        self._events.append(message)
+        return message
+
+    def rebase(self, view: dict) -> None:
+        """
+        Make `view` (about to go out in a full battle_state) the baseline.
+        If the state moved without a message, the move is buffered as a
+        state_sync message, so the other sockets' patch chains lead to the
+        same view and their buffered history stays intact.
+        """
+        if self.view is None:
+            self.view = view
+        elif view != self.view:
+            self.append({'type': 'state_sync'}, view)
+
+    def since(self, last_seq) -> Optional[list[dict]]:
+        """Messages after `last_seq`, or None if some of them are gone."""
+        if not isinstance(last_seq, int) or not self._floor <= last_seq <= self.seq:
+            return None
+        return [message for message in self._events if message['seq'] > last_seq]
+
+
+# ============================================================================
+# Process-wide buffer registry
+# ============================================================================
+
+_buffers: OrderedDict[str, EventBuffer] = OrderedDict()
+
+
+def get(battle_id) -> EventBuffer:
+    """The battle's buffer, created on first use (least recently used ones are dropped)."""
+    battle_id = str(battle_id)
+    buffer = _buffers.get(battle_id)
+    if buffer is None:
+        capacity = getattr(settings, 'BATTLE_EVENT_BUFFER_SIZE', BATTLE_EVENT_BUFFER_SIZE)
+        buffer = _buffers[battle_id] = EventBuffer(capacity)
+        limit = getattr(settings, 'BATTLE_EVENT_BUFFERS', BATTLE_EVENT_BUFFERS)
+        while len(_buffers) > limit:
+            _buffers.popitem(last=False)
+    else:
+        _buffers.move_to_end(battle_id)
+    return buffer
+
+
+def discard(battle_id) -> None:
+    """Forget a battle's buffer (the battle moved to another worker)."""
+    _buffers.pop(str(battle_id), None)
@@ -0,0 +1,167 @@
+# battle/services/loadout.py
+"""
+Static battle loadouts.
+
+Stats and equipped moves cannot change once a battle starts, so they are
+compiled once, in create_battle_from_npc, into a loadout snapshot stored on
+Battle.loadout:
+
+    {
+        'player': [core, ...],   # by team position
+        'npc': [core, ...],
+    }
+
+    core = {
+        'id', 'name', 'core_type', 'rarity', 'lvl', 'image_url', 'max_hp',
+        'stats': {...},
+        'equipped_moves': [move, ...],
+        'moves_by_id': {move id: move},   # added when cached, not stored
+    }
+
+Moves come from the process-wide move catalog (codex.services.move_catalog)
+by id, so compiling a loadout never joins the Move table. Each move carries
+its resolved MOVE_EFFECT_MAP entry under 'effect' (None for plain attacks),
+so the kernel and npc_ai never look effects up by name.
+
+Snapshots are cached per process by battle id and shared between turns;
+treat them as read-only. Per-turn state (HP, KO, effects, pools) lives on
+BattleTeam / BattleCoreState and NPCBattleTeam / NPCBattleCoreState.
+"""
+import threading
+
+from codex.services import move_catalog
+
+
+# ============================================================================
+# Compiling
+# ============================================================================
+
+def move_record(move: move_catalog.MoveRecord, slot: int) -> dict:
+    """Kernel move dict for a catalog MoveRecord."""
+    return {
+        'id': move.id,
+        'name': move.name,
+        'slot': slot,
+        'dmg_type': move.dmg_type,
+        'dmg': move.dmg,
+        'accuracy': move.accuracy,
+        'resource_cost': move.resource_cost,
+        'type': move.type,
+        'core_type_identity': move.core_type_identity,
+        'effect': dict(move.effect) if move.effect else None,
+    }
+
+
+def _equipped(rows) -> list[dict]:
+    """Kernel move dicts for equipped-move through rows (only move_id is read)."""
+    return [move_record(move_catalog.get_move(row.move_id), row.slot) for row in rows]
+
+
+def _core_record(core_id, name, core_type, rarity, lvl, image_url, stats, moves) -> dict:
+    return {
+        'id': str(core_id),
+        'name': name,
+        'core_type': core_type,
+        'rarity': rarity,
+        'lvl': lvl,
+        'image_url': image_url,
+        'max_hp': stats['hp'],
+        'stats': stats,
+        'equipped_moves': moves,
+    }
+
+
+def player_core_record(core) -> dict:
+    """Static record for a player Core (battle_info and coreequippedmove_set loaded)."""
+    info = core.battle_info
+    return _core_record(
+        core.id, core.name, core.type, core.rarity, core.lvl, core.image_url,
+        {
+            'hp': info.hp,
+            'physical': info.physical,
+            'energy': info.energy,
+            'defense': info.defense,
+            'shield': info.shield,
+            'speed': info.speed,
+        },
+        _equipped(core.coreequippedmove_set.all()),
+    )
+
+
+def npc_core_record(core) -> dict:
+    """Static record for an NPCCore (equipped moves loaded)."""
+    return _core_record(
+        core.id, core.name, core.core_type, core.rarity, core.lvl, core.image_url,
+        {
+            'hp': core.hp,
+            'physical': core.physical,
+            'energy': core.energy,
+            'defense': core.defense,
+            'shield': core.shield,
+            'speed': core.speed,
+        },
+        _equipped(core.equipped_moves.all()),
+    )
+
+
+def compile_loadout(player_cores: list, npc_cores: list) -> dict:
+    """Loadout for a battle from the player's Cores and the NPC's NPCCores, in team order."""
+    return {
+        'player': [player_core_record(core) for core in player_cores],
+        'npc': [npc_core_record(core) for core in npc_cores],
+    }
+
+
+def _legacy_loadout(battle) -> dict:
+    """
+    Rebuild the loadout of a battle created before loadouts were stored.
+    The NPC half was recovered from the old rewards JSON by migration 0007.
+    """
+    from battle.models import BattleCoreState
+
+    states = BattleCoreState.objects.filter(team__battle=battle).select_related(
+        'core', 'core__battle_info'
+    ).prefetch_related('core__coreequippedmove_set').order_by('position')
+
+    return {
+        'player': [player_core_record(state.core) for state in states],
+        'npc': battle.loadout.get('npc', []),
+    }
+
+
+# ============================================================================
+# Process-wide cache
+# ============================================================================
+
+_loadouts: dict[str, dict] = {}
+_lock = threading.Lock()
+
+
+def get_loadout(battle) -> dict:
+    """The battle's loadout, from the process cache or Battle.loadout."""
+    key = str(battle.id)
+    loadout = _loadouts.get(key)
+    if loadout is not None:
+        return loadout
+
+    if 'player' not in battle.loadout:
+        battle.loadout = _legacy_loadout(battle)
+        battle.save(update_fields=['loadout'])
+
+    with _lock:
+        return _loadouts.setdefault(key, _index(battle.loadout))
+
+
+def _index(loadout: dict) -> dict:
+    return {
+        side: [
+            {**core, 'moves_by_id': {move['id']: move for move in core['equipped_moves']}}
+            for core in cores
+        ]
+        for side, cores in loadout.items()
+    }
+
+
+def evict_loadout(battle_id) -> None:
+    with _lock:
+        _loadouts.pop(str(battle_id), None)
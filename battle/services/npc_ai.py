@@ -1,17 +1,68 @@
 # battle/services/npc_ai.py
 """
 NPC AI decision making for PvE battles.
-MVP: Simple random selection with resource checking.
+
+Live NPCs play with the lookahead search in npc_search, scaled by their
+NPCOperator.difficulty_rating (see search_profile). The heuristic policy
+below (random selection with resource checking and HP awareness) is what
+low-rated NPCs fall back to some of the time, what any NPC uses when the
+search runs out of budget, and what the simulator uses for both sides.
+
+Searches go through engine_pool.run_search, which hands them to the npc_ai
+process pool when one is configured.
 """
 import random
-from typing import Optional
+from dataclasses import dataclass
+from typing import Optional, TYPE_CHECKING
+
+from django.conf import settings
+
+from battle.constants import (
+    NPC_AI_MAX_DEPTH, NPC_AI_NODES_PER_RATING, NPC_AI_MAX_NODES,
+    NPC_AI_HEURISTIC_CHANCE,
+)
+from battle.services import engine_pool, npc_search
+from battle.services.battle_rng import battle_stream
+
+if TYPE_CHECKING:
+    from battle.models import Battle
+
+
+@dataclass(frozen=True)
+class SearchProfile:
+    """How hard an NPC thinks"""
+    depth: int               # own decisions looked ahead
+    node_budget: int         # search nodes (decisions and chance outcomes) per decision
+    heuristic_chance: float  # chance to play the heuristic policy instead
+
+
+def search_profile(difficulty_rating: int) -> SearchProfile:
+    """Search depth, node budget and heuristic fallback rate for a difficulty rating."""
+    rating = max(1, int(difficulty_rating or 1))
+    max_depth = getattr(settings, 'NPC_AI_MAX_DEPTH', NPC_AI_MAX_DEPTH)
+    max_nodes = getattr(settings, 'NPC_AI_MAX_NODES', NPC_AI_MAX_NODES)
+    nodes_per_rating = getattr(settings, 'NPC_AI_NODES_PER_RATING', NPC_AI_NODES_PER_RATING)
+    heuristic_chance = getattr(settings, 'NPC_AI_HEURISTIC_CHANCE', NPC_AI_HEURISTIC_CHANCE)
+    return SearchProfile(
+        depth=min(max_depth, 1 + rating // 3),
+        node_budget=min(max_nodes, nodes_per_rating * rating),
+        heuristic_chance=heuristic_chance.get(rating, 0.0),
+    )
+
 
-from battle.models import Battle
+def _difficulty(battle: 'Battle') -> int:
+    """The NPC's difficulty rating, copied onto its NPCBattleTeam at battle start."""
+    from battle.services.battle_engine import _get_npc_team
 
+    npc_team = _get_npc_team(battle)
+    return npc_team.difficulty_rating if npc_team else 1
 
-def choose_npc_action(battle: Battle) -> dict:
+
+def choose_npc_action(battle: 'Battle') -> dict:
     """
-    Choose an action for the NPC with status-effect-aware logic.
+    Choose an action for the NPC: lookahead search at the NPC's difficulty,
+    or the heuristic policy when the profile rolls for it or the search
+    runs out of budget.
 
     Returns:
         {
@@ -20,11 +71,27 @@ def choose_npc_action(battle: Battle) -> dict:
             'new_core_index': int if action_type == 'switch',
         }
     """
-    from battle.constants import DEFENSIVE_EFFECTS
+    from battle.services.battle_engine import load_state
+
+    state = load_state(battle)
+    profile = search_profile(_difficulty(battle))
+    with battle_stream(battle) as rng:
+        if rng.random() >= profile.heuristic_chance:
+            action = engine_pool.run_search(
+                npc_search.choose_action, state, 'npc', profile.depth, profile.node_budget
+            )
+            if action is not None:
+                return action
+        return choose_action(state['teams']['npc'], rng)
+
 
-    npc_team = battle.rewards.get('npc_team', {})
-    active_idx = npc_team.get('active_core_index', 0)
-    cores = npc_team.get('cores', [])
+def choose_action(team_state: dict, rng=random) -> dict:
+    """
+    Choose an action for a team from its kernel state alone (no Battle).
+    Used for the NPC side in live battles and for both sides in simulation.
+    """
+    active_idx = team_state.get('active_core_index', 0)
+    cores = team_state.get('cores', [])
 
     if not cores:
         return {'action_type': 'pass'}
@@ -43,10 +110,10 @@ def choose_npc_action(battle: Battle) -> dict:
             return {'action_type': 'pass'}  # All cores KO'd
 
     # Get available moves (ones we can afford)
-    available_moves = get_affordable_moves(active_core, npc_team)
+    available_moves = get_affordable_moves(active_core, team_state)
 
     if available_moves:
-        chosen_move = _pick_smart_move(active_core, available_moves, battle)
+        chosen_move = _pick_smart_move(active_core, available_moves, rng)
         return {
             'action_type': 'move',
             'move': chosen_move,
@@ -56,14 +123,14 @@ def choose_npc_action(battle: Battle) -> dict:
         return {'action_type': 'gain_resource'}
 
 
-def _pick_smart_move(active_core: dict, available_moves: list, battle: Battle) -> dict:
+def _pick_smart_move(active_core: dict, available_moves: list, rng=random) -> dict:
     """
     Pick a move with basic tactical awareness:
     - Prefer defensive moves when HP is low
     - Prefer attack moves when enemy has no guard effects
     - Don't use guard if already guarding
     """
-    from battle.constants import DEFENSIVE_EFFECTS, MOVE_EFFECT_MAP
+    from battle.constants import MOVE_EFFECT_MAP
 
     hp_ratio = active_core.get('current_hp', 0) / max(1, active_core.get('max_hp', 1))
     own_effects = {e['effect_type'] for e in active_core.get('status_effects', [])}
@@ -74,21 +141,21 @@ def _pick_smart_move(active_core: dict, available_moves: list, battle: Battle) -
     # Filter out status moves we already have active
     usable_status = []
     for m in status_moves:
-        effect_def = MOVE_EFFECT_MAP.get(m['name'])
+        effect_def = m['effect'] if 'effect' in m else MOVE_EFFECT_MAP.get(m['name'])
         if effect_def and effect_def['effect_type'] in own_effects:
             continue  # Already have this effect active
         usable_status.append(m)
 
     # Low HP: 60% chance to pick a defensive/support move if available
-    if hp_ratio < 0.4 and usable_status and random.random() < 0.6:
-        return random.choice(usable_status)
+    if hp_ratio < 0.4 and usable_status and rng.random() < 0.6:
+        return rng.choice(usable_status)
 
     # High HP + have attacks: 80% chance to attack
-    if hp_ratio > 0.6 and attack_moves and random.random() < 0.8:
-        return random.choice(attack_moves)
+    if hp_ratio > 0.6 and attack_moves and rng.random() < 0.8:
+        return rng.choice(attack_moves)
 
     # Default: random from all available
-    return random.choice(available_moves)
+    return rng.choice(available_moves)
 
 
 def get_affordable_moves(core: dict, team_state: dict) -> list[dict]:
@@ -124,14 +191,35 @@ def find_alive_core(cores: list[dict], exclude_idx: Optional[int] = None) -> Opt
     return None
 
 
-def allocate_npc_dice(battle: Battle, dice_rolls: list[dict]) -> list[dict]:
+def allocate_npc_dice(battle: Optional['Battle'], dice_rolls: list[dict]) -> list[dict]:
     """
     Automatically allocate NPC dice to pools.
-    MVP strategy: 50/50 split, higher rolls to energy.
+
+    In a live battle the split is searched like any other decision (at the
+    NPC's difficulty). Without a battle (simulation), or when the search
+    runs out of budget: 50/50 split, higher rolls to energy.
     """
     if not dice_rolls:
         return []
 
+    if battle is not None:
+        from battle.services.battle_engine import load_state
+
+        profile = search_profile(_difficulty(battle))
+        allocations = engine_pool.run_search(
+            npc_search.choose_allocation,
+            load_state(battle), 'npc', dice_rolls, profile.depth, profile.node_budget,
+        )
+        if allocations is not None:
+            for roll, allocation in zip(dice_rolls, allocations):
+                roll['allocated_to'] = allocation['pool']
+            return allocations
+
+    return _split_allocation(dice_rolls)
+
+
+def _split_allocation(dice_rolls: list[dict]) -> list[dict]:
+    """Alternate energy/physical, highest roll first."""
     # Sort rolls by value (highest first)
     sorted_rolls = sorted(dice_rolls, key=lambda x: x['roll_value'], reverse=True)
 
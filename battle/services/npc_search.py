@@ -0,0 +1,365 @@
+# battle/services/npc_search.py
+"""
+Lookahead policy for NPC decisions. Pure Python on kernel state, no Django.
+
+Expectiminimax over the real action space, following the live turn order
+(player acts, then NPC, then KO replacement, then the next turn's effect
+tick):
+
+    - decision nodes: every affordable move, every switch, and
+      gain_resource once per way of splitting the dice between pools
+    - chance nodes: confusion self-hits, accuracy, and status-effect apply
+      chances, each outcome replayed through the kernel with a scripted RNG
+      so the rules are never re-implemented here
+    - the searching side maximizes, the other side minimizes
+
+Dice are taken at their mean (4.5 per alive core) and damage at its mean
+variance; critical hits are ignored, which scales every attack the same
+way. Leaves are scored by evaluate().
+
+Search is iterative deepening against a node budget: depth 1, 2, ... up
+to `depth` decisions of the searching side, keeping the answer of the
+deepest iteration that finished. Every unit of work counts against
+`node_budget` across all iterations: each decision node, each chance
+outcome or dice split (a kernel resolution on a state copy) and each
+end-of-turn KO switch and effect tick. If not even depth 1 finishes, the
+entry points return None and the caller falls back to the heuristic policy
+in npc_ai. The budget is a node count rather than a clock so the outcome,
+and with it every battle RNG draw that follows, depends only on the state
+and replays bit-exact regardless of machine load.
+"""
+import itertools
+from typing import Callable, Optional
+
+from battle.constants import DEFENSIVE_EFFECTS, DEBUFF_EFFECTS, DICE_MIN, DICE_MAX
+from battle.services import battle_kernel, status_effects
+from battle.services.battle_kernel import SIDES, get_active_core, opponent_of
+
+
+WIN_SCORE = 100.0
+ALIVE_BONUS = 0.5           # per core still standing, on top of its HP fraction
+POOL_VALUE = 0.01           # per resource point, up to POOL_CAP per pool
+POOL_CAP = 20
+EFFECT_VALUE = 0.1          # per buff on own active core / debuff on the enemy's
+
+POOLS = ('energy', 'physical')
+MEAN_ROLL = (DICE_MIN + DICE_MAX) / 2
+
+
+class _OutOfBudget(Exception):
+    pass
+
+
+class _ScriptedRng:
+    """
+    Returns preset random() values in order, so the kernel resolves one
+    chosen chance outcome. uniform() returns the midpoint (mean variance).
+    """
+
+    def __init__(self, values):
+        self._values = values
+        self._next = 0
+
+    def random(self) -> float:
+        value = self._values[self._next] if self._next < len(self._values) else 1.0
+        self._next += 1
+        return value
+
+    def uniform(self, a: float, b: float) -> float:
+        return (a + b) / 2
+
+    def randint(self, a: int, b: int) -> int:
+        return (a + b) // 2
+
+    def choice(self, seq):
+        return seq[0]
+
+
+# random() values that make a check pass (0.0) or fail (1.0):
+#   confusion:     random() < value        -> 0.0 self-hit, 1.0 acts normally
+#   accuracy:      random() <= accuracy    -> 0.0 hit,      1.0 miss
+#   critical:      random() < 6.25%        -> 1.0 no crit
+#   apply chance:  random() > apply_chance -> 0.0 applies,  1.0 fails
+PASS, FAIL = 0.0, 1.0
+
+
+# ============================================================================
+# Entry points
+# ============================================================================
+
+def choose_action(state: dict, side: str, depth: int, node_budget: int) -> Optional[dict]:
+    """
+    Best action for `side`, in choose_action's format:
+    {'action_type': 'move', 'move': {...}} / 'switch' + 'new_core_index' /
+    'gain_resource' / 'pass'. None if not even a depth-1 search fit the budget.
+    """
+    search = _Search(side, node_budget)
+    best = None
+    for d in range(1, max(1, depth) + 1):
+        try:
+            best = search.best_action(state, d)
+        except _OutOfBudget:
+            break
+    return best
+
+
+def choose_allocation(state: dict, side: str, rolls: list[dict],
+                      depth: int, node_budget: int) -> Optional[list[dict]]:
+    """
+    Best split of `side`'s rolled dice between pools, looking `depth` of the
+    side's decisions past the allocation. Returns allocate_dice allocations,
+    or None if not even a depth-1 search fit the budget.
+    """
+    search = _Search(side, node_budget)
+    best = None
+    for d in range(1, max(1, depth) + 1):
+        try:
+            best = search.best_allocation(state, rolls, d)
+        except _OutOfBudget:
+            break
+    return best
+
+
+# ============================================================================
+# Evaluation
+# ============================================================================
+
+def evaluate(state: dict, side: str) -> float:
+    """Static score of `state` from `side`'s point of view (higher is better)."""
+    return _team_score(state['teams'].get(side)) - _team_score(state['teams'].get(opponent_of(side)))
+
+
+def _team_score(team: Optional[dict]) -> float:
+    if not team:
+        return 0.0
+
+    score = 0.0
+    for core in team.get('cores', []):
+        if not core.get('is_knocked_out'):
+            score += ALIVE_BONUS + core['current_hp'] / max(1, core.get('max_hp', 1))
+
+    score += POOL_VALUE * (
+        min(team.get('energy_pool', 0), POOL_CAP) + min(team.get('physical_pool', 0), POOL_CAP)
+    )
+
+    active = get_active_core(team)
+    if active and not active.get('is_knocked_out'):
+        for effect in active.get('status_effects', []):
+            if effect['effect_type'] in DEFENSIVE_EFFECTS or effect['effect_type'] == 'regen':
+                score += EFFECT_VALUE
+            elif effect['effect_type'] in DEBUFF_EFFECTS:
+                score -= EFFECT_VALUE
+    return score
+
+
+# ============================================================================
+# Search
+# ============================================================================
+
+class _Search:
+    """One decision's search: the maximizing side and the nodes it has left."""
+
+    def __init__(self, side: str, node_budget: int):
+        self.side = side
+        self.nodes_left = node_budget
+
+    def _spend_node(self) -> None:
+        self.nodes_left -= 1
+        if self.nodes_left < 0:
+            raise _OutOfBudget
+
+    # ------------------------------------------------------------------
+    # Roots
+    # ------------------------------------------------------------------
+
+    def best_action(self, state: dict, depth: int) -> dict:
+        best, best_value = None, None
+        for action in legal_actions(state, self.side):
+            value = self._action_value(state, self.side, action, depth - 1)
+            if best_value is None or value > best_value:
+                best, best_value = action, value
+
+        best = dict(best)
+        if best['action_type'] == 'gain_resource':
+            # The split is chosen again once the real dice are rolled
+            best.pop('energy_dice', None)
+        return best
+
+    def best_allocation(self, state: dict, rolls: list[dict], depth: int) -> list[dict]:
+        best, best_value = None, None
+        for pools in itertools.product(POOLS, repeat=len(rolls)):
+            allocations = [
+                {'core_id': roll['core_id'], 'pool': pool} for roll, pool in zip(rolls, pools)
+            ]
+            self._spend_node()
+            after = _add_to_pools(state, self.side, [
+                (pool, roll['roll_value']) for roll, pool in zip(rolls, pools)
+            ])
+            value = self._after_action(after, self.side, depth - 1)
+            if best_value is None or value > best_value:
+                best, best_value = allocations, value
+        return best
+
+    # ------------------------------------------------------------------
+    # Nodes
+    # ------------------------------------------------------------------
+
+    def _decision(self, state: dict, actor: str, depth: int) -> float:
+        """`actor` to act. `depth` counts the searching side's decisions left."""
+        self._spend_node()
+        mine = actor == self.side
+        if mine and depth == 0:
+            return evaluate(state, self.side)
+
+        remaining = depth - 1 if mine else depth
+        values = [
+            self._action_value(state, actor, action, remaining)
+            for action in legal_actions(state, actor)
+        ]
+        return max(values) if mine else min(values)
+
+    def _action_value(self, state: dict, actor: str, action: dict, depth: int) -> float:
+        value = 0.0
+        for p, resolve in chance_branches(state, actor, action):
+            self._spend_node()
+            value += p * self._after_action(resolve(), actor, depth)
+        return value
+
+    def _after_action(self, state: dict, actor: str, depth: int) -> float:
+        if actor == SIDES[0]:
+            return self._decision(state, SIDES[1], depth)
+        return self._end_turn(state, depth)
+
+    def _end_turn(self, state: dict, depth: int) -> float:
+        """KO replacement and defeat check (as the consumer does), then the next turn."""
+        for side in SIDES:
+            team = state['teams'].get(side)
+            active = get_active_core(team)
+            if active and active.get('is_knocked_out'):
+                idx = _first_alive(team['cores'], exclude=team['active_core_index'])
+                if idx is not None:
+                    self._spend_node()
+                    state, _ = battle_kernel.resolve_switch(state, side, idx)
+
+        # The player losing is checked first
+        for loser in SIDES:
+            if battle_kernel.is_team_defeated(state, loser):
+                return -WIN_SCORE if loser == self.side else WIN_SCORE
+
+        if depth == 0:
+            return evaluate(state, self.side)
+
+        self._spend_node()
+        state, _ = battle_kernel.tick_effects(state)
+        return self._decision(state, SIDES[0], depth)
+
+
+# ============================================================================
+# Action space
+# ============================================================================
+
+def legal_actions(state: dict, side: str) -> list[dict]:
+    """Every action `side` can take, with gain_resource once per dice split."""
+    team = state['teams'].get(side)
+    active = get_active_core(team)
+    if not active:
+        return [{'action_type': 'pass'}]
+
+    cores = team.get('cores', [])
+    switches = [
+        {'action_type': 'switch', 'new_core_index': i}
+        for i, core in enumerate(cores)
+        if i != team['active_core_index'] and not core.get('is_knocked_out')
+    ]
+    if active.get('is_knocked_out'):
+        return switches or [{'action_type': 'pass'}]
+
+    moves = [
+        {'action_type': 'move', 'move': move}
+        for move in active.get('equipped_moves', [])
+        if battle_kernel.can_afford(team, move)
+    ]
+    alive = sum(1 for core in cores if not core.get('is_knocked_out'))
+    gains = [
+        {'action_type': 'gain_resource', 'energy_dice': k}
+        for k in range(alive + 1)
+    ]
+    return moves + switches + gains
+
+
+def chance_branches(state: dict, side: str, action: dict) -> list[tuple[float, Callable[[], dict]]]:
+    """
+    (probability, resolve) for each chance outcome of `action`; resolve()
+    runs the kernel and returns the outcome's state, so a search can pay
+    for each outcome before computing it.
+    """
+    action_type = action['action_type']
+
+    if action_type == 'move':
+        return [
+            (p, lambda script=script: battle_kernel.resolve_move(state, side, action['move'], _ScriptedRng(script))[0])
+            for p, script in _move_branches(state, side, action['move'])
+        ]
+    if action_type == 'switch':
+        return [(1.0, lambda: battle_kernel.resolve_switch(state, side, action['new_core_index'])[0])]
+    if action_type == 'gain_resource':
+        return [(1.0, lambda: _expected_gain(state, side, action.get('energy_dice', 0)))]
+    return [(1.0, lambda: state)]
+
+
+def _move_branches(state: dict, side: str, move: dict) -> list[tuple[float, list[float]]]:
+    """(probability, scripted random() values) for each outcome of `move`."""
+    team = state['teams'][side]
+    attacker = get_active_core(team)
+    effects = attacker.get('status_effects', [])
+
+    if status_effects.check_stun(effects):
+        return [(1.0, [])]
+
+    # Confusion is checked first and ends the move on a self-hit
+    branches = []
+    confusion = next((e for e in effects if e['effect_type'] == 'confusion'), None)
+    prefix = []
+    p_act = 1.0
+    if confusion:
+        p_self = confusion.get('value', 0.3)
+        branches.append((p_self, [PASS]))
+        prefix = [FAIL]
+        p_act = 1.0 - p_self
+
+    effect_def = battle_kernel.effect_of(move)
+    if effect_def and move.get('type') != 'Attack':
+        p_apply = effect_def.get('apply_chance', 1.0)
+        branches.append((p_act * p_apply, prefix + [PASS]))
+        branches.append((p_act * (1.0 - p_apply), prefix + [FAIL]))
+    else:
+        p_hit = min(1.0, move.get('accuracy', 1.0) * status_effects.get_accuracy_modifier(effects))
+        branches.append((p_act * p_hit, prefix + [PASS, FAIL]))
+        branches.append((p_act * (1.0 - p_hit), prefix + [FAIL]))
+
+    return [(p, script) for p, script in branches if p > 0]
+
+
+def _expected_gain(state: dict, side: str, energy_dice: int) -> dict:
+    """Mean roll for every alive core, the first `energy_dice` of them to energy."""
+    alive = sum(1 for core in state['teams'][side]['cores'] if not core.get('is_knocked_out'))
+    return _add_to_pools(state, side, [
+        ('energy' if i < energy_dice else 'physical', MEAN_ROLL) for i in range(alive)
+    ])
+
+
+def _add_to_pools(state: dict, side: str, amounts: list[tuple[str, float]]) -> dict:
+    new_state = {**state, 'teams': {**state['teams']}}
+    team = dict(new_state['teams'][side])
+    for pool, amount in amounts:
+        key = f'{pool}_pool'
+        team[key] = team.get(key, 0) + amount
+    new_state['teams'][side] = team
+    return new_state
+
+
+def _first_alive(cores: list[dict], exclude: int) -> Optional[int]:
+    for i, core in enumerate(cores):
+        if i != exclude and not core.get('is_knocked_out'):
+            return i
+    return None
@@ -0,0 +1,146 @@
+# battle/services/reaper.py
+"""
+Idle battle reaper.
+
+A battle whose player closed the tab used to stay ACTIVE forever, along
+with whatever a worker had cached for it. Every command resolved by
+turn_resolver now pushes Battle.idle_deadline out by the battle's idle
+timeout (Battle.idle_timeout, or BATTLE_IDLE_TIMEOUT), and a sweeper
+retires battles that pass it:
+
+    - sweep(): in one transaction per BATTLE_REAPER_BATCH battles, marks
+      ACTIVE battles past their deadline ABANDONED with one conditional
+      UPDATE and queues the ones it actually moved (arena battles only) as
+      losses with one bulk insert into the settlement outbox
+      (battle/services/settlement.py)
+    - a command running on an abandoned battle cannot undo this: sessions
+      write the Battle row only while it is still ACTIVE
+      (battle/services/battle_session.py), so its whole transaction,
+      settlement included, is dropped
+    - each abandoned battle gets a battle.abandoned group message; sockets
+      still attached end the battle on the client and close, and the
+      battle's actor drops the session without writing it back
+
+Each worker runs the sweep every BATTLE_REAPER_INTERVAL seconds on its
+event loop (started by the first battle socket). With worker affinity on
+(battle/services/affinity.py) a worker sweeps only the battles it owns, so
+workers never race for the same rows. `manage.py reap_battles` runs one
+sweep over all battles, for cron or by hand.
+"""
+import asyncio
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Optional
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from battle.constants import BATTLE_IDLE_TIMEOUT, BATTLE_REAPER_INTERVAL, BATTLE_REAPER_BATCH
+
+
+def idle_timeout(battle=None) -> int:
+    """Seconds a battle may go without a command."""
+    timeout = getattr(battle, 'idle_timeout', None)
+    return timeout or getattr(settings, 'BATTLE_IDLE_TIMEOUT', BATTLE_IDLE_TIMEOUT)
+
+
+def idle_deadline(battle=None) -> datetime:
+    """When a battle becomes idle if nothing happens from now on."""
+    return timezone.now() + timedelta(seconds=idle_timeout(battle))
+
+
+def touch(battle) -> None:
+    """Command activity: push the idle deadline out (in memory, flushed with the session)."""
+    battle.idle_deadline = idle_deadline(battle)
+
+
+# ============================================================================
+# Sweep
+# ============================================================================
+
+def sweep(local_only: bool = False, batch: Optional[int] = None) -> list[str]:
+    """
+    Abandon one batch of idle ACTIVE battles and settle them. With
+    `local_only`, only battles this worker owns. Returns the ids of the
+    battles this sweep moved to ABANDONED.
+    """
+    from battle.models import Battle, NPCOperator
+    from battle.services import affinity, settlement
+
+    batch = batch or getattr(settings, 'BATTLE_REAPER_BATCH', BATTLE_REAPER_BATCH)
+    now = timezone.now()
+
+    idle = (
+        Battle.objects.filter(status='ACTIVE', idle_deadline__lt=now)
+        .order_by('idle_deadline').values_list('id', flat=True)
+    )
+    if local_only:
+        candidates = list(islice(
+            (battle_id for battle_id in idle.iterator() if affinity.is_local(battle_id)), batch
+        ))
+    else:
+        candidates = list(idle[:batch])
+    if not candidates:
+        return []
+
+    with transaction.atomic():
+        # A battle whose command committed meanwhile is no longer idle, and
+        # one another sweep took is no longer ACTIVE
+        Battle.objects.filter(id__in=candidates, status='ACTIVE', idle_deadline__lt=now).update(
+            status='ABANDONED', updated_at=now
+        )
+        rows = list(
+            Battle.objects.filter(id__in=candidates, status='ABANDONED', updated_at=now)
+            .values_list('id', 'operator_1_id', 'npc_team__npc_id')
+        )
+        npcs = NPCOperator.objects.in_bulk({npc_id for _, _, npc_id in rows if npc_id})
+        settlement.enqueue_many(
+            [(battle_id, operator_id, npc_id, False) for battle_id, operator_id, npc_id in rows if npc_id],
+            npcs,
+        )
+
+    return [str(battle_id) for battle_id, _, _ in rows]
+
+
+async def notify(battle_ids: list[str]) -> None:
+    """Tell the sockets (and the worker holding the session) of each battle."""
+    channel_layer = get_channel_layer()
+    for battle_id in battle_ids:
+        await channel_layer.group_send(f'battle_{battle_id}', {'type': 'battle.abandoned'})
+
+
+# ============================================================================
+# Periodic sweeper
+# ============================================================================
+
+_sweeper: Optional[asyncio.Task] = None
+
+
+async def ensure_started() -> None:
+    """Start this worker's sweep loop (once per event loop)."""
+    global _sweeper
+    if _sweeper is None or _sweeper.done():
+        _sweeper = asyncio.get_running_loop().create_task(_sweep_loop())
+
+
+async def _sweep_loop() -> None:
+    from battle.services import affinity, settlement
+
+    interval = getattr(settings, 'BATTLE_REAPER_INTERVAL', BATTLE_REAPER_INTERVAL)
+    batch = getattr(settings, 'BATTLE_REAPER_BATCH', BATTLE_REAPER_BATCH)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            while True:
+                battle_ids = await database_sync_to_async(sweep)(affinity.enabled(), batch)
+                await notify(battle_ids)
+                if len(battle_ids) < batch:
+                    break
+            # Settlement jobs a crashed process left behind
+            await database_sync_to_async(settlement.drain)()
+        except DatabaseError:
+            # Another writer held the database; the next sweep retries
+            pass
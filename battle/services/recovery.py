@@ -0,0 +1,168 @@
+# battle/services/recovery.py
+"""
+Battle recovery from the turn journal.
+
+Every session flush commits the battle rows together with the journal
+(BattleTurn rows: a full state snapshot every JOURNAL_SNAPSHOT_INTERVAL
+turns, a delta per turn in between, and the RNG cursor; see
+battle/services/turn_log.py). If a process dies, whatever it had not
+flushed is lost as a whole, and what it had flushed is consistent.
+
+recover_battle() replays the journal from the last snapshot and compares
+the result with the rows. Rows that disagree (pending dice and KO switch
+flags, pools, active cores, core HP / KO flags / effects / last rolls, the
+RNG cursor, the current turn) are rewritten from the journal. Battles
+with no snapshot in their journal (started before the journal existed)
+are left alone, and only the turns from the last snapshot on are read.
+
+Server workers run the check once, in the background, after they start
+(ensure_started(), from the ASGI lifespan startup or the first battle
+socket): BATTLE_RECOVERY_BATCH battles per database call, only the
+battles this worker owns on the affinity ring, and never one whose
+session this process already holds (a live session would flush over the
+repair). `manage.py recover_battles` checks every battle.
+
+Replay applies the journaled deltas rather than re-running the actions,
+so a repair never depends on the NPC search settings (depth, node budget)
+in force when the turn was played.
+"""
+import asyncio
+from typing import Optional
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+from battle.constants import BATTLE_RECOVERY_BATCH
+from battle.models import Battle, BattleTurn
+from battle.services import affinity, battle_session
+from battle.services.battle_engine import load_state
+from battle.services.battle_session import BattleSession
+from battle.services.turn_log import TEAM_KEYS, mutable_state, replay
+
+
+CORE_KEYS = ('current_hp', 'is_knocked_out', 'status_effects', 'last_dice_roll')
+
+
+def recover_battle(battle_id, apply: bool = True) -> bool:
+    """
+    Bring an active battle's rows in line with its journal.
+
+    Returns:
+        True if the rows disagreed with the journal (and, when `apply`,
+        were rewritten), False otherwise (also when this process holds
+        the battle's session)
+    """
+    with battle_session.unheld(battle_id) as free, transaction.atomic():
+        if not free:
+            return False
+        # Serialize with any other recovery of the same battle
+        Battle.objects.select_for_update().filter(id=battle_id).values_list('id').first()
+        session = BattleSession.load(battle_id)
+        battle = session.battle
+
+        turns = BattleTurn.objects.filter(battle=battle)
+        start = (
+            turns.exclude(state_before={}).order_by('-turn_number', '-id')
+            .values_list('turn_number', flat=True).first()
+        )
+        if start is None:
+            return False
+        replayed = replay(
+            turns.filter(turn_number__gte=start).order_by('turn_number', 'id')
+            .only('turn_number', 'state_before', 'state_after')
+        )
+        if replayed is None:
+            return False
+
+        turn_number, journal = replayed
+        if battle.current_turn == turn_number and mutable_state(load_state(battle), battle) == journal:
+            return False
+
+        if apply:
+            battle.current_turn = turn_number
+            _restore(session, journal)
+            session.flush()
+        return True
+
+
+def recover_active_battles(apply: bool = True, local_only: bool = False,
+                           batch: Optional[int] = None) -> tuple[int, int]:
+    """Check every ACTIVE battle, a batch at a time. Returns (battles scanned, battles repaired)."""
+    scanned = repaired = 0
+    after = None
+    while True:
+        checked, fixed, after = recover_batch(after, apply, local_only, batch)
+        scanned += checked
+        repaired += fixed
+        if after is None:
+            return scanned, repaired
+
+
+def recover_batch(after=None, apply: bool = True, local_only: bool = False,
+                  batch: Optional[int] = None) -> tuple[int, int, Optional[str]]:
+    """
+    Check the next `batch` ACTIVE battles by id after `after`. Returns
+    (battles scanned, battles repaired, id to continue after or None when done).
+    """
+    batch = batch or getattr(settings, 'BATTLE_RECOVERY_BATCH', BATTLE_RECOVERY_BATCH)
+    battles = Battle.objects.filter(status='ACTIVE').order_by('id')
+    if after is not None:
+        battles = battles.filter(id__gt=after)
+    battle_ids = list(battles.values_list('id', flat=True)[:batch])
+    if local_only:
+        checked = [battle_id for battle_id in battle_ids if affinity.is_local(battle_id)]
+    else:
+        checked = battle_ids
+    repaired = sum(recover_battle(battle_id, apply=apply) for battle_id in checked)
+    last = battle_ids[-1] if len(battle_ids) == batch else None
+    return len(checked), repaired, last
+
+
+# ============================================================================
+# Worker startup
+# ============================================================================
+
+_recovery: Optional[asyncio.Task] = None
+
+
+async def ensure_started() -> None:
+    """Start this worker's one-off recovery pass (once per process)."""
+    global _recovery
+    if _recovery is None:
+        _recovery = asyncio.get_running_loop().create_task(_recover_owned())
+
+
+async def _recover_owned() -> None:
+    # The ring is known once the worker has joined it
+    await affinity.ensure_started()
+    after = None
+    try:
+        while True:
+            _, _, after = await database_sync_to_async(recover_batch)(after, True, affinity.enabled())
+            if after is None:
+                return
+    except DatabaseError:
+        # Before the first migrate, or the database went away; recover_battles covers it
+        pass
+
+
+def _restore(session: BattleSession, journal: dict) -> None:
+    """Write the journaled state onto the session's cached rows (no save)."""
+    session.battle.rng_cursor = journal['rng_cursor']
+
+    sides = {
+        'player': (session.player_team, session.core_states),
+        'npc': (session.npc_team, session.npc_core_states),
+    }
+    for side, data in journal['teams'].items():
+        team, core_states = sides.get(side, (None, []))
+        if team is None:
+            continue
+        for key in TEAM_KEYS:
+            if key in data and hasattr(team, key):
+                setattr(team, key, data[key])
+        for core_state, core in zip(core_states, data.get('cores', [])):
+            for key in CORE_KEYS:
+                if key in core:
+                    setattr(core_state, key, core[key])
@@ -0,0 +1,271 @@
+# battle/services/settlement.py
+"""
+Arena settlement.
+
+An arena result changes the operator's OperatorArenaProgress (win/loss
+counters, streaks, defeated NPCs, rank unlock), pays the NPC's reward bits
+on a win and sends the NPC's win or lose mail. Every path that produces a
+result goes through here:
+
+    - battles ending in turn_resolver: enqueue() writes a SettlementJob in
+      the battle's own transaction and the battle_end message goes out
+      right away; once that transaction commits, the job is applied on
+      the settlement thread
+    - idle battles abandoned by the reaper: enqueue_many() queues their
+      losses with the batch that abandons them
+    - ArenaViewSet.challenge: apply() directly, since the response carries
+      the updated progress
+
+Rewards come from a snapshot of the NPC (npc_snapshot()) taken from the
+battle's cached rows when the job is queued, so applying it reads no NPC.
+apply() settles any number of results in one transaction: one bulk
+insert for missing progress rows, F() updates for the counters grouped
+by identical change, one bulk_update for defeated NPCs and ranks, F()
+updates for bits and a single bulk insert for all the mail.
+
+Jobs left PENDING by a crash are picked up by drain(), which the reaper's
+sweep loop also runs.
+"""
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from battle.constants import SETTLEMENT_BATCH
+
+
+RANK_ORDER = {'E': 0, 'D': 1, 'C': 2, 'B': 3, 'A': 4, 'S': 5}
+
+NPC_FIELDS = (
+    'call_sign', 'reward_bits', 'reward_exp', 'is_gate_boss', 'unlocks_rank',
+    'win_mail_subject', 'win_mail_body', 'lose_mail_subject', 'lose_mail_body',
+)
+
+
+@dataclass(frozen=True)
+class ArenaResult:
+    """One arena battle's outcome for an operator."""
+    operator_id: str
+    won: bool
+    npc: dict  # npc_snapshot()
+
+
+def npc_snapshot(npc) -> dict:
+    """What settlement needs from an NPCOperator."""
+    return {'id': str(npc.id), **{name: getattr(npc, name) for name in NPC_FIELDS}}
+
+
+def rewards(npc) -> dict:
+    """Rewards shown to the player for beating `npc`."""
+    return {'bits': npc.reward_bits, 'exp': npc.reward_exp}
+
+
+# ============================================================================
+# Outbox
+# ============================================================================
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='settlement')
+_scheduled = threading.Event()
+
+
+def enqueue(battle, won: bool) -> None:
+    """
+    Queue a battle's result (inside the battle's transaction) and apply it
+    after that transaction commits. No-op for battles without an NPC.
+    """
+    from battle.models import SettlementJob
+
+    npc_team = getattr(battle, 'npc_team', None)
+    npc = npc_team.npc if npc_team else None
+    if npc is None:
+        return
+    SettlementJob.objects.create(
+        battle=battle, operator_id=battle.operator_1_id, won=won, npc=npc_snapshot(npc)
+    )
+    transaction.on_commit(kick)
+
+
+def enqueue_many(results: list[tuple], npcs: dict) -> None:
+    """Queue (battle id, operator id, NPC id, won) results; `npcs` maps NPC id to NPCOperator."""
+    from battle.models import SettlementJob
+
+    SettlementJob.objects.bulk_create([
+        SettlementJob(battle_id=battle_id, operator_id=operator_id, won=won, npc=npc_snapshot(npcs[npc_id]))
+        for battle_id, operator_id, npc_id, won in results if npc_id in npcs
+    ])
+    transaction.on_commit(kick)
+
+
+def kick() -> None:
+    """Drain the outbox on the settlement thread (coalesced while a drain is queued)."""
+    if not _scheduled.is_set():
+        _scheduled.set()
+        _executor.submit(_drain_in_background)
+
+
+def _drain_in_background() -> None:
+    _scheduled.clear()
+    close_old_connections()
+    try:
+        drain()
+    finally:
+        close_old_connections()
+
+
+def drain() -> int:
+    """Apply PENDING jobs in batches until none are left. Returns how many were applied."""
+    from battle.models import SettlementJob
+
+    batch = getattr(settings, 'SETTLEMENT_BATCH', SETTLEMENT_BATCH)
+    total = 0
+    while True:
+        with transaction.atomic():
+            jobs = list(
+                SettlementJob.objects.select_for_update(skip_locked=True)
+                .filter(status='PENDING').order_by('created_at')[:batch]
+            )
+            if not jobs:
+                return total
+            apply([ArenaResult(str(job.operator_id), job.won, job.npc) for job in jobs])
+            SettlementJob.objects.filter(id__in=[job.id for job in jobs]).update(
+                status='DONE', settled_at=timezone.now()
+            )
+        total += len(jobs)
+        if len(jobs) < batch:
+            return total
+
+
+# ============================================================================
+# Apply
+# ============================================================================
+
+def apply(results: list[ArenaResult]) -> None:
+    """Settle `results` (in order) in one transaction."""
+    if not results:
+        return
+    from codex.models import Operator
+    from battle.models import Mail, OperatorArenaProgress
+
+    by_operator = defaultdict(list)
+    for result in results:
+        by_operator[str(result.operator_id)].append(result)
+
+    with transaction.atomic():
+        progress = {
+            str(row.operator_id): row
+            for row in OperatorArenaProgress.objects.select_for_update()
+            .filter(operator_id__in=by_operator)
+            .only('operator_id', 'current_rank', 'defeated_npcs')
+        }
+        created = OperatorArenaProgress.objects.bulk_create([
+            OperatorArenaProgress(operator_id=operator_id, current_rank='E')
+            for operator_id in by_operator if operator_id not in progress
+        ])
+        progress.update({str(row.operator_id): row for row in created})
+
+        # Counters: one UPDATE per distinct change
+        groups = defaultdict(list)
+        for operator_id, operator_results in by_operator.items():
+            groups[_counter_change([r.won for r in operator_results])].append(operator_id)
+        for change, operator_ids in groups.items():
+            OperatorArenaProgress.objects.filter(operator_id__in=operator_ids).update(
+                **_counter_updates(*change)
+            )
+
+        # Defeated NPCs and rank unlocks
+        changed = []
+        for operator_id, operator_results in by_operator.items():
+            row = progress[operator_id]
+            if any([_record_defeat(row, r.npc) for r in operator_results if r.won]):
+                changed.append(row)
+        if changed:
+            OperatorArenaProgress.objects.bulk_update(changed, ['defeated_npcs', 'current_rank'])
+
+        # Bits: one UPDATE per distinct amount
+        bits = defaultdict(list)
+        for operator_id, operator_results in by_operator.items():
+            amount = sum(r.npc['reward_bits'] for r in operator_results if r.won)
+            if amount:
+                bits[amount].append(operator_id)
+        for amount, operator_ids in bits.items():
+            Operator.objects.filter(id__in=operator_ids).update(bits=F('bits') + amount)
+
+        Mail.objects.bulk_create([_mail(r) for r in results])
+
+
+def _counter_change(outcomes: list[bool]) -> tuple:
+    """
+    An operator's outcomes, in order, as (wins, losses, leading wins,
+    longest win run after the first loss, trailing wins); None for the
+    last two when there was no loss.
+    """
+    wins = sum(outcomes)
+    losses = len(outcomes) - wins
+    if not losses:
+        return wins, 0, wins, None, None
+
+    leading = outcomes.index(False)
+    run = longest = 0
+    for won in outcomes[leading:]:
+        run = run + 1 if won else 0
+        longest = max(longest, run)
+    return wins, losses, leading, longest, run
+
+
+def _counter_updates(wins, losses, leading, longest, trailing) -> dict:
+    updates = {
+        'arena_wins': F('arena_wins') + wins,
+        'arena_losses': F('arena_losses') + losses,
+    }
+    # The streak carried in extends through the leading wins
+    best = Greatest(F('best_win_streak'), F('current_win_streak') + leading)
+    if trailing is None:
+        updates['current_win_streak'] = F('current_win_streak') + wins
+    else:
+        updates['current_win_streak'] = Value(trailing)
+        best = Greatest(best, Value(longest))
+    updates['best_win_streak'] = best
+    return updates
+
+
+def _record_defeat(row, npc: dict) -> bool:
+    """Add `npc` to the defeated list and apply its rank unlock. True if `row` changed."""
+    changed = False
+    if npc['id'] not in row.defeated_npcs:
+        row.defeated_npcs.append(npc['id'])
+        changed = True
+
+    unlocks = npc.get('unlocks_rank')
+    if npc.get('is_gate_boss') and unlocks:
+        if RANK_ORDER.get(unlocks, 0) > RANK_ORDER.get(row.current_rank, 0):
+            row.current_rank = unlocks
+            changed = True
+    return changed
+
+
+def _mail(result: ArenaResult):
+    from battle.models import Mail
+
+    npc = result.npc
+    if result.won:
+        return Mail(
+            operator_id=result.operator_id,
+            sender_name=npc['call_sign'],
+            mail_type='OPERATOR',
+            subject=npc['win_mail_subject'],
+            body=npc['win_mail_body'],
+            attachments={'bits': npc['reward_bits'], 'exp': npc['reward_exp']},
+        )
+    return Mail(
+        operator_id=result.operator_id,
+        sender_name=npc['call_sign'],
+        mail_type='OPERATOR',
+        subject=npc['lose_mail_subject'],
+        body=npc['lose_mail_body'],
+    )
@@ -0,0 +1,362 @@
+# battle/services/simulator.py
+"""
+Headless Monte Carlo battle simulator.
+
+Plays complete battles between two teams entirely in the battle kernel — no
+database, no sockets — with the npc_ai policy driving both sides, and fans
+the runs out across a ProcessPoolExecutor. Used for balance work: win rates,
+battle length and damage distributions for a matchup.
+
+Teams use the kernel team shape (see battle_kernel). Load them with
+load_team(), which accepts:
+
+    operator:<operator id>    top 3 active cores in the operator's garage
+    npc:<npc id|call sign>    an arena NPCOperator roster
+    json:<path>               an ad-hoc team file (see load_json_team)
+
+Team loading needs Django; playing battles does not, so worker processes
+only import the kernel and npc_ai.
+"""
+import json
+import os
+import random
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from battle.services import battle_kernel, npc_ai
+from battle.services.battle_kernel import SIDES
+from battle.services.battle_rng import BattleRng
+
+
+DEFAULT_MAX_TURNS = 200
+MAX_CORES_PER_TEAM = 3
+CHUNK_SIZE = 250
+
+
+# ============================================================================
+# Team loading
+# ============================================================================
+
+def load_team(spec: str) -> dict:
+    """
+    Load a kernel team dict from a team spec string.
+
+    Raises:
+        ValueError: If the spec is malformed or the team cannot be found
+    """
+    kind, _, ref = spec.partition(':')
+    if not ref:
+        if spec.endswith('.json'):
+            return load_json_team(spec)
+        raise ValueError(f"Invalid team spec '{spec}' (expected operator:<id>, npc:<id|call_sign> or json:<path>)")
+
+    if kind == 'operator':
+        return load_operator_team(ref)
+    if kind == 'npc':
+        return load_npc_team(ref)
+    if kind == 'json':
+        return load_json_team(ref)
+    raise ValueError(f"Unknown team source '{kind}'")
+
+
+def load_operator_team(operator_id: str) -> dict:
+    """The operator's battle team: same core selection as create_battle_from_npc."""
+    from django.core.exceptions import ValidationError
+    from codex.models import Operator, Core
+    from battle.services.battle_engine import build_core_state
+
+    try:
+        operator = Operator.objects.get(id=operator_id)
+    except (Operator.DoesNotExist, ValidationError):
+        raise ValueError(f"Operator '{operator_id}' not found")
+
+    cores = (
+        Core.objects.filter(garage__operator=operator, decommed=False)
+        .select_related('battle_info')
+        .prefetch_related('coreequippedmove_set')
+        .order_by('created_at')[:MAX_CORES_PER_TEAM]
+    )
+    team = _team(operator.call_sign, [build_core_state(core, i) for i, core in enumerate(cores)])
+    if not team['cores']:
+        raise ValueError(f"Operator '{operator.call_sign}' has no active cores")
+    return team
+
+
+def load_npc_team(ref: str) -> dict:
+    """An arena NPC roster, looked up by id or call sign."""
+    from django.core.exceptions import ValidationError
+    from battle.models import NPCOperator
+    from battle.services.battle_engine import build_npc_team_state
+
+    try:
+        npc = NPCOperator.objects.get(id=ref)
+    except (NPCOperator.DoesNotExist, ValidationError):
+        npc = NPCOperator.objects.filter(call_sign__iexact=ref).first()
+    if npc is None:
+        raise ValueError(f"NPC '{ref}' not found")
+
+    team = build_npc_team_state(npc)
+    team['name'] = npc.call_sign
+    return team
+
+
+def load_json_team(path: str) -> dict:
+    """
+    Load an ad-hoc team from a JSON file:
+
+        {
+            "name": "Test Team",
+            "cores": [
+                {
+                    "name": "Brick", "core_type": "Tank", "lvl": 1,
+                    "stats": {"hp": 120, "physical": 10, "energy": 5,
+                              "defense": 12, "shield": 8, "speed": 4},
+                    "moves": ["Basic Strike", "Guard Stance"]
+                }
+            ]
+        }
+
+    Moves may be Move names (resolved against the move catalog) or full move
+    dicts with name, dmg_type, dmg, accuracy, resource_cost and type.
+    """
+    from codex.services import move_catalog
+    from battle.services.loadout import move_record
+
+    with open(path) as f:
+        data = json.load(f)
+
+    raw_cores = data.get('cores', [])[:MAX_CORES_PER_TEAM]
+    if not raw_cores:
+        raise ValueError(f"Team file '{path}' has no cores")
+
+    names = {m for core in raw_cores for m in core.get('moves', []) if isinstance(m, str)}
+    moves = {move.name: move for move in move_catalog.all_moves() if move.name in names}
+    missing = names - set(moves)
+    if missing:
+        raise ValueError(f"Unknown moves in '{path}': {', '.join(sorted(missing))}")
+
+    cores = []
+    for i, raw in enumerate(raw_cores):
+        stats = raw['stats']
+        equipped = []
+        for slot, move in enumerate(raw.get('moves', []), start=1):
+            if isinstance(move, str):
+                equipped.append(move_record(moves[move], slot))
+            else:
+                equipped.append({
+                    'id': move.get('id', f'json-{i}-{slot}'),
+                    'slot': slot,
+                    'core_type_identity': '',
+                    **move,
+                })
+        cores.append({
+            'id': raw.get('id', f'json-{i}'),
+            'name': raw.get('name', f'Core {i + 1}'),
+            'core_type': raw.get('core_type', ''),
+            'lvl': raw.get('lvl', 1),
+            'max_hp': stats['hp'],
+            'stats': stats,
+            'equipped_moves': equipped,
+        })
+
+    return _team(data.get('name', os.path.basename(path)), cores)
+
+
+def _team(name: str, cores: list[dict]) -> dict:
+    return {
+        'name': name,
+        'energy_pool': 0,
+        'physical_pool': 0,
+        'active_core_index': 0,
+        'cores': cores,
+    }
+
+
+# ============================================================================
+# Playing battles
+# ============================================================================
+
+def play_battle(team_a: dict, team_b: dict, rng=random,
+                max_turns: int = DEFAULT_MAX_TURNS) -> dict:
+    """
+    Play one battle to completion, following the live battle flow: a free
+    resource round on turn 1, then each turn ticks effects, both sides act
+    (team_a first, as the player does), knocked-out cores are replaced and
+    defeat is checked. Battles still running at max_turns are draws.
+
+    Returns:
+        {'winner': 'player'|'npc'|None, 'turns': int,
+         'hits': {side: [damage, ...]}}
+    """
+    state = battle_kernel.new_battle_state(team_a, team_b)
+    hits = {side: [] for side in SIDES}
+
+    state['current_turn'] = 1
+    for side in SIDES:
+        state = _gain_resource(state, side, rng)
+
+    winner = None
+    while winner is None and state['current_turn'] < max_turns:
+        state['current_turn'] += 1
+        state, _ = battle_kernel.tick_effects(state)
+
+        for side in SIDES:
+            state = _take_turn(state, side, rng, hits[side])
+
+        state = _replace_knocked_out(state)
+        winner = _winner(state)
+
+    return {'winner': winner, 'turns': state['current_turn'], 'hits': hits}
+
+
+def _gain_resource(state: dict, side: str, rng) -> dict:
+    state, rolls = battle_kernel.roll_dice(state, side, rng)
+    state, _ = battle_kernel.allocate_dice(state, side, npc_ai.allocate_npc_dice(None, rolls))
+    return state
+
+
+def _take_turn(state: dict, side: str, rng, hits: list) -> dict:
+    action = npc_ai.choose_action(state['teams'][side], rng)
+    if action['action_type'] == 'gain_resource':
+        return _gain_resource(state, side, rng)
+
+    state, result = battle_kernel.apply_action(state, side, action, rng)
+    if result.get('damage_dealt') and not result.get('confused_self_hit'):
+        hits.append(result['damage_dealt'])
+    return state
+
+
+def _replace_knocked_out(state: dict) -> dict:
+    for side in SIDES:
+        team = state['teams'][side]
+        active = battle_kernel.get_active_core(team)
+        if active and active.get('is_knocked_out'):
+            new_idx = npc_ai.find_alive_core(team['cores'], exclude_idx=team['active_core_index'])
+            if new_idx is not None:
+                state, _ = battle_kernel.resolve_switch(state, side, new_idx)
+    return state
+
+
+def _winner(state: dict) -> Optional[str]:
+    # Same order as the consumer: the player losing is checked first
+    if battle_kernel.is_team_defeated(state, 'player'):
+        return 'npc'
+    if battle_kernel.is_team_defeated(state, 'npc'):
+        return 'player'
+    return None
+
+
+def _run_chunk(team_a: dict, team_b: dict, seeds: range, max_turns: int) -> dict:
+    """Worker entry point: play one battle per seed and pre-aggregate."""
+    outcomes = []
+    hit_counts = {side: Counter() for side in SIDES}
+    for seed in seeds:
+        result = play_battle(team_a, team_b, BattleRng(seed), max_turns)
+        outcomes.append((
+            result['winner'],
+            result['turns'],
+            sum(result['hits']['player']),
+            sum(result['hits']['npc']),
+        ))
+        for side in SIDES:
+            hit_counts[side].update(result['hits'][side])
+    return {'outcomes': outcomes, 'hits': hit_counts}
+
+
+# ============================================================================
+# Running simulations
+# ============================================================================
+
+def simulate(team_a: dict, team_b: dict, battles: int = 1000,
+             workers: Optional[int] = None, seed: Optional[int] = None,
+             max_turns: int = DEFAULT_MAX_TURNS) -> dict:
+    """
+    Simulate `battles` battles of team_a (player side) vs team_b (NPC side).
+
+    Battle i draws from BattleRng(seed + i) — the same stream type live
+    battles use — so results are reproducible for a given seed regardless
+    of the worker count. workers=1 runs in-process.
+
+    Returns:
+        Summary dict with wins, win rates, turn stats and damage distributions.
+    """
+    if battles < 1:
+        raise ValueError("battles must be at least 1")
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    workers = workers or os.cpu_count() or 1
+
+    chunks = [
+        range(seed + start, seed + min(start + CHUNK_SIZE, battles))
+        for start in range(0, battles, CHUNK_SIZE)
+    ]
+
+    if workers == 1 or len(chunks) == 1:
+        results = [_run_chunk(team_a, team_b, seeds, max_turns) for seeds in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            futures = [
+                pool.submit(_run_chunk, team_a, team_b, seeds, max_turns)
+                for seeds in chunks
+            ]
+            results = [future.result() for future in futures]
+
+    return _summarize(team_a, team_b, results, seed)
+
+
+def _summarize(team_a: dict, team_b: dict, results: list[dict], seed: int) -> dict:
+    outcomes = [o for chunk in results for o in chunk['outcomes']]
+    hits = {side: Counter() for side in SIDES}
+    for chunk in results:
+        for side in SIDES:
+            hits[side].update(chunk['hits'][side])
+
+    total = len(outcomes)
+    wins = Counter(winner for winner, _, _, _ in outcomes)
+
+    return {
+        'battles': total,
+        'seed': seed,
+        'teams': {'a': team_a.get('name', 'Team A'), 'b': team_b.get('name', 'Team B')},
+        'wins': {'a': wins['player'], 'b': wins['npc'], 'draw': wins[None]},
+        'win_rate': {
+            'a': wins['player'] / total,
+            'b': wins['npc'] / total,
+            'draw': wins[None] / total,
+        },
+        'turns': _distribution(Counter(turns for _, turns, _, _ in outcomes)),
+        'damage_per_hit': {
+            'a': _distribution(hits['player']),
+            'b': _distribution(hits['npc']),
+        },
+        'damage_per_battle': {
+            'a': _distribution(Counter(dmg for _, _, dmg, _ in outcomes)),
+            'b': _distribution(Counter(dmg for _, _, _, dmg in outcomes)),
+        },
+    }
+
+
+def _distribution(counts: Counter) -> dict:
+    """Summary stats from a value -> count histogram."""
+    n = sum(counts.values())
+    if not n:
+        return {'count': 0, 'mean': 0, 'min': 0, 'p10': 0, 'p50': 0, 'p90': 0, 'max': 0}
+
+    values = sorted(counts)
+    marks = {'p10': 0.10, 'p50': 0.50, 'p90': 0.90}
+    found = {}
+    seen = 0
+    for value in values:
+        seen += counts[value]
+        for key, q in marks.items():
+            if key not in found and seen >= q * n:
+                found[key] = value
+
+    return {
+        'count': n,
+        'mean': round(sum(v * c for v, c in counts.items()) / n, 2),
+        'min': values[0],
+        **found,
+        'max': values[-1],
+    }
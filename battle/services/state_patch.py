@@ -0,0 +1,94 @@
+# battle/services/state_patch.py
+"""
+JSON-patch style diffs between two battle state views.
+
+diff() returns RFC 6902 operations (replace / add / remove) that turn `old`
+into `new`. Dicts are diffed key by key and lists index by index; a list
+that only grew at the end becomes `add .../-` ops and one that only lost
+items becomes `remove` ops (highest index first), which is how status
+effects coming and going show up. Anything else is a whole-value replace.
+
+apply() is the reference implementation of the client side.
+"""
+import copy
+
+
+def diff(old, new, path: str = '') -> list[dict]:
+    """Patch operations that turn `old` into `new`."""
+    if old == new:
+        return []
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key, value in new.items():
+            child = f'{path}/{_escape(key)}'
+            if key not in old:
+                ops.append({'op': 'add', 'path': child, 'value': value})
+            else:
+                ops.extend(diff(old[key], value, child))
+        for key in old:
+            if key not in new:
+                ops.append({'op': 'remove', 'path': f'{path}/{_escape(key)}'})
+        return ops
+
+    if isinstance(old, list) and isinstance(new, list):
+        if len(old) == len(new):
+            ops = []
+            for i, (a, b) in enumerate(zip(old, new)):
+                ops.extend(diff(a, b, f'{path}/{i}'))
+            return ops
+        if len(new) > len(old) and new[:len(old)] == old:
+            return [{'op': 'add', 'path': f'{path}/-', 'value': v} for v in new[len(old):]]
+        removed = _removed_indices(old, new)
+        if removed is not None:
+            return [{'op': 'remove', 'path': f'{path}/{i}'} for i in reversed(removed)]
+
+    return [{'op': 'replace', 'path': path, 'value': new}]
+
+
+def _removed_indices(old: list, new: list):
+    """Indices to drop from `old` to get `new`, if `new` is a subsequence of it."""
+    removed = []
+    j = 0
+    for i, item in enumerate(old):
+        if j < len(new) and new[j] == item:
+            j += 1
+        else:
+            removed.append(i)
+    return removed if j == len(new) else None
+
+
+def _escape(key) -> str:
+    return str(key).replace('~', '~0').replace('/', '~1')
+
+
+def apply(doc, ops: list[dict]):
+    """Apply patch operations to a copy of `doc` and return it."""
+    doc = copy.deepcopy(doc)
+    for op in ops:
+        parts = [p.replace('~1', '/').replace('~0', '~') for p in op['path'].split('/')[1:]]
+        if not parts:
+            doc = copy.deepcopy(op.get('value'))
+            continue
+
+        parent = doc
+        for part in parts[:-1]:
+            parent = parent[int(part)] if isinstance(parent, list) else parent[part]
+        last = parts[-1]
+
+        if isinstance(parent, list):
+            if op['op'] == 'add':
+                if last == '-':
+                    parent.append(copy.deepcopy(op['value']))
+                else:
+                    parent.insert(int(last), copy.deepcopy(op['value']))
+            elif op['op'] == 'remove':
+                del parent[int(last)]
+            else:
+                parent[int(last)] = copy.deepcopy(op['value'])
+        else:
+            if op['op'] == 'remove':
+                del parent[last]
+            else:
+                parent[last] = copy.deepcopy(op['value'])
+    return doc
@@ -123,14 +123,14 @@ def check_stun(effects_list: list) -> bool:
     return any(e['effect_type'] == 'stun' for e in effects_list)
 
 
-def check_confusion(effects_list: list) -> bool:
+def check_confusion(effects_list: list, rng=random) -> bool:
     """
     Check if confusion causes self-hit this turn.
     Returns True if the core hits itself.
     """
     for effect in effects_list:
         if effect['effect_type'] == 'confusion':
-            return random.random() < effect.get('value', 0.3)
+            return rng.random() < effect.get('value', 0.3)
     return False
 
 
@@ -0,0 +1,395 @@
+# battle/services/turn_log.py
+"""
+Per-turn battle history.
+
+A TurnLog buffers everything that happens in a turn — actions, dice rolls
+and allocations — as unsaved BattleTurn / BattleAction / DiceRoll instances
+while the turn plays out in memory. When the battle moves on to the next
+turn (or ends) the turn is closed, and the session's next flush writes all
+closed turns with one bulk_create per table.
+
+The turn rows double as the battle's journal. state_after holds a compact
+delta of the fields that changed during the turn (pools, active core,
+pending dice / KO switch flags, HP, KO flags, status effects, last dice
+rolls, RNG cursor). state_before holds a full snapshot of those fields on
+every JOURNAL_SNAPSHOT_INTERVAL-th turn and on the first turn a session
+opens, and is empty otherwise. Every session flush writes the turn in
+progress too (a checkpoint), in the same transaction as the battle rows,
+so replay() of the journal from the last snapshot always lands on the
+state the rows were committed with (see battle/services/recovery.py).
+
+BattleTurn.acting_team points at a BattleTeam, which only the player has in
+PVE, so each turn is recorded against it and every action/roll carries the
+side that made it. NPC cores have no BattleCoreState; their rows keep the
+kernel core id instead.
+"""
+import copy
+from typing import Callable, Iterable, Optional
+
+from django.conf import settings
+
+from battle.constants import JOURNAL_SNAPSHOT_INTERVAL
+from battle.models import Battle, BattleTurn, BattleAction, DiceRoll, NPCBattleTeam
+
+
+# Result fields kept on BattleAction.details when set
+DETAIL_KEYS = (
+    'stab', 'effect_applied', 'effect_message', 'dodged_by',
+    'stunned', 'confused_self_hit', 'heal_amount',
+    'new_active_core', 'old_active_core',
+)
+
+ACTION_TYPES = {
+    'move': 'MOVE',
+    'switch': 'SWITCH',
+    'gain_resource': 'GAIN_RESOURCE',
+    'pass': 'PASS',
+}
+
+
+class TurnLog:
+    """Buffers one battle's turn history until the session flushes it."""
+
+    def __init__(self, battle: Battle):
+        self.battle = battle
+        self._turn: Optional[BattleTurn] = None
+        self._turn_is_new = True
+        self._baseline: Optional[dict] = None
+        self._actions: list[BattleAction] = []
+        self._dice: list[DiceRoll] = []
+        self._sequence = 0
+        self._closed: list[tuple[BattleTurn, bool, list, list]] = []
+
+    # ------------------------------------------------------------------
+    # Turn boundaries
+    # ------------------------------------------------------------------
+
+    def sync(self, snapshot: Callable[[Battle], dict]) -> None:
+        """
+        Make sure the open turn is the battle's current turn. If the battle
+        has moved on, close the previous turn first. `snapshot` returns the
+        kernel state and is only called at turn boundaries.
+        """
+        turn_number = self.battle.current_turn
+        if self._turn is not None and self._turn.turn_number == turn_number:
+            return
+
+        state = snapshot(self.battle)
+        if self._turn is not None:
+            self._close(state)
+        self._open(turn_number, state)
+
+    def close(self, snapshot: Callable[[Battle], dict]) -> None:
+        """Close the open turn (battle over)."""
+        if self._turn is not None:
+            self._close(snapshot(self.battle))
+
+    def _open(self, turn_number: int, state: dict) -> None:
+        team = _player_team(self.battle)
+        existing = None
+        if not self._closed and self._baseline is None:
+            # First turn this session: the turn may have been started (and
+            # partially written) by an earlier session for this battle.
+            existing = BattleTurn.objects.filter(
+                battle=self.battle, turn_number=turn_number, acting_team=team
+            ).first()
+
+        first_this_session = not self._closed and self._baseline is None
+        baseline = mutable_state(state, self.battle)
+
+        if existing:
+            self._turn = existing
+            self._turn_is_new = False
+            self._sequence = existing.actions.count()
+        else:
+            self._turn = BattleTurn(battle=self.battle, turn_number=turn_number, acting_team=team)
+            self._turn_is_new = True
+            self._sequence = 0
+            interval = getattr(settings, 'JOURNAL_SNAPSHOT_INTERVAL', JOURNAL_SNAPSHOT_INTERVAL)
+            if first_this_session or turn_number % interval == 1:
+                self._turn.state_before = baseline
+
+        self._baseline = baseline
+        self._actions = []
+        self._dice = []
+
+    def _close(self, state: dict) -> None:
+        after = mutable_state(state, self.battle)
+        delta = _delta(self._baseline, after)
+        self._turn.state_after = _merge(self._turn.state_after, delta)
+
+        self._closed.append((self._turn, self._turn_is_new, self._actions, self._dice))
+        self._baseline = after
+        self._turn = None
+
+    # ------------------------------------------------------------------
+    # Events
+    # ------------------------------------------------------------------
+
+    def record_action(self, side: str, action: dict, result: dict) -> None:
+        action_type = result.get('action_type') or action.get('action_type', 'pass')
+        row = BattleAction(
+            turn=self._turn,
+            action_type=ACTION_TYPES.get(action_type, 'PASS'),
+            side=side,
+            sequence=self._sequence,
+            damage_dealt=result.get('damage_dealt', 0),
+            accuracy_check=result.get('accuracy_check') if action_type == 'move' else None,
+            was_critical=result.get('was_critical', False),
+            details={k: result[k] for k in DETAIL_KEYS if result.get(k)},
+        )
+        self._sequence += 1
+
+        if action_type == 'move':
+            self._fill_move(row, side, action, result)
+        elif action_type == 'switch' and result.get('success'):
+            new_index = action.get('new_core_index')
+            row.details['new_core_index'] = new_index
+            if side == 'player':
+                row.target_core = _core_state(self.battle, new_index)
+
+        self._actions.append(row)
+
+    def _fill_move(self, row: BattleAction, side: str, action: dict, result: dict) -> None:
+        move = action.get('move') or {}
+        row.move_id = move.get('id')
+
+        if not result.get('stunned'):
+            if move.get('dmg_type') == 'ENERGY':
+                row.energy_cost = move.get('resource_cost', 0)
+            else:
+                row.physical_cost = move.get('resource_cost', 0)
+
+        player_active = _core_state(self.battle, _player_team(self.battle).active_core_index)
+        npc_active = _npc_active_core_id(self.battle)
+        if side == 'player':
+            row.source_core = player_active
+            if result.get('confused_self_hit'):
+                row.target_core = player_active
+            else:
+                row.details['target_npc_core'] = npc_active
+        else:
+            row.details['source_npc_core'] = npc_active
+            if not result.get('confused_self_hit'):
+                row.target_core = player_active
+
+    def record_dice(self, side: str, rolls: list[dict]) -> None:
+        for roll in rolls:
+            self._dice.append(DiceRoll(
+                turn=self._turn,
+                side=side,
+                core_state=_core_state_by_core_id(self.battle, roll['core_id']) if side == 'player' else None,
+                core_ref=str(roll['core_id']),
+                roll_value=roll['roll_value'],
+            ))
+
+    def record_allocation(self, side: str, allocations: list[dict]) -> None:
+        pools = {str(a['core_id']): a['pool'].upper() for a in allocations}
+        for roll in self._dice:
+            if roll.side == side and not roll.allocated_to and roll.core_ref in pools:
+                roll.allocated_to = pools.pop(roll.core_ref)
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def has_pending(self) -> bool:
+        """Closed turns, or events of the open turn, not written yet."""
+        return bool(self._closed or self._actions or self._dice) or (
+            self._turn is not None and self._turn_is_new
+        )
+
+    def write(self, snapshot: Optional[Callable[[Battle], dict]] = None) -> None:
+        """
+        Write closed turns: one bulk_create per table. Given a `snapshot`,
+        the in-progress turn is checkpointed and written too; later events
+        (and a later session resuming the battle) append to that row.
+        """
+        batches = list(self._closed)
+        if snapshot is not None and self._turn is not None:
+            after = mutable_state(snapshot(self.battle), self.battle)
+            self._turn.state_after = _merge(self._turn.state_after, _delta(self._baseline, after))
+            self._baseline = after
+            batches.append((self._turn, self._turn_is_new, self._actions, self._dice))
+        if not batches:
+            return
+
+        new_turns = [turn for turn, is_new, _, _ in batches if is_new]
+        resumed_turns = [turn for turn, is_new, _, _ in batches if not is_new]
+        actions = [row for _, _, rows, _ in batches for row in rows]
+        dice = [row for _, _, _, rows in batches for row in rows]
+
+        if new_turns:
+            BattleTurn.objects.bulk_create(new_turns)
+        if resumed_turns:
+            BattleTurn.objects.bulk_update(resumed_turns, ['state_after'])
+        if actions:
+            BattleAction.objects.bulk_create(actions)
+        if dice:
+            DiceRoll.objects.bulk_create(dice)
+
+        self._closed = []
+        if snapshot is not None and self._turn is not None:
+            # The open turn's row now exists; later events append to it
+            self._turn_is_new = False
+            self._actions = []
+            self._dice = []
+
+
+# ============================================================================
+# Helpers
+# ============================================================================
+
+def _player_team(battle: Battle):
+    teams = list(battle.teams.all())
+    return teams[0] if teams else None
+
+
+def _core_state(battle: Battle, position: int):
+    team = _player_team(battle)
+    if not team:
+        return None
+    for state in team.core_states.all():
+        if state.position == position:
+            return state
+    return None
+
+
+def _core_state_by_core_id(battle: Battle, core_id):
+    team = _player_team(battle)
+    if not team:
+        return None
+    for state in team.core_states.all():
+        if str(state.core_id) == str(core_id):
+            return state
+    return None
+
+
+def _npc_team(battle: Battle):
+    try:
+        return battle.npc_team
+    except NPCBattleTeam.DoesNotExist:
+        return None
+
+
+def _npc_active_core_id(battle: Battle) -> Optional[str]:
+    npc_team = _npc_team(battle)
+    if npc_team is None:
+        return None
+    for state in npc_team.core_states.all():
+        if state.position == npc_team.active_core_index:
+            return state.core_ref
+    return None
+
+
+TEAM_KEYS = ('energy_pool', 'physical_pool', 'active_core_index', 'dice_pending', 'ko_switch_pending')
+
+
+def mutable_state(state: dict, battle: Battle) -> dict:
+    """The parts of kernel state (plus the pending flags) that change during a battle."""
+    rows = {'player': _player_team(battle), 'npc': _npc_team(battle)}
+    return {
+        'rng_cursor': battle.rng_cursor,
+        'teams': {
+            side: {
+                'energy_pool': team.get('energy_pool', 0),
+                'physical_pool': team.get('physical_pool', 0),
+                'active_core_index': team.get('active_core_index', 0),
+                'dice_pending': getattr(rows[side], 'dice_pending', False),
+                'ko_switch_pending': getattr(rows[side], 'ko_switch_pending', False),
+                'cores': [
+                    {
+                        'current_hp': core['current_hp'],
+                        'is_knocked_out': core.get('is_knocked_out', False),
+                        'status_effects': core.get('status_effects', []),
+                        'last_dice_roll': core.get('last_dice_roll'),
+                    }
+                    for core in team.get('cores', [])
+                ],
+            }
+            for side, team in state['teams'].items() if team
+        },
+    }
+
+
+def replay(turns: Iterable[BattleTurn]) -> Optional[tuple[int, dict]]:
+    """
+    Rebuild the latest mutable state from journaled turns (in turn order):
+    start at the last turn carrying a state_before snapshot and apply its
+    and every later turn's state_after delta. Returns (last turn number,
+    state), or None when no turn has a snapshot.
+    """
+    turns = list(turns)
+    start = next((i for i in range(len(turns) - 1, -1, -1) if turns[i].state_before), None)
+    if start is None:
+        return None
+
+    state = copy.deepcopy(turns[start].state_before)
+    for turn in turns[start:]:
+        state = apply_delta(state, turn.state_after or {})
+    return turns[-1].turn_number, state
+
+
+def apply_delta(state: dict, delta: dict) -> dict:
+    """Inverse of _delta: `state` with a turn's changes applied."""
+    state = copy.deepcopy(state)
+    if 'rng_cursor' in delta:
+        state['rng_cursor'] = delta['rng_cursor']
+
+    for side, changes in delta.items():
+        if side == 'rng_cursor':
+            continue
+        team = state['teams'].setdefault(side, {'cores': []})
+        for key, value in changes.items():
+            if key != 'cores':
+                team[key] = value
+        for index, core_changes in changes.get('cores', {}).items():
+            cores = team['cores']
+            while len(cores) <= int(index):
+                cores.append({})
+            cores[int(index)].update(core_changes)
+    return state
+
+
+def _delta(before: dict, after: dict) -> dict:
+    """
+    Fields of `after` that differ from `before`:
+
+        {'rng_cursor': 42,
+         'player': {'energy_pool': 3, 'cores': {'0': {'current_hp': 51}}},
+         'npc': {'active_core_index': 1}}
+    """
+    delta = {}
+    if after['rng_cursor'] != before['rng_cursor']:
+        delta['rng_cursor'] = after['rng_cursor']
+
+    for side, team in after['teams'].items():
+        old = before['teams'].get(side, {})
+        changes = {
+            key: team[key]
+            for key in TEAM_KEYS
+            if team[key] != old.get(key)
+        }
+        old_cores = old.get('cores', [])
+        core_changes = {}
+        for i, core in enumerate(team['cores']):
+            old_core = old_cores[i] if i < len(old_cores) else {}
+            changed = {k: v for k, v in core.items() if v != old_core.get(k)}
+            if changed:
+                core_changes[str(i)] = changed
+        if core_changes:
+            changes['cores'] = core_changes
+        if changes:
+            delta[side] = changes
+    return delta
+
+
+def _merge(old: dict, new: dict) -> dict:
+    """Combine two consecutive deltas of the same turn."""
+    merged = dict(old or {})
+    for key, value in new.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
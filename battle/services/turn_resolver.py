@@ -0,0 +1,355 @@
+# battle/services/turn_resolver.py
+"""
+Whole-turn resolution for the battle consumer.
+
+Each entry point runs everything one client message triggers — validation,
+the player's action, the NPC's decision and action, KO replacement, the
+defeat check, battle settlement or the start of the next turn — in one
+synchronous call inside one transaction.atomic(), and writes the session's
+changes back (BattleSession.flush()) before the transaction commits. The
+consumer crosses the database_sync_to_async boundary once per message.
+
+The outcome is a TurnResult: the messages for the client in send order,
+each paired with the battle view (serialize_battle_view()) as it stood
+right after that message, so the consumer can still attach a state patch
+to every message without going back to the database.
+"""
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Optional
+
+from django.db import transaction
+
+from battle.models import Battle
+from battle.services import battle_engine, battle_session, loadout, npc_ai, reaper, settlement
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TurnResult:
+    """
+    Client messages produced by one call, in send order. The view is None
+    for replies that carry no state (errors, rejections).
+    """
+    events: list[tuple[dict, Optional[dict]]] = field(default_factory=list)
+    # The call failed and its session was dropped: the battle's sockets
+    # must reconnect to load the committed state
+    reload: bool = False
+
+
+class _Turn:
+    """Collects a TurnResult for a battle."""
+
+    def __init__(self, battle: Battle):
+        self.battle = battle
+        self.result = TurnResult()
+
+    def emit(self, message: dict) -> None:
+        """Game message; the client gets the state change up to here with it."""
+        self.result.events.append((message, battle_engine.serialize_battle_view(self.battle)))
+
+    def reply(self, message: dict) -> None:
+        """Message without state (error, rejection)."""
+        self.result.events.append((message, None))
+
+
+@contextmanager
+def _resolving(battle: Battle):
+    """
+    One transaction per call; the session is flushed before it commits.
+    If the reaper abandoned the battle while the call ran, the flush finds
+    the row no longer ACTIVE, nothing is written (no settlement either) and
+    the call's messages are replaced by a rejection.
+
+    Any other error rolls the transaction back, but the cached rows and
+    the turn journal still hold the half-applied turn: the session is
+    dropped unwritten and the messages are replaced by an error asking the
+    battle's sockets to reload.
+    """
+    turn = _Turn(battle)
+    reaper.touch(battle)
+    try:
+        with transaction.atomic():
+            yield turn
+            session = battle_session.get_session(battle.id)
+            if session is not None and session.battle is battle:
+                session.flush()
+    except battle_session.SessionConflict:
+        battle_session.abandon_session(battle.id)
+        # Same list the entry point returned; its messages described state that was not kept
+        turn.result.events[:] = [({'type': 'error', 'message': 'Battle not active'}, None)]
+    except Exception:
+        logger.exception('Turn failed for battle %s; dropping its session', battle.id)
+        battle_session.discard_session(battle.id)
+        turn.result.events[:] = [({'type': 'error', 'message': 'Turn failed, reloading battle'}, None)]
+        turn.result.reload = True
+
+
+# ============================================================================
+# Entry points
+# ============================================================================
+
+def resolve_turn(battle: Battle, action_type: str, action_data: dict) -> TurnResult:
+    """
+    Player action message. Runs the player's action and, unless it was
+    gain_resource (which waits for the player's dice allocation), the rest
+    of the turn.
+    """
+    with _resolving(battle) as turn:
+        if battle.status != 'ACTIVE':
+            turn.reply({'type': 'error', 'message': 'Battle not active'})
+            return turn.result
+
+        is_valid, error = battle_engine.validate_action(battle, 'player', action_type, action_data)
+        if not is_valid:
+            turn.reply({'type': 'action_rejected', 'reason': error})
+            return turn.result
+
+        player_result = _execute(battle, 'player', action_type, action_data)
+
+        if action_type == 'gain_resource':
+            # Roll now, resolve once the player has allocated the dice
+            turn.emit({'type': 'resource_dice', 'player_dice': player_result['rolls']})
+        else:
+            _finish_turn(turn, player_result)
+    return turn.result
+
+
+def resolve_allocation(battle: Battle, allocations: list[dict]) -> TurnResult:
+    """
+    Dice allocation message.
+
+    Turn 1 (free resource round): apply both teams' dice, start turn 2.
+    Turn 2+ (gain_resource action): apply the player's dice, finish the turn.
+    Rejected unless the player has rolled dice waiting, so a repeated
+    allocation cannot add the roll twice or give the NPC another action.
+    """
+    with _resolving(battle) as turn:
+        if battle.status != 'ACTIVE':
+            turn.reply({'type': 'error', 'message': 'Battle not active'})
+            return turn.result
+
+        player_team = battle_engine._get_player_team(battle)
+        if not player_team or not player_team.dice_pending:
+            turn.reply({'type': 'action_rejected', 'reason': 'No dice to allocate'})
+            return turn.result
+
+        player_pools = battle_engine.allocate_dice(battle, 'player', allocations)
+
+        if battle.current_turn == 1:
+            npc_rolls = battle_engine.pending_dice(battle, 'npc')
+            npc_allocations = npc_ai.allocate_npc_dice(battle, npc_rolls)
+            npc_pools = battle_engine.allocate_dice(battle, 'npc', npc_allocations)
+
+            turn.emit({
+                'type': 'dice_allocated',
+                'player_pools': player_pools,
+                'enemy_pools': npc_pools,
+            })
+            _start_turn(turn)
+        else:
+            _finish_turn(turn, {
+                'action_type': 'gain_resource',
+                'success': True,
+                'pools': player_pools,
+            })
+    return turn.result
+
+
+def resolve_ko_switch(battle: Battle, new_core_index) -> TurnResult:
+    """KO switch choice message: bring in the chosen core and start the next turn."""
+    with _resolving(battle) as turn:
+        if battle.status != 'ACTIVE':
+            turn.reply({'type': 'error', 'message': 'Battle not active'})
+            return turn.result
+
+        player_team = battle_engine._get_player_team(battle)
+        if not player_team or not player_team.ko_switch_pending:
+            turn.reply({'type': 'error', 'message': 'No pending KO switch'})
+            return turn.result
+
+        available_cores = alive_cores(battle)
+        if new_core_index not in [c['index'] for c in available_cores]:
+            turn.emit({
+                'type': 'ko_switch_prompt',
+                'available_cores': available_cores,
+                'error': 'Invalid core selection. Choose an alive, non-active core.',
+            })
+            return turn.result
+
+        battle_engine.execute_switch(battle, 'player', new_core_index)
+        player_team.ko_switch_pending = False
+
+        turn.emit({
+            'type': 'forced_switch',
+            'team': 'player',
+            'new_core_index': new_core_index,
+        })
+        _start_turn(turn)
+    return turn.result
+
+
+def start_turn(battle: Battle) -> TurnResult:
+    """Start the next turn (the first one on battle_init)."""
+    with _resolving(battle) as turn:
+        _start_turn(turn)
+    return turn.result
+
+
+def alive_cores(battle: Battle) -> list[dict]:
+    """Alive, non-active player cores: the choices of a KO switch prompt."""
+    team = battle_engine._get_player_team(battle)
+    if not team:
+        return []
+    records = loadout.get_loadout(battle)['player']
+    return [
+        {
+            'index': state.position,
+            'name': records[state.position]['name'],
+            'current_hp': state.current_hp,
+            'max_hp': state.max_hp,
+        }
+        for state in battle_engine._get_core_states(team)
+        if not state.is_knocked_out and state.position != team.active_core_index
+    ]
+
+
+# ============================================================================
+# Turn steps
+# ============================================================================
+
+def _execute(battle: Battle, team_side: str, action_type: str, action_data: dict) -> dict:
+    if action_type == 'move':
+        return battle_engine.execute_move(battle, team_side, action_data)
+    elif action_type == 'switch':
+        return battle_engine.execute_switch(battle, team_side, action_data.get('new_core_index', 0))
+    elif action_type == 'gain_resource':
+        return battle_engine.execute_gain_resource(battle, team_side)
+    else:
+        return battle_engine.execute_pass(battle, team_side)
+
+
+def _finish_turn(turn: _Turn, player_result: dict) -> None:
+    """NPC action, KO replacement, defeat check, then settlement or the next turn."""
+    battle = turn.battle
+
+    npc_action = npc_ai.choose_npc_action(battle)
+    npc_result = _execute(battle, 'npc', npc_action['action_type'], npc_action)
+
+    waiting_for_player = _handle_ko_switches(turn)
+
+    player_defeated = battle_engine.check_team_defeated(battle, 'player')
+    npc_defeated = battle_engine.check_team_defeated(battle, 'npc')
+    if player_defeated or npc_defeated:
+        _end_battle(turn, 'npc' if player_defeated else 'player')
+        return
+
+    turn.emit({
+        'type': 'action_result',
+        'player_action': player_result,
+        'enemy_action': npc_result,
+    })
+
+    # A KO switch prompt holds the next turn until the player chooses
+    if not waiting_for_player:
+        _start_turn(turn)
+
+
+def _start_turn(turn: _Turn) -> None:
+    """Turn 1 is a free resource round; turn 2+ is action-based."""
+    battle = turn.battle
+    if battle.status != 'ACTIVE':
+        return
+
+    battle.current_turn += 1
+
+    if battle.current_turn > 1:
+        effect_events = battle_engine.process_turn_effects(battle)
+        if effect_events:
+            turn.emit({'type': 'effect_tick', 'events': effect_events})
+
+    if battle.current_turn == 1:
+        player_dice = battle_engine.roll_dice_for_team(battle, 'player')
+        npc_dice = battle_engine.roll_dice_for_team(battle, 'npc')
+        turn.emit({
+            'type': 'turn_start',
+            'turn_number': battle.current_turn,
+            'is_free_resource_turn': True,
+            'player_dice': player_dice,
+            'enemy_dice': npc_dice,
+        })
+    else:
+        turn.emit({
+            'type': 'turn_start',
+            'turn_number': battle.current_turn,
+            'is_free_resource_turn': False,
+        })
+
+
+def _handle_ko_switches(turn: _Turn) -> bool:
+    """
+    Replace KO'd active cores. Returns True if the player has to choose
+    the replacement (more than one core left).
+    """
+    battle = turn.battle
+    waiting_for_player = False
+
+    player_team = battle_engine._get_player_team(battle)
+    if player_team:
+        active_state = battle_engine._get_core_state(player_team, player_team.active_core_index)
+        if active_state and active_state.is_knocked_out:
+            available_cores = alive_cores(battle)
+            if len(available_cores) >= 2:
+                player_team.ko_switch_pending = True
+                turn.emit({
+                    'type': 'ko_switch_prompt',
+                    'available_cores': available_cores,
+                })
+                waiting_for_player = True
+            elif len(available_cores) == 1:
+                alive_idx = available_cores[0]['index']
+                battle_engine.execute_switch(battle, 'player', alive_idx)
+                turn.emit({
+                    'type': 'forced_switch',
+                    'team': 'player',
+                    'new_core_index': alive_idx,
+                })
+
+    # The NPC always switches automatically
+    npc_team = battle_engine._get_npc_team(battle)
+    if npc_team:
+        active_state = battle_engine._get_core_state(npc_team, npc_team.active_core_index)
+        if active_state and active_state.is_knocked_out:
+            alive_idx = next(
+                (
+                    state.position for state in battle_engine._get_core_states(npc_team)
+                    if not state.is_knocked_out and state.position != npc_team.active_core_index
+                ),
+                None,
+            )
+            if alive_idx is not None:
+                battle_engine.execute_switch(battle, 'npc', alive_idx)
+                turn.emit({
+                    'type': 'forced_switch',
+                    'team': 'enemy',
+                    'new_core_index': alive_idx,
+                })
+
+    return waiting_for_player
+
+
+def _end_battle(turn: _Turn, winner_side: str) -> None:
+    battle = turn.battle
+    result = battle_engine.end_battle(battle, winner_side)
+
+    # Progress, bits and mail are applied once this transaction commits
+    settlement.enqueue(battle, winner_side == 'player')
+
+    turn.emit({
+        'type': 'battle_end',
+        'result': 'win' if winner_side == 'player' else 'lose',
+        'rewards': result.get('rewards', {}),
+    })
@@ -1,3 +1,908 @@
-from django.test import TestCase
+import asyncio
+import itertools
+import json
+import random
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.exceptions import ChannelFull
+from channels.testing import WebsocketCommunicator
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from battle import consumers, routing
+from battle.constants import NPC_AI_TARGET_MS
+from battle.models import Battle, BattleTeam, BattleTurn, NPCOperator, OperatorArenaProgress, SettlementJob
+from battle.services import (
+    affinity, batch_damage, battle_actor, battle_engine, battle_kernel, battle_session, engine_pool,
+    event_buffer, npc_ai, npc_search, recovery, reaper, settlement, simulator, state_patch, turn_resolver,
+)
+from battle.services.battle_engine import load_state
+from battle.services.battle_rng import BattleRng, battle_stream
+from battle.services.turn_log import mutable_state, replay
+from codex.models import Operator, Core
+from codex.services.core_factory import generate_core, CoreGenRequest
+from codex.services.move_factory import equip_move_to_core, MoveEquipRequest
+from config.channel_layers import SQLiteChannelLayer
+
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+# ============================================================================
+# Kernel
+# ============================================================================
+
+class KernelParityTests(SimpleTestCase):
+    """The kernel's damage formula draws and rounds exactly like the pre-kernel engine."""
+
+    # (attacker, defender, move, level, attacker type, move type identity)
+    CASES = [
+        ({'physical': 14, 'energy': 9}, {'defense': 11, 'shield': 7},
+         {'dmg': 40, 'dmg_type': 'PHYSICAL', 'accuracy': 0.9}, 5, '', ''),
+        ({'physical': 8, 'energy': 16}, {'defense': 12, 'shield': 10},
+         {'dmg': 55, 'dmg_type': 'ENERGY', 'accuracy': 1.0}, 7, 'VOLT', 'VOLT'),
+        ({'physical': 20, 'energy': 5}, {'defense': 0, 'shield': 3},
+         {'dmg': 25, 'dmg_type': 'PHYSICAL', 'accuracy': 0.75}, 3, 'RUST', 'VOLT'),
+    ]
+
+    # battle_engine.calculate_damage before the kernel, under random.seed(seed)
+    EXPECTED = {
+        (1, 0): 60, (1, 1): 135, (1, 2): 58,
+        (7, 0): 53, (7, 1): 121, (7, 2): 52,
+        (42, 0): 52, (42, 1): 118, (42, 2): 51,
+    }
+
+    def test_damage_matches_old_engine(self):
+        for (seed, case), damage in self.EXPECTED.items():
+            with self.subTest(seed=seed, case=case):
+                result = battle_kernel.calculate_damage(*self.CASES[case], rng=random.Random(seed))
+                self.assertEqual(result['damage'], damage)
+                self.assertEqual(result['stab'], case == 1)
+
+    def test_miss_and_critical_match_old_engine(self):
+        miss = battle_kernel.calculate_damage(*self.CASES[2], rng=random.Random(0))
+        critical = battle_kernel.calculate_damage(*self.CASES[2], rng=random.Random(30))
+
+        self.assertEqual(miss, {'damage': 0, 'critical': False, 'hit': False, 'stab': False})
+        self.assertEqual(critical, {'damage': 80, 'critical': True, 'hit': True, 'stab': False})
+
+
+class ValidateActionTests(SimpleTestCase):
+    """validate_action says which side's team is missing."""
+
+    def test_missing_team_names_its_side(self):
+        for side, name in (('player', 'Player'), ('npc', 'NPC')):
+            with self.subTest(side=side):
+                self.assertEqual(
+                    battle_kernel.validate_action({'teams': {}}, side, 'pass', {}),
+                    (False, f'{name} team not found'),
+                )
+
+
+class BatchDamageParityTests(SimpleTestCase):
+    """calculate_damage_many draws from the same distributions as calculate_damage."""
+
+    N = 20000
+
+    def test_distributions_match_scalar_kernel(self):
+        rng = random.Random(3)
+        for i, (attacker, defender, move, level, attacker_type, identity) in enumerate(KernelParityTests.CASES):
+            move = {**move, 'core_type_identity': identity}
+            with self.subTest(case=i):
+                scalar = [
+                    battle_kernel.calculate_damage(attacker, defender, move, level, attacker_type, identity, rng=rng)
+                    for _ in range(self.N)
+                ]
+                batch = batch_damage.calculate_damage_many(
+                    [attacker] * self.N, [defender] * self.N, [move] * self.N, level,
+                    attacker_types=[attacker_type] * self.N, rng=3,
+                )
+
+                hits = [r['damage'] for r in scalar if r['hit'] and not r['critical']]
+                batch_hits = batch['damage'][batch['hit'] & ~batch['critical']]
+                self.assertAlmostEqual(batch['hit'].mean(), sum(r['hit'] for r in scalar) / self.N, delta=0.015)
+                self.assertAlmostEqual(batch['critical'].mean(), sum(r['critical'] for r in scalar) / self.N,
+                                       delta=0.01)
+                self.assertAlmostEqual(batch_hits.mean() / (sum(hits) / len(hits)), 1.0, delta=0.01)
+                self.assertEqual((batch_hits.min(), batch_hits.max()), (min(hits), max(hits)))
+                self.assertEqual(bool(batch['stab'].any()), any(r['stab'] for r in scalar))
+
+
+class BattleRngTests(SimpleTestCase):
+    """Draw n of a battle's stream depends only on (seed, n)."""
+
+    def draws(self, rng, n=50):
+        return [rng.random() for _ in range(n)]
+
+    def test_same_seed_same_stream(self):
+        self.assertEqual(self.draws(BattleRng(1234)), self.draws(BattleRng(1234)))
+        self.assertNotEqual(self.draws(BattleRng(1234)), self.draws(BattleRng(1235)))
+
+    def test_resumes_from_cursor(self):
+        stream = self.draws(BattleRng(99), 40)
+
+        rng = BattleRng(99, cursor=25)
+
+        self.assertEqual(self.draws(rng, 15), stream[25:])
+        self.assertEqual(rng.cursor, 40)
+
+    def test_helpers_consume_one_draw_each(self):
+        rng = BattleRng(7)
+        values = [rng.uniform(0.85, 1.0), rng.randint(1, 8), rng.choice('abc')]
+
+        self.assertEqual(rng.cursor, 3)
+        self.assertTrue(0.85 <= values[0] < 1.0)
+        self.assertIn(values[1], range(1, 9))
+        self.assertEqual(values, [
+            BattleRng(7, 0).uniform(0.85, 1.0), BattleRng(7, 1).randint(1, 8), BattleRng(7, 2).choice('abc'),
+        ])
+
+    def test_battle_stream_writes_cursor_back(self):
+        class Holder:
+            rng_seed, rng_cursor = 5, 10
+
+        holder = Holder()
+        with battle_stream(holder) as rng:
+            first = rng.random()
+            rng.random()
+
+        self.assertEqual(holder.rng_cursor, 12)
+        self.assertEqual(first, BattleRng(5, 10).random())
+
+
+# ============================================================================
+# Actor
+# ============================================================================
+
+class BattleActorTests(SimpleTestCase):
+    """The actor runs one command at a time and absorbs a socket's retries."""
+
+    def setUp(self):
+        self.turn = 1
+        self.addCleanup(battle_actor._actors.clear)
+
+    def attach(self):
+        return battle_actor.attach('actor-test', lambda: self.turn)
+
+    def test_retry_from_same_socket_is_coalesced(self):
+        actor = self.attach()
+        ran = []
+
+        async def run():
+            gate = asyncio.Event()
+
+            async def command():
+                ran.append(1)
+                await gate.wait()
+
+            key = battle_actor.command_key({'type': 'dice_allocation', 'turn_number': 1}, 'socket-a')
+            first = asyncio.ensure_future(actor.submit(key, 1, command))
+            retry = asyncio.ensure_future(actor.submit(key, 1, command))
+            await asyncio.sleep(0)
+            gate.set()
+            return await first, await retry
+
+        self.assertEqual(async_to_sync(run)(), (battle_actor.DONE, battle_actor.COALESCED))
+        self.assertEqual(ran, [1])
+
+    def test_same_command_from_other_socket_runs(self):
+        actor = self.attach()
+        ran = []
+
+        async def command():
+            ran.append(1)
+
+        async def run():
+            content = {'type': 'battle_init'}
+            return await asyncio.gather(
+                actor.submit(battle_actor.command_key(content, 'socket-a'), None, command),
+                actor.submit(battle_actor.command_key(content, 'socket-b'), None, command),
+            )
+
+        self.assertEqual(async_to_sync(run)(), [battle_actor.DONE, battle_actor.DONE])
+        self.assertEqual(ran, [1, 1])
+
+    def test_command_for_past_turn_is_stale(self):
+        actor = self.attach()
+        ran = []
+
+        async def advance():
+            self.turn = 2
+
+        async def command():
+            ran.append(1)
+
+        async def run():
+            return await asyncio.gather(
+                actor.submit('advance', 1, advance),
+                actor.submit('late', 1, command),
+            )
+
+        self.assertEqual(async_to_sync(run)(), [battle_actor.DONE, battle_actor.STALE])
+        self.assertEqual(ran, [])
+
+    def test_draining_actor_is_reused(self):
+        async def noop():
+            pass
+
+        async def run():
+            actor = self.attach()
+            gate = asyncio.Event()
+            queued = asyncio.ensure_future(actor.submit('slow', None, gate.wait))
+            await asyncio.sleep(0)
+
+            # The last socket leaves with a command still running
+            battle_actor.detach('actor-test')
+            self.assertIs(battle_actor._actors.get('actor-test'), actor)
+
+            # One joining meanwhile gets the same actor and keeps it serving
+            self.assertIs(self.attach(), actor)
+            gate.set()
+            await queued
+            self.assertEqual(await actor.submit('next', None, noop), battle_actor.DONE)
+
+            battle_actor.detach('actor-test')
+            await actor._worker
+            self.assertNotIn('actor-test', battle_actor._actors)
+
+        async_to_sync(run)()
+
+
+# ============================================================================
+# Engine pool
+# ============================================================================
+
+class EnginePoolTests(SimpleTestCase):
+    """A saturated engine refuses turns instead of queueing them without bound."""
+
+    def test_full_queue_raises_engine_busy(self):
+        pool = engine_pool.EngineThreadPool(workers=1, max_queue=1)
+        self.addCleanup(pool._executor.shutdown)
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        async def run():
+            running = asyncio.ensure_future(pool.run(release.wait, 5))
+            queued = asyncio.ensure_future(pool.run(lambda: 'queued'))
+            await asyncio.sleep(0.05)
+            with self.assertRaises(engine_pool.EngineBusy):
+                await pool.run(lambda: 'refused')
+            busy = pool.metrics()
+            release.set()
+            return busy, await running, await queued
+
+        busy, running, queued = async_to_sync(run)()
+
+        self.assertEqual((busy['running'], busy['queued'], busy['refused']), (1, 1, 1))
+        self.assertEqual((running, queued), (True, 'queued'))
+        self.assertEqual(pool.metrics()['completed'], 2)
+
+    @override_settings(NPC_AI_MAX_DEPTH=2, NPC_AI_NODES_PER_RATING=10, NPC_AI_HEURISTIC_CHANCE={})
+    def test_search_profile_reads_settings(self):
+        self.assertEqual(npc_ai.search_profile(9), npc_ai.SearchProfile(depth=2, node_budget=90, heuristic_chance=0.0))
+
+
+# ============================================================================
+# Event buffer
+# ============================================================================
+
+class EventBufferTests(SimpleTestCase):
+    """A reconnecting socket catches up from the buffer, or learns that it cannot."""
+
+    def setUp(self):
+        self.buffer = event_buffer.EventBuffer(capacity=3)
+
+    def append(self, hp):
+        return self.buffer.append({'type': 'action_result'}, {'hp': hp})
+
+    def test_stamps_seq_version_and_patch(self):
+        first, second, same = self.append(10), self.append(7), self.append(7)
+
+        self.assertEqual((first['seq'], first['state_version']), (1, 0))
+        self.assertNotIn('state_patch', first)
+        self.assertEqual(second['state_patch'], [{'op': 'replace', 'path': '/hp', 'value': 7}])
+        self.assertEqual((second['state_version'], same['state_version']), (1, 1))
+        self.assertNotIn('state_patch', same)
+
+    def test_since_returns_buffered_messages(self):
+        messages = [self.append(hp) for hp in (10, 9, 8)]
+
+        self.assertEqual(self.buffer.since(1), messages[1:])
+        self.assertEqual(self.buffer.since(3), [])
+        self.assertEqual(self.buffer.since(0), messages)
+
+    def test_since_refuses_what_was_dropped_or_never_sent(self):
+        for hp in (10, 9, 8, 7):
+            self.append(hp)
+
+        self.assertIsNone(self.buffer.since(0))
+        self.assertEqual([m['seq'] for m in self.buffer.since(1)], [2, 3, 4])
+        self.assertIsNone(self.buffer.since(5))
+        self.assertIsNone(self.buffer.since('3'))
+
+    def test_rebase_keeps_history_and_syncs_a_silent_change(self):
+        self.append(10)
+        self.buffer.rebase({'hp': 10})
+        self.assertEqual(self.buffer.seq, 1)
+
+        self.buffer.rebase({'hp': 4})
+
+        sync = self.buffer.since(1)
+        self.assertEqual([m['type'] for m in self.buffer.since(0)], ['action_result', 'state_sync'])
+        self.assertEqual(sync[0]['state_patch'], [{'op': 'replace', 'path': '/hp', 'value': 4}])
+        self.assertEqual(self.buffer.view, {'hp': 4})
+
+
+# ============================================================================
+# Worker affinity
+# ============================================================================
+
+class HashRingTests(SimpleTestCase):
+    """Battles map to one worker each, and a joining worker takes only its share."""
+
+    KEYS = [f'{i:08x}-0000-0000-0000-000000000000' for i in range(2000)]
+
+    def test_empty_ring_owns_nothing(self):
+        self.assertIsNone(affinity.HashRing([]).node_for(self.KEYS[0]))
+
+    def test_joining_worker_takes_only_its_share(self):
+        two, three = affinity.HashRing(['w1', 'w2']), affinity.HashRing(['w1', 'w2', 'w3'])
+
+        moved = [key for key in self.KEYS if two.node_for(key) != three.node_for(key)]
+
+        self.assertEqual({three.node_for(key) for key in moved}, {'w3'})
+        self.assertAlmostEqual(len(moved) / len(self.KEYS), 1 / 3, delta=0.1)
+        self.assertEqual([two.node_for(key) for key in self.KEYS],
+                         [affinity.HashRing(['w2', 'w1']).node_for(key) for key in self.KEYS])
+
+
+class AffinityRoutingTests(SimpleTestCase):
+    """A socket for a battle another worker owns is redirected before any consumer runs."""
+
+    def setUp(self):
+        self.reached = []
+
+        async def inner(scope, receive, send):
+            self.reached.append(scope['path'])
+            await send({'type': 'websocket.close'})
+
+        self.app = routing.BattleAffinityMiddleware(inner)
+        ring = affinity.HashRing(['remote'])
+        patcher = mock.patch.multiple(affinity, _ring=ring, _urls={'remote': 'ws://10.0.0.9:8001/'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def connect(self, path):
+        async def run():
+            communicator = WebsocketCommunicator(self.app, path)
+            connected, _ = await communicator.connect()
+            received = []
+            while connected and (not received or received[-1]['type'] != 'websocket.close'):
+                received.append(await communicator.receive_output())
+            return received
+
+        return async_to_sync(run)()
+
+    def test_socket_for_remote_battle_is_redirected(self):
+        received = self.connect('/ws/battle/0a1b2c3d-0000-0000-0000-000000000000/')
+
+        self.assertEqual(received[0], {'type': 'websocket.send', 'text': json.dumps({
+            'type': 'worker_redirect', 'url': 'ws://10.0.0.9:8001/ws/battle/0a1b2c3d-0000-0000-0000-000000000000/',
+        })})
+        self.assertEqual(received[-1], {'type': 'websocket.close', 'code': consumers.REDIRECT_CLOSE_CODE})
+        self.assertEqual(self.reached, [])
+
+    def test_local_battle_reaches_the_consumer(self):
+        with mock.patch.object(affinity, '_ring', affinity.HashRing([affinity.WORKER_ID])):
+            self.connect('/ws/battle/0a1b2c3d-0000-0000-0000-000000000000/')
+
+        self.assertEqual(self.reached, ['/ws/battle/0a1b2c3d-0000-0000-0000-000000000000/'])
+
+
+# ============================================================================
+# Battles on the database
+# ============================================================================
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class BattleTestCase(TestCase):
+    """An NPC battle for a fresh operator with two equipped cores, held by a session."""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_moves', stdout=StringIO())
+        call_command('seed_arena_npcs', stdout=StringIO())
+
+    def setUp(self):
+        operator = Operator.objects.create(call_sign='TESTER')
+        for i in range(2):
+            generate_core(operator.garage, CoreGenRequest(
+                name=f'Test Core {i}', core_type='', rarity='Common', track='Attack', price=0,
+            ))
+        for core in Core.objects.filter(garage=operator.garage):
+            for slot, move in enumerate(core.moves_pool.all()[:4], start=1):
+                equip_move_to_core(MoveEquipRequest(core_id=str(core.id), move_id=str(move.id), slot=slot))
+
+        npc = NPCOperator.objects.order_by('-floor').first()
+        self.battle_id = str(battle_engine.create_battle_from_npc(str(operator.id), str(npc.id)).id)
+        self.session = battle_session.open_session(self.battle_id)
+        self.battle = self.session.battle
+        self.addCleanup(battle_session.close_session, self.battle_id)
+
+    def allocate(self, message):
+        return turn_resolver.resolve_allocation(self.battle, [
+            {'core_id': die['core_id'], 'pool': 'energy'} for die in message['player_dice']
+        ])
+
+    def start(self):
+        """Start turn 1 and bank the free resource round."""
+        result = turn_resolver.start_turn(self.battle)
+        return self.allocate(_message(result, 'turn_start'))
+
+    def play_turns(self, count):
+        """The player gains resources every turn; the NPC plays its policy."""
+        for _ in range(count):
+            result = turn_resolver.resolve_turn(self.battle, 'gain_resource', {})
+            self.allocate(_message(result, 'resource_dice'))
+
+
+def _message(result, message_type):
+    return next(message for message, _ in result.events if message['type'] == message_type)
+
+
+def _types(result):
+    return [message['type'] for message, _ in result.events]
+
+
+class EngineKernelParityTests(BattleTestCase):
+    """battle_engine's database adapters give exactly the kernel's result."""
+
+    def test_move_matches_kernel(self):
+        self.start()
+        team = self.session.player_team
+        team.energy_pool = team.physical_pool = 99
+        state = load_state(self.battle)
+        move = battle_kernel.get_active_core(state['teams']['player'])['equipped_moves'][0]
+        action = {'action_type': 'move', 'move_id': move['id']}
+
+        expected_state, expected = battle_kernel.apply_action(
+            battle_kernel.copy_state(state), 'player', action,
+            BattleRng(self.battle.rng_seed, self.battle.rng_cursor),
+        )
+        result = battle_engine.execute_move(self.battle, 'player', {'move_id': move['id']})
+
+        self.assertEqual(result, expected)
+        self.assertEqual(load_state(self.battle)['teams'], expected_state['teams'])
+
+    def test_dice_roll_matches_kernel(self):
+        self.start()
+        state = load_state(self.battle)
+
+        expected_state, expected = battle_kernel.roll_dice(
+            battle_kernel.copy_state(state), 'player',
+            BattleRng(self.battle.rng_seed, self.battle.rng_cursor),
+        )
+        rolls = battle_engine.roll_dice_for_team(self.battle, 'player')
+
+        self.assertEqual(rolls, expected)
+        self.assertEqual(load_state(self.battle)['teams'], expected_state['teams'])
+
+
+class TurnJournalTests(BattleTestCase):
+    """The BattleTurn journal replays to the state the rows hold."""
+
+    def test_replay_matches_persisted_state(self):
+        self.start()
+        self.play_turns(3)
+        self.session.flush()
+
+        turn_number, journal = replay(BattleTurn.objects.filter(battle_id=self.battle_id).order_by('turn_number', 'id'))
+
+        stored = Battle.objects.get(id=self.battle_id)
+        self.assertEqual(turn_number, stored.current_turn)
+        self.assertEqual(journal, mutable_state(load_state(stored), stored))
+        self.assertEqual(journal['rng_cursor'], stored.rng_cursor)
+
+    def test_recovery_restores_rows_from_journal(self):
+        self.start()
+        self.play_turns(2)
+        battle_session.close_session(self.battle_id)
+        pools = BattleTeam.objects.filter(battle_id=self.battle_id).values_list('energy_pool', 'physical_pool').get()
+
+        self.assertFalse(recovery.recover_battle(self.battle_id))
+        BattleTeam.objects.filter(battle_id=self.battle_id).update(energy_pool=999)
+
+        self.assertTrue(recovery.recover_battle(self.battle_id))
+        self.assertEqual(
+            BattleTeam.objects.filter(battle_id=self.battle_id).values_list('energy_pool', 'physical_pool').get(),
+            pools,
+        )
+
+    def test_open_waits_for_recovery_without_the_registry_lock(self):
+        self.start()
+        battle_session.close_session(self.battle_id)
+        order = []
+        opener = threading.Thread(target=battle_session.open_session, args=(self.battle_id,))
+        real_load, real_replay = battle_session.BattleSession.load, recovery.replay
+
+        def load(battle_id):
+            if threading.current_thread() is not opener:
+                return real_load(battle_id)
+            order.append('loaded')
+            return mock.Mock(refcount=0, _closing=None)
+
+        def replay(turns):
+            # Mid-recovery: the registry stays usable, this battle waits
+            self.assertTrue(battle_session._lock.acquire(blocking=False))
+            battle_session._lock.release()
+            opener.start()
+            opener.join(0.2)
+            self.assertTrue(opener.is_alive())
+            order.append('replayed')
+            return real_replay(turns)
+
+        with mock.patch.object(battle_session.BattleSession, 'load', side_effect=load), \
+                mock.patch.object(recovery, 'replay', side_effect=replay):
+            recovery.recover_battle(self.battle_id)
+            opener.join(5)
+
+        self.assertEqual(order, ['replayed', 'loaded'])
+
+    def test_recovery_skips_held_battles(self):
+        self.start()
+        BattleTeam.objects.filter(battle_id=self.battle_id).update(energy_pool=999)
+
+        self.assertFalse(recovery.recover_battle(self.battle_id))
+
+
+class NpcSearchBudgetTests(BattleTestCase):
+    """The node budget pays for every kernel resolution, so it bounds search time."""
+
+    def rich_state(self):
+        """Every move affordable on both sides: the widest tree a battle offers."""
+        self.start()
+        state = load_state(self.battle)
+        for team in state['teams'].values():
+            team['energy_pool'] = team['physical_pool'] = 99
+        return state
+
+    def test_chance_outcomes_are_charged(self):
+        state = self.rich_state()
+
+        # Depth 1 has no decision node below the root: only its outcomes cost
+        self.assertIsNone(npc_search.choose_action(state, 'npc', 1, node_budget=1))
+        self.assertIsNotNone(npc_search.choose_action(state, 'npc', 1, node_budget=100))
+
+    def test_top_rating_search_meets_time_target(self):
+        state = self.rich_state()
+        profile = npc_ai.search_profile(10)
+
+        spent = []
+        real_spend = npc_search._Search._spend_node
+        with mock.patch.object(npc_search._Search, '_spend_node', autospec=True,
+                               side_effect=lambda search: spent.append(1) or real_spend(search)):
+            npc_search.choose_action(state, 'npc', profile.depth, profile.node_budget)
+        self.assertGreater(len(spent), profile.node_budget)  # The whole budget was used
+
+        elapsed = []
+        for _ in range(3):
+            started = time.perf_counter()
+            npc_search.choose_action(state, 'npc', profile.depth, profile.node_budget)
+            elapsed.append((time.perf_counter() - started) * 1000)
+        self.assertLess(max(elapsed), NPC_AI_TARGET_MS)
+
+
+class SimulatorTests(TestCase):
+    """Simulated battles replay per seed, however they are spread over workers."""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_moves', stdout=StringIO())
+        call_command('seed_arena_npcs', stdout=StringIO())
+
+    def test_seed_reproduces_across_worker_counts(self):
+        npcs = NPCOperator.objects.order_by('floor')
+        team_a, team_b = (simulator.load_npc_team(str(npc.id)) for npc in (npcs.first(), npcs.last()))
+
+        with mock.patch.object(simulator, 'CHUNK_SIZE', 4):
+            in_process = simulator.simulate(team_a, team_b, battles=10, workers=1, seed=7, max_turns=60)
+            pooled = simulator.simulate(team_a, team_b, battles=10, workers=3, seed=7, max_turns=60)
+
+        self.assertGreater(in_process['damage_per_hit']['a']['count'], 0)
+        self.assertEqual(pooled, in_process)
+
+
+class StatePatchTests(BattleTestCase):
+    """state_patch.apply(old, diff(old, new)) gives back `new`."""
+
+    def assertRoundTrips(self, old, new):
+        self.assertEqual(state_patch.apply(old, state_patch.diff(old, new)), new)
+
+    def test_list_growth_and_shrinkage_use_add_and_remove(self):
+        old = {'effects': [{'t': 'stun'}, {'t': 'guard'}, {'t': 'regen'}]}
+        grown = {'effects': old['effects'] + [{'t': 'dodge'}]}
+        shrunk = {'effects': [{'t': 'stun'}, {'t': 'regen'}]}
+
+        self.assertEqual(state_patch.diff(old, grown), [{'op': 'add', 'path': '/effects/-', 'value': {'t': 'dodge'}}])
+        self.assertEqual(state_patch.diff(old, shrunk), [{'op': 'remove', 'path': '/effects/1'}])
+        self.assertRoundTrips(old, grown)
+        self.assertRoundTrips(old, shrunk)
+
+    def test_keys_are_escaped_added_and_removed(self):
+        old = {'a/b': 1, 'c~d': {'x': 1}, 'gone': True}
+        new = {'a/b': 2, 'c~d': {'x': 1, 'y': [1, 2]}, 'new': None}
+
+        self.assertRoundTrips(old, new)
+        self.assertRoundTrips([1, 2, 3], [3, 2])
+        self.assertRoundTrips({'a': 1}, [1])
+
+    def test_round_trips_through_a_battle(self):
+        view = battle_engine.serialize_battle_view(self.battle)
+        self.start()
+        for _ in range(4):
+            self.play_turns(1)
+            new = battle_engine.serialize_battle_view(self.battle)
+            self.assertNotEqual(new, view)
+            self.assertRoundTrips(view, new)
+            view = new
+
+
+class SettlementCounterTests(TestCase):
+    """A batch of results moves the arena counters as settling them one by one would."""
+
+    def setUp(self):
+        operator = Operator.objects.create(call_sign='SETTLER')
+        self.progress, _ = OperatorArenaProgress.objects.get_or_create(operator=operator)
+
+    @staticmethod
+    def one_by_one(outcomes, current, best):
+        for won in outcomes:
+            current = current + 1 if won else 0
+            best = max(best, current)
+        return current, best
+
+    def test_counter_change(self):
+        self.assertEqual(settlement._counter_change([True, True]), (2, 0, 2, None, None))
+        self.assertEqual(settlement._counter_change([True, False, True, True, False, True]), (4, 2, 1, 2, 1))
+        self.assertEqual(settlement._counter_change([False]), (0, 1, 0, 0, 0))
+
+    def test_batched_streaks_match_one_by_one(self):
+        for outcomes in itertools.chain.from_iterable(
+            itertools.product((True, False), repeat=n) for n in range(1, 6)
+        ):
+            for current, best in ((0, 0), (2, 5), (4, 4)):
+                with self.subTest(outcomes=outcomes, current=current, best=best):
+                    OperatorArenaProgress.objects.filter(pk=self.progress.pk).update(
+                        arena_wins=0, arena_losses=0, current_win_streak=current, best_win_streak=best,
+                    )
+                    OperatorArenaProgress.objects.filter(pk=self.progress.pk).update(
+                        **settlement._counter_updates(*settlement._counter_change(list(outcomes)))
+                    )
+
+                    row = OperatorArenaProgress.objects.get(pk=self.progress.pk)
+                    self.assertEqual(
+                        (row.arena_wins, row.arena_losses, row.current_win_streak, row.best_win_streak),
+                        (sum(outcomes), outcomes.count(False), *self.one_by_one(outcomes, current, best)),
+                    )
+
+
+class ResolveAllocationTests(BattleTestCase):
+    """Dice are allocated once per roll."""
+
+    def test_repeated_allocation_is_rejected(self):
+        first = self.start()
+        team = self.session.player_team
+        before = (team.energy_pool, team.physical_pool, self.battle.current_turn, self.battle.rng_cursor)
+
+        again = turn_resolver.resolve_allocation(self.battle, [])
+
+        self.assertIn('dice_allocated', _types(first))
+        self.assertEqual([message for message, _ in again.events],
+                         [{'type': 'action_rejected', 'reason': 'No dice to allocate'}])
+        self.assertEqual(before, (team.energy_pool, team.physical_pool, self.battle.current_turn, self.battle.rng_cursor))
+
+    def test_allocation_after_battle_ended_is_rejected(self):
+        self.battle.status = 'COMPLETED'
+
+        result = turn_resolver.resolve_allocation(self.battle, [])
+
+        self.assertEqual([message for message, _ in result.events],
+                         [{'type': 'error', 'message': 'Battle not active'}])
+
+
+class FailedTurnTests(BattleTestCase):
+    """A turn that raises part-way leaves nothing of itself behind."""
+
+    def committed(self):
+        team = BattleTeam.objects.get(battle_id=self.battle_id)
+        battle = Battle.objects.get(id=self.battle_id)
+        return (team.energy_pool, team.physical_pool, team.dice_pending,
+                battle.current_turn, battle.rng_cursor, BattleTurn.objects.filter(battle_id=self.battle_id).count())
+
+    def test_failure_mid_turn_drops_the_session_unwritten(self):
+        self.start()
+        dice = _message(turn_resolver.resolve_turn(self.battle, 'gain_resource', {}), 'resource_dice')
+        before = self.committed()
+
+        # The player's dice are banked in memory before the NPC's decision fails
+        with mock.patch.object(turn_resolver.npc_ai, 'choose_npc_action', side_effect=RuntimeError('boom')), \
+                self.assertLogs('battle.services.turn_resolver', 'ERROR'):
+            result = self.allocate(dice)
+
+        self.assertEqual([message for message, _ in result.events],
+                         [{'type': 'error', 'message': 'Turn failed, reloading battle'}])
+        self.assertTrue(result.reload)
+        self.assertIsNone(battle_session.get_session(self.battle_id))
+
+        # A late detach of the dropped session writes nothing
+        battle_session.close_session(self.battle_id, self.session)
+        self.assertEqual(self.committed(), before)
+
+        reopened = battle_session.open_session(self.battle_id)
+        self.assertEqual(reopened.player_team.energy_pool, before[0])
+        self.assertTrue(reopened.player_team.dice_pending)
+
+    def test_dropped_session_does_not_detach_its_replacement(self):
+        battle_session.discard_session(self.battle_id)
+        reopened = battle_session.open_session(self.battle_id)
+
+        battle_session.close_session(self.battle_id, self.session)
+
+        self.assertIs(battle_session.get_session(self.battle_id), reopened)
+        self.assertEqual(reopened.refcount, 1)
+
+
+class SessionCloseTests(BattleTestCase):
+    """A reconnect during the final flush waits for it rather than reading old rows."""
+
+    def test_open_waits_for_closing_flush(self):
+        order = []
+        flushing, release = threading.Event(), threading.Event()
+
+        def flush():
+            flushing.set()
+            release.wait(5)
+            order.append('flushed')
+
+        def load(battle_id):
+            order.append('loaded')
+            return mock.Mock(refcount=0, _closing=None)
+
+        closer = threading.Thread(target=battle_session.close_session, args=(self.battle_id,))
+        with mock.patch.object(self.session, 'flush', side_effect=flush), \
+                mock.patch.object(battle_session.BattleSession, 'load', side_effect=load):
+            closer.start()
+            self.assertTrue(flushing.wait(5))
+            self.assertIs(battle_session.get_session(self.battle_id), self.session)
+
+            opener = threading.Thread(target=battle_session.open_session, args=(self.battle_id,))
+            opener.start()
+            opener.join(0.2)
+            self.assertTrue(opener.is_alive())
+
+            release.set()
+            closer.join(5)
+            opener.join(5)
+
+        self.assertEqual(order, ['flushed', 'loaded'])
+        reopened = battle_session.get_session(self.battle_id)
+        self.assertIsNot(reopened, self.session)
+        self.assertEqual(reopened.refcount, 1)
+
+
+class ReaperTests(BattleTestCase):
+    """The reaper's ABANDONED wins over a command that was already in flight."""
+
+    def make_idle(self):
+        Battle.objects.filter(id=self.battle_id).update(idle_deadline=timezone.now() - timedelta(seconds=1))
+
+    def test_sweep_abandons_idle_battles_once(self):
+        battle_session.close_session(self.battle_id)
+        self.make_idle()
+
+        self.assertEqual(reaper.sweep(), [self.battle_id])
+        self.assertEqual(reaper.sweep(), [])
+        self.assertEqual(Battle.objects.get(id=self.battle_id).status, 'ABANDONED')
+        self.assertEqual(SettlementJob.objects.filter(battle_id=self.battle_id).count(), 1)
+
+    def test_in_flight_flush_does_not_revive_abandoned_battle(self):
+        turn_resolver.start_turn(self.battle)
+        self.make_idle()
+        self.assertEqual(reaper.sweep(), [self.battle_id])
+
+        # The session still thinks the battle is ACTIVE; its flush must lose
+        result = turn_resolver.resolve_allocation(self.battle, [])
+
+        self.assertEqual([message for message, _ in result.events],
+                         [{'type': 'error', 'message': 'Battle not active'}])
+        self.assertIsNone(battle_session.get_session(self.battle_id))
+        self.assertEqual(Battle.objects.get(id=self.battle_id).status, 'ABANDONED')
+
+    def test_active_battle_is_not_swept(self):
+        self.assertEqual(reaper.sweep(), [])
+
+    @override_settings(BATTLE_REAPER_BATCH=7)
+    def test_command_batch_defaults_to_setting(self):
+        with mock.patch.object(reaper, 'sweep', return_value=[]) as sweep:
+            call_command('reap_battles', stdout=StringIO())
+
+        sweep.assert_called_once_with(batch=7)
+
+
+# ============================================================================
+# Channel layer
+# ============================================================================
+
+class SQLiteChannelLayerTests(SimpleTestCase):
+    """Two layers on one file stand in for two server processes."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = f'{directory.name}/channels.sqlite3'
+
+    def layer(self, **config):
+        layer = SQLiteChannelLayer(path=self.path, **config)
+        self.addCleanup(async_to_sync(layer.close))
+        return layer
+
+    def test_send_and_receive_on_named_channel(self):
+        sender, receiver = self.layer(), self.layer()
+
+        async def run():
+            await sender.send('battle.reaper', {'type': 'sweep', 'n': 1})
+            await sender.send('battle.reaper', {'type': 'sweep', 'n': 2})
+            return [await receiver.receive('battle.reaper') for _ in range(2)]
+
+        self.assertEqual(async_to_sync(run)(), [{'type': 'sweep', 'n': 1}, {'type': 'sweep', 'n': 2}])
+
+    def test_process_specific_channel_round_trip(self):
+        sender, receiver = self.layer(), self.layer()
+
+        async def run():
+            channel = await receiver.new_channel()
+            await sender.send(channel, {'type': 'battle.state', 'seq': 3})
+            return await asyncio.wait_for(receiver.receive(channel), 5)
+
+        self.assertEqual(async_to_sync(run)(), {'type': 'battle.state', 'seq': 3})
+
+    def test_group_send_reaches_members_until_discarded(self):
+        first, second = self.layer(), self.layer()
+
+        async def run():
+            a, b = await first.new_channel(), await second.new_channel()
+            await first.group_add('battle_1', a)
+            await second.group_add('battle_1', b)
+            await first.group_send('battle_1', {'type': 'battle.abandoned'})
+            received = [
+                await asyncio.wait_for(first.receive(a), 5),
+                await asyncio.wait_for(second.receive(b), 5),
+            ]
+
+            await second.group_discard('battle_1', b)
+            await first.group_send('battle_1', {'type': 'battle.handoff'})
+            received.append(await asyncio.wait_for(first.receive(a), 5))
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(second.receive(b), 0.3)
+            return received
+
+        self.assertEqual(async_to_sync(run)(), [
+            {'type': 'battle.abandoned'}, {'type': 'battle.abandoned'}, {'type': 'battle.handoff'},
+        ])
+
+    def test_send_to_full_channel_raises(self):
+        layer = self.layer(capacity=2)
+
+        async def run():
+            await layer.send('battle.full', {'type': 'a'})
+            await layer.send('battle.full', {'type': 'b'})
+            await layer.send('battle.full', {'type': 'c'})
+
+        with self.assertRaises(ChannelFull):
+            async_to_sync(run)()
@@ -2,13 +2,14 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from .views import MailViewSet, ArenaViewSet
+from .views import MailViewSet, ArenaViewSet, EngineViewSet
 
 router = DefaultRouter()
 
 # Register ViewSets
 router.register(r'mail', MailViewSet, basename='mail')
 router.register(r'arena', ArenaViewSet, basename='arena')
+router.register(r'engine', EngineViewSet, basename='engine')
 
 # Future ViewSets:
 # router.register(r'battles', BattleViewSet, basename='battle')
@@ -11,7 +11,7 @@ from .serializers import (
     NPCOperatorListSerializer, NPCOperatorDetailSerializer,
     OperatorArenaProgressSerializer
 )
-from .services import battle_engine
+from .services import battle_engine, engine_pool, settlement
 
 
 class MailViewSet(viewsets.ModelViewSet):
@@ -83,7 +83,7 @@ class ArenaViewSet(viewsets.ReadOnlyModelViewSet):
     Supports listing by rank and viewing individual NPC details.
     """
     queryset = NPCOperator.objects.filter(is_active=True).prefetch_related(
-        'cores', 'cores__equipped_moves', 'cores__equipped_moves__move'
+        'cores', 'cores__equipped_moves'
     )
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ['arena_rank', 'is_gate_boss']
@@ -169,64 +169,16 @@ class ArenaViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Get or create arena progress
-        progress, _ = OperatorArenaProgress.objects.get_or_create(
-            operator=operator,
-            defaults={'current_rank': 'E'}
-        )
+        # Same settlement as a finished battle, applied now for the response
+        result = settlement.ArenaResult(str(operator.id), outcome == 'win', settlement.npc_snapshot(npc))
+        settlement.apply([result])
+        progress = OperatorArenaProgress.objects.get(operator=operator)
 
-        # Process outcome
         if outcome == 'win':
-            progress.arena_wins += 1
-            progress.current_win_streak += 1
-            progress.best_win_streak = max(
-                progress.best_win_streak,
-                progress.current_win_streak
-            )
-
-            # Add to defeated list if not already
-            if str(npc.id) not in progress.defeated_npcs:
-                progress.defeated_npcs.append(str(npc.id))
-
-            # Check if this unlocks next rank
-            if npc.is_gate_boss and npc.unlocks_rank:
-                rank_order = {'E': 0, 'D': 1, 'C': 2, 'B': 3, 'A': 4, 'S': 5}
-                if rank_order.get(npc.unlocks_rank, 0) > rank_order.get(progress.current_rank, 0):
-                    progress.current_rank = npc.unlocks_rank
-
-            # Award rewards
-            operator.bits += npc.reward_bits
-            operator.save(update_fields=['bits'])
-
-            # Send win mail
-            Mail.objects.create(
-                operator=operator,
-                sender_name=npc.call_sign,
-                mail_type='OPERATOR',
-                subject=npc.win_mail_subject,
-                body=npc.win_mail_body,
-                attachments={'bits': npc.reward_bits, 'exp': npc.reward_exp}
-            )
-
             message = f"Victory! Defeated {npc.call_sign}. Earned {npc.reward_bits} bits."
-
-        else:  # lose
-            progress.arena_losses += 1
-            progress.current_win_streak = 0
-
-            # Send lose mail
-            Mail.objects.create(
-                operator=operator,
-                sender_name=npc.call_sign,
-                mail_type='OPERATOR',
-                subject=npc.lose_mail_subject,
-                body=npc.lose_mail_body
-            )
-
+        else:
             message = f"Defeat. {npc.call_sign} was too strong this time."
 
-        progress.save()
-
         return Response({
             'message': message,
             'progress': OperatorArenaProgressSerializer(progress).data
@@ -261,3 +213,16 @@ class ArenaViewSet(viewsets.ReadOnlyModelViewSet):
                 {'error': str(e)},
                 status=status.HTTP_400_BAD_REQUEST
             )
+
+
+class EngineViewSet(viewsets.ViewSet):
+    """
+    Battle engine pool metrics for this process.
+    """
+
+    def list(self, request):
+        """
+        Queue depth and throughput per pool (engine threads, NPC search processes).
+        GET /battle/engine/
+        """
+        return Response(engine_pool.metrics())
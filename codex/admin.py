@@ -1,7 +1,7 @@
 from django.contrib import admin
 from .models import (
     Operator, Garage, Core, CoreBattleInfo, CoreUpgradeInfo,
-    Move, Equipment, ImageAsset, CoreEquippedMove, Scrapyard
+    Move, Equipment, ImageAsset, CoreEquippedMove, Scrapyard, MoveShopRotation
 )
 
 
@@ -16,6 +16,11 @@ class MoveAdmin(admin.ModelAdmin):
     search_fields = ('name', 'type', "core_type_identity",)
 
 
+class MoveShopRotationAdmin(admin.ModelAdmin):
+    list_display = ('period_start', 'version', 'updated_at',)
+    readonly_fields = ('digest',)
+
+
 admin.site.register(Operator, OperatorAdmin)
 admin.site.register(Garage)
 admin.site.register(Core)
@@ -26,3 +31,4 @@ admin.site.register(Equipment)
 admin.site.register(ImageAsset)
 admin.site.register(CoreEquippedMove)
 admin.site.register(Scrapyard)
+admin.site.register(MoveShopRotation, MoveShopRotationAdmin)
@@ -11,6 +11,9 @@ RARITY_PRICES = {
 
 RARITIES = ["Common", "Uncommon", "Rare", "Legendary", "Mythic"]
 
+# Most cores one multi-pull (POST /api/cores/generate-batch/) can roll
+MAX_MULTI_PULL = 10
+
 # Core type identities (used for move type restrictions and core generation)
 CORE_TYPES = [
     "Techno",
@@ -119,3 +122,17 @@ MOVE_NOUNS = [
     "Slash", "Crush", "Fury", "Storm", "Barrage", "Cannon",
     "Edge", "Fang", "Claw", "Impact", "Surge", "Flare"
 ]
+
+# Garage move-library responses are cached per garage and invalidated on
+# every library / equip / core / move write (codex/services/garage_library.py);
+# the timeout only bounds how long an entry can outlive a missed invalidation
+GARAGE_LIBRARY_CACHE_TIMEOUT = 600  # seconds
+
+# Longest a process keeps serving its move catalog after another process
+# edited a Move (codex/services/move_catalog.py)
+MOVE_CATALOG_CHECK_INTERVAL = 1.0  # seconds
+
+# Move shop rotation (codex/services/move_shop.py): every period offers a
+# fixed draw of purchasable moves; periods start on Mondays 00:00 UTC
+MOVE_SHOP_ROTATION_DAYS = 7
+MOVE_SHOP_ROTATION_SIZE = 12
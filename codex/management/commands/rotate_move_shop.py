@@ -0,0 +1,23 @@
+"""
+Management command to materialize the move shop's rotation snapshots
+(see codex/services/move_shop.py) for the current and the next period, so
+no request has to build one when a period starts. Run it from cron, e.g.
+daily.
+
+Usage: python manage.py rotate_move_shop
+"""
+from django.core.management.base import BaseCommand
+
+from codex.services import move_shop
+
+
+class Command(BaseCommand):
+    help = 'Materializes the move shop rotation for the current and next period'
+
+    def handle(self, *args, **options):
+        start = move_shop.period_start()
+        for period in (start, move_shop.period_end(start)):
+            shop = move_shop.regenerate(period)
+            self.stdout.write(self.style.SUCCESS(
+                f'Move shop {period:%Y-%m-%d}: v{shop["version"]}, {len(shop["moves"])} moves'
+            ))
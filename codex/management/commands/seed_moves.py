@@ -3,6 +3,7 @@ Django management command to seed the database with curated moves.
 Usage: python manage.py seed_moves
 """
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from codex.services.move_factory import create_move, MoveCreateRequest
 from codex.models import Move
 
@@ -10,6 +11,7 @@ from codex.models import Move
 class Command(BaseCommand):
     help = 'Seed the database with starter and curated moves'
 
+    @transaction.atomic  # One move shop regeneration for the whole run
     def handle(self, *args, **options):
         moves_to_create = [
             # ===== STARTER MOVES (Common rarity, is_starter=True, Generic - any Core can use) =====
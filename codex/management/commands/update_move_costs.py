@@ -11,6 +11,7 @@ Idempotent — safe to run multiple times.
 Usage: python manage.py update_move_costs
 """
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from codex.models import Move
 
 
@@ -87,6 +88,7 @@ def interpolate_cost(old_cost, old_range, new_range):
 class Command(BaseCommand):
     help = 'Rescale existing Move resource_cost values to new 3d8-balanced ranges'
 
+    @transaction.atomic  # One move shop regeneration for the whole run
     def handle(self, *args, **options):
         named_updated = 0
         named_skipped = 0
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('codex', '0006_move_is_signature_alter_move_core_type_identity_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MoveShopRotation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('period_start', models.DateTimeField(unique=True)),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('digest', models.CharField(max_length=64)),
+                ('moves', models.JSONField(blank=True, default=list)),
+            ],
+            options={
+                'ordering': ['-period_start'],
+            },
+        ),
+    ]
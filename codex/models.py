@@ -326,3 +326,21 @@ class Scrapyard(TimestampedModel):
 
     def __str__(self) -> str:
         return f"Scrapyard {self.id}"
+
+
+class MoveShopRotation(TimestampedModel):
+    """
+    The move shop's snapshot for one rotation period (codex/services/move_shop.py).
+    `version` goes up each time the snapshot is regenerated with different
+    contents during its period; updated_at is its Last-Modified.
+    """
+    period_start = models.DateTimeField(unique=True)
+    version = models.PositiveIntegerField(default=1)
+    digest = models.CharField(max_length=64)  # sha256 of `moves`
+    moves = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        ordering = ["-period_start"]
+
+    def __str__(self) -> str:
+        return f"Move shop {self.period_start:%Y-%m-%d} v{self.version}"
@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from codex.models import Core, CoreBattleInfo, CoreUpgradeInfo, CoreEquippedMove, Garage
-from codex.constants import RARITIES, CORE_TRACKS, RARITY_PRICES
-from codex.serializers.move import MoveListSerializer
+from codex.constants import RARITIES, CORE_TRACKS, RARITY_PRICES, MAX_MULTI_PULL
+from codex.serializers.move import CatalogMoveField
 
 
 class CoreBattleInfoSerializer(serializers.ModelSerializer):
@@ -17,7 +17,7 @@ class CoreUpgradeInfoSerializer(serializers.ModelSerializer):
 
 
 class CoreEquippedMoveSerializer(serializers.ModelSerializer):
-    move = MoveListSerializer(read_only=True)  # Nest move details
+    move = CatalogMoveField()  # Nest move details
 
     class Meta:
         model = CoreEquippedMove
@@ -86,3 +86,23 @@ class CoreGenerationRequestSerializer(serializers.Serializer):
         data['price'] = price
 
         return data
+
+
+class CoreBatchGenerationRequestSerializer(CoreGenerationRequestSerializer):
+    """Serializer for multi-pull core generation API request"""
+    count = serializers.IntegerField(min_value=1, max_value=MAX_MULTI_PULL, required=True)
+
+    def validate(self, data):
+        """
+        Resolve the garage and per-core price. Capacity and bits are checked
+        once for the whole pull by core_factory.generate_cores.
+        """
+        try:
+            garage = Garage.objects.get(id=data.get('garage_id'))
+        except Garage.DoesNotExist:
+            raise serializers.ValidationError({"garage_id": "Invalid garage ID"})
+
+        data['garage'] = garage
+        data['price'] = RARITY_PRICES[data.get('rarity')]
+
+        return data
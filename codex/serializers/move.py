@@ -5,6 +5,7 @@ Handles API serialization for Move model and related operations.
 from rest_framework import serializers
 from codex.models import Move
 from codex.constants import MOVE_FUNCTIONS, MOVE_DMG_TYPES, CORE_TYPES, RARITIES
+from codex.services import move_catalog
 
 
 class MoveSerializer(serializers.ModelSerializer):
@@ -23,13 +24,18 @@ class MoveSerializer(serializers.ModelSerializer):
 
     def get_image_url(self, obj):
         """Return image battle_image path if available"""
+        if isinstance(obj, move_catalog.MoveRecord):
+            return obj.image_url
         if obj.image and obj.image.battle_image:
             return obj.image.battle_image
         return None
 
 
 class MoveListSerializer(serializers.ModelSerializer):
-    """Lightweight serializer for list views and nested serialization"""
+    """
+    Lightweight serializer for list views and nested serialization.
+    Works on Move instances and on move catalog MoveRecords alike.
+    """
 
     class Meta:
         model = Move
@@ -39,6 +45,45 @@ class MoveListSerializer(serializers.ModelSerializer):
         ]
 
 
+def available_move_data(item: dict) -> dict:
+    """A move with its `availability`, for an entry of get_garage_available_moves()."""
+    move_data = MoveSerializer(item['move']).data
+    move_data['availability'] = {
+        'source': item['source'],
+        'can_equip': item.get('can_equip', False)
+    }
+
+    if item['source'] == 'garage_library':
+        move_data['availability'].update({
+            'copies_owned': item['copies_owned'],
+            'copies_equipped': item['copies_equipped'],
+            'copies_available': item['copies_available']
+        })
+    else:  # core_exclusive
+        move_data['availability'].update({
+            'is_starter': item.get('is_starter', False),
+            'is_signature': item.get('is_signature', False),
+            'is_equipped': item.get('is_equipped', False)
+        })
+
+    return move_data
+
+
+class CatalogMoveField(serializers.Field):
+    """
+    Nested move for rows with a `move` FK, read from the move catalog by
+    move_id so the Move table never has to be joined or prefetched.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = 'move_id'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, move_id):
+        return MoveListSerializer(move_catalog.get_move(move_id)).data
+
+
 class MoveCreateSerializer(serializers.Serializer):
     """Serializer for creating curated moves (admin/seed data)"""
     name = serializers.CharField(max_length=120)
@@ -107,6 +152,25 @@ class MoveEquipSerializer(serializers.Serializer):
         return value
 
 
+class CoreLoadoutSerializer(serializers.Serializer):
+    """Serializer for replacing a core's whole loadout"""
+    slots = serializers.DictField(child=serializers.UUIDField(allow_null=True))
+
+    def validate_slots(self, value):
+        """Slot keys as ints; null moves mean the slot is emptied"""
+        slots = {}
+        for slot, move_id in value.items():
+            try:
+                slot = int(slot)
+            except (TypeError, ValueError):
+                raise serializers.ValidationError(f"Invalid slot: {slot}")
+            if slot < 1:
+                raise serializers.ValidationError("Slot must be at least 1")
+            if move_id is not None:
+                slots[slot] = str(move_id)
+        return slots
+
+
 class MoveUnequipSerializer(serializers.Serializer):
     """Serializer for unequipping moves from cores"""
     slot = serializers.IntegerField(min_value=1)
@@ -2,7 +2,10 @@ import random
 from dataclasses import dataclass
 from typing import Any
 
-from codex.models import Core, CoreBattleInfo, CoreUpgradeInfo, Garage, Move
+from django.db import transaction
+from django.db.models import F
+
+from codex.models import Core, CoreBattleInfo, CoreUpgradeInfo, Garage, Move, Operator
 from codex.constants import CORE_TYPES, RARITIES, CORE_TRACKS, STAT_BOOST_MAP
 
 
@@ -19,6 +22,15 @@ class CoreGenRequest:
     price: int
 
 
+@dataclass(frozen=True)
+class CoreBatchGenRequest:
+    name: str  # Cores are named "<name> 1" .. "<name> N" (just <name> when count is 1)
+    rarity: str
+    track: str
+    count: int
+    price: int  # Per core
+
+
 def generate_core(garage: Garage, req: CoreGenRequest) -> Core:
     if not garage.has_capacity():
         raise ValueError("Garage has no capacity. Decommission or buy a bay.")
@@ -32,7 +44,78 @@ def generate_core(garage: Garage, req: CoreGenRequest) -> Core:
         price=req.price,
 
     )
+    _roll_battle_info(core, req.track).save()
+    _new_upgrade_info(core, req.track).save()
+
+    # Assign starter moves to new core's move pool
+    starter_moves = Move.objects.filter(is_starter=True)
+    if starter_moves.exists():
+        core.moves_pool.set(starter_moves)
+
+    return core
+
+
+def generate_cores(garage: Garage, req: CoreBatchGenRequest) -> list[Core]:
+    """
+    Roll `req.count` cores at once (multi-pull), all or nothing.
+
+    One locked read of the operator for the price check, one count for the
+    capacity check, then one bulk_create per table (Core, CoreBattleInfo,
+    CoreUpgradeInfo and the moves_pool through table) and one UPDATE for
+    the bits. Starter moves come from the in-process move catalog.
+
+    Returns:
+        list[Core]: The new cores, with battle_info and upgrade_info attached
 
+    Raises:
+        ValueError: If the operator cannot pay or the garage has no room
+    """
+    from codex.services import garage_library, move_catalog
+
+    total = req.price * req.count
+    with transaction.atomic():
+        operator = Operator.objects.select_for_update().only('id', 'bits').get(id=garage.operator_id)
+        if operator.bits < total:
+            raise ValueError(f"Insufficient credits. Need {total}, have {operator.bits}")
+
+        active = garage.cores.filter(decommed=False).count()
+        if active + req.count > garage.capacity:
+            raise ValueError(
+                f"Garage has room for {max(garage.capacity - active, 0)} more core(s), "
+                f"not {req.count}. Decommission or buy a bay."
+            )
+
+        cores = [
+            Core(
+                garage=garage,
+                name=req.name if req.count == 1 else f"{req.name} {number}",
+                type=random.choice(CORE_TYPES),
+                rarity=req.rarity,
+                lvl=1,
+                price=req.price,
+            )
+            for number in range(1, req.count + 1)
+        ]
+        Core.objects.bulk_create(cores)
+        CoreBattleInfo.objects.bulk_create([_roll_battle_info(core, req.track) for core in cores])
+        CoreUpgradeInfo.objects.bulk_create([_new_upgrade_info(core, req.track) for core in cores])
+
+        starter_ids = [move.id for move in move_catalog.all_moves() if move.is_starter]
+        if starter_ids:
+            Core.moves_pool.through.objects.bulk_create([
+                Core.moves_pool.through(core_id=core.id, move_id=move_id)
+                for core in cores for move_id in starter_ids
+            ])
+
+        Operator.objects.filter(id=operator.id).update(bits=F('bits') - total)
+        # bulk_create sends no post_save for the library cache to see
+        garage_library.invalidate(garage.id)
+
+    return cores
+
+
+def _roll_battle_info(core: Core, track: str) -> CoreBattleInfo:
+    """Unsaved battle stats for a new core."""
     # MVP stats (swap for rarity tables later)
     base_hp = random.randint(90, 130)
     base_physical = random.randint(8, 16)
@@ -42,7 +125,7 @@ def generate_core(garage: Garage, req: CoreGenRequest) -> Core:
     base_speed = random.randint(6, 14)
 
     # Apply track boosts to base stats
-    boosts = track_to_stat_boost(req.track)
+    boosts = track_to_stat_boost(track)
     base_hp += boosts.get("hp", 0)
     base_physical += boosts.get("physical", 0)
     base_energy += boosts.get("energy", 0)
@@ -50,7 +133,7 @@ def generate_core(garage: Garage, req: CoreGenRequest) -> Core:
     base_shield += boosts.get("shield", 0)
     base_speed += boosts.get("speed", 0)
 
-    CoreBattleInfo.objects.create(
+    return CoreBattleInfo(
         core=core,
         hp=base_hp,
         physical=base_physical,
@@ -61,19 +144,15 @@ def generate_core(garage: Garage, req: CoreGenRequest) -> Core:
         equip_slots=4,
     )
 
-    CoreUpgradeInfo.objects.create(
+
+def _new_upgrade_info(core: Core, track: str) -> CoreUpgradeInfo:
+    """Unsaved upgrade info for a new core."""
+    return CoreUpgradeInfo(
         core=core,
         exp=0,
         next_lvl=100,
         upgradeable=True,
         # Store as single-item list for consistency with model
-        tracks=[{"name": req.track}],
+        tracks=[{"name": track}],
         lvl_logs=[],
     )
-
-    # Assign starter moves to new core's move pool
-    starter_moves = Move.objects.filter(is_starter=True)
-    if starter_moves.exists():
-        core.moves_pool.set(starter_moves)
-
-    return core
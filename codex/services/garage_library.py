@@ -0,0 +1,118 @@
+"""
+Garage Move Library
+The move-library view of a garage: every move it owns with copy counts and
+the cores that have it equipped.
+
+Built set-based, in two queries whatever the library size:
+- the library entries with their moves and images joined, annotated with
+  how many of the garage's cores have each move equipped
+- the (move, core name) pairs of the garage's equipped moves
+
+(SQLite has no portable string/array aggregate in this Django version, so
+the core names are collected by the second query rather than aggregated
+into the first.)
+
+The result is cached per garage in Django's cache, which settings.CACHES
+shares between the server processes, so an invalidation in one process
+reaches all of them. post_save / post_delete on
+GarageMoveLibrary, CoreEquippedMove and Core, and on Move for every garage,
+invalidate it (codex/signals.py); the entry is dropped again when the
+writing transaction commits, so a read racing the write cannot keep the
+old rows cached. Bulk writes run inside batch(), which invalidates once and
+lets the per-row signals skip their own lookups.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+
+from codex.constants import GARAGE_LIBRARY_CACHE_TIMEOUT
+from codex.models import CoreEquippedMove, GarageMoveLibrary
+
+
+GENERATION_KEY = 'garage-move-library:generation'
+
+_batch_garage = ContextVar('garage_library_batch', default=None)
+
+
+def _key(garage_id) -> str:
+    # Move edits bump the generation, which retires every garage's entry at once
+    return f'garage-move-library:{cache.get(GENERATION_KEY, 0)}:{garage_id}'
+
+
+def get_move_library(garage) -> list[dict]:
+    """The garage's library entries (cached), as returned by GET move-library."""
+    key = _key(garage.id)
+    library = cache.get(key)
+    if library is None:
+        library = build_move_library(garage)
+        cache.set(key, library, GARAGE_LIBRARY_CACHE_TIMEOUT)
+    return library
+
+
+def build_move_library(garage) -> list[dict]:
+    """Uncached library entries for a garage."""
+    from codex.serializers.move import MoveSerializer
+
+    entries = (
+        GarageMoveLibrary.objects.filter(garage=garage)
+        .select_related('move__image')
+        .annotate(copies_equipped=Count(
+            'move__coreequippedmove',
+            filter=Q(move__coreequippedmove__core__garage=garage),
+        ))
+    )
+
+    equipped_by = defaultdict(list)
+    for move_id, core_name in (
+        CoreEquippedMove.objects.filter(core__garage=garage)
+        .order_by('core__name')
+        .values_list('move_id', 'core__name')
+    ):
+        equipped_by[move_id].append(core_name)
+
+    return [
+        {
+            "move": MoveSerializer(entry.move).data,
+            "copies_owned": entry.copies_owned,
+            "copies_equipped": entry.copies_equipped,
+            "copies_available": entry.copies_owned - entry.copies_equipped,
+            "equipped_by": equipped_by[entry.move_id],
+        }
+        for entry in entries
+    ]
+
+
+def invalidate(garage_id) -> None:
+    """Drop a garage's cached library now and again once the current transaction commits."""
+    if garage_id is None:
+        return
+    cache.delete(_key(garage_id))
+    transaction.on_commit(lambda: cache.delete(_key(garage_id)))
+
+
+@contextmanager
+def batch(garage_id):
+    """Bulk write to one garage: invalidate it once on success instead of per row."""
+    token = _batch_garage.set(garage_id)
+    try:
+        yield
+    finally:
+        _batch_garage.reset(token)
+    invalidate(garage_id)
+
+
+def in_batch() -> bool:
+    """True inside batch(); row signals leave the invalidation to it."""
+    return _batch_garage.get() is not None
+
+
+def invalidate_all() -> None:
+    """Retire every garage's cached library (a Move changed)."""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
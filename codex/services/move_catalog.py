@@ -0,0 +1,215 @@
+"""
+Move Catalog
+Process-wide, read-only view of every Move.
+
+Moves are admin-curated templates that almost never change, yet the shop,
+the equip flow, battle loadouts and serializers all read them. The catalog
+loads every Move once (one query, image joined) into immutable MoveRecords
+keyed by id, with the move's status effect from MOVE_EFFECT_MAP resolved
+up front so nothing downstream looks effects up by name.
+
+Freshness:
+- warm() is called at startup (config/asgi.py, config/wsgi.py)
+- post_save / post_delete on Move call invalidate() (codex/signals.py),
+  which drops the catalog and bumps a generation counter; the next read
+  reloads it
+- a load that raced with an invalidation is used for that read but not
+  kept, so a stale catalog is never installed after a write
+
+The catalog is per process, but its generation is shared: invalidate()
+also bumps a counter in Django's cache (shared between the server
+processes), now and again when the writing transaction commits. Reads
+compare it with the counter the catalog was loaded at, at most every
+MOVE_CATALOG_CHECK_INTERVAL seconds, and reload on a mismatch, so a Move
+edited through one process reaches the others within that interval. Ids
+the catalog has never seen are always fetched from the database.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+
+from battle.constants import MOVE_EFFECT_MAP
+from codex.constants import MOVE_CATALOG_CHECK_INTERVAL
+from codex.models import Move
+
+
+@dataclass(frozen=True)
+class MoveRecord:
+    """Immutable snapshot of a Move row plus its compiled status effect"""
+    id: str
+    name: str
+    description: str
+    type: str
+    dmg_type: str
+    dmg: int
+    accuracy: float
+    resource_cost: int
+    lvl_learned: int
+    core_type_identity: str
+    track_type: str
+    rarity: str
+    is_starter: bool
+    is_signature: bool
+    image_id: Optional[str]
+    image_url: Optional[str]
+    effect: Optional[Mapping]  # read-only MOVE_EFFECT_MAP entry, None for plain attacks
+
+
+def build_record(move: Move) -> MoveRecord:
+    """MoveRecord for a Move instance (image loaded or null)."""
+    effect = MOVE_EFFECT_MAP.get(move.name)
+    image = move.image if move.image_id else None
+    return MoveRecord(
+        id=str(move.id),
+        name=move.name,
+        description=move.description,
+        type=move.type,
+        dmg_type=move.dmg_type,
+        dmg=move.dmg,
+        accuracy=move.accuracy,
+        resource_cost=move.resource_cost,
+        lvl_learned=move.lvl_learned,
+        core_type_identity=move.core_type_identity,
+        track_type=move.track_type,
+        rarity=move.rarity,
+        is_starter=move.is_starter,
+        is_signature=move.is_signature,
+        image_id=str(move.image_id) if move.image_id else None,
+        image_url=(image.battle_image or None) if image else None,
+        effect=MappingProxyType(dict(effect)) if effect else None,
+    )
+
+
+# ============================================================================
+# Process-wide cache
+# ============================================================================
+
+SHARED_GENERATION_KEY = 'move-catalog:generation'
+
+_records: Optional[dict[str, MoveRecord]] = None
+_generation = 0
+_shared_generation = None  # Shared counter the installed catalog was loaded at
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def generation() -> int:
+    """Bumped on every invalidation; lets derived caches detect catalog changes."""
+    return _generation
+
+
+def warm() -> int:
+    """Load the catalog. Returns the number of moves, 0 if the table is not there yet."""
+    try:
+        return len(_catalog())
+    except DatabaseError:
+        # Before the first migrate
+        return 0
+
+
+def invalidate() -> None:
+    """Drop the catalog here and, through the shared generation, in every process."""
+    _drop()
+    _bump_shared()
+    # Processes that reloaded before the write committed reload once more
+    transaction.on_commit(_bump_shared)
+
+
+def _drop() -> None:
+    global _records, _generation
+    with _lock:
+        _records = None
+        _generation += 1
+
+
+def _bump_shared() -> None:
+    try:
+        cache.incr(SHARED_GENERATION_KEY)
+    except ValueError:
+        cache.set(SHARED_GENERATION_KEY, 1, None)
+
+
+def _check_shared() -> None:
+    """Drop the catalog if another process invalidated it (throttled)."""
+    global _checked_at
+    now = time.monotonic()
+    if _records is None or now - _checked_at < MOVE_CATALOG_CHECK_INTERVAL:
+        return
+    _checked_at = now
+    if cache.get(SHARED_GENERATION_KEY, 0) != _shared_generation:
+        _drop()
+
+
+def _catalog() -> dict[str, MoveRecord]:
+    _check_shared()
+    records = _records
+    if records is not None:
+        return records
+
+    seen = _generation
+    shared = cache.get(SHARED_GENERATION_KEY, 0)
+    loaded = {
+        record.id: record
+        for record in map(build_record, Move.objects.select_related('image'))
+    }
+    return _install(loaded, seen, shared)
+
+
+def _install(loaded: dict[str, MoveRecord], seen: int, shared: int) -> dict[str, MoveRecord]:
+    global _records, _shared_generation
+    with _lock:
+        if _generation != seen:
+            # A Move was written while loading; don't keep what we read
+            return loaded
+        if _records is None:
+            _records = loaded
+            _shared_generation = shared
+        return _records
+
+
+# ============================================================================
+# Reads
+# ============================================================================
+
+def get_move(move_id) -> MoveRecord:
+    """
+    MoveRecord for an id.
+
+    Raises:
+        Move.DoesNotExist: If no such move exists
+    """
+    global _records
+    key = str(move_id)
+    record = _catalog().get(key)
+    if record is not None:
+        return record
+
+    # Created since the catalog was loaded (possibly by another process)
+    seen = _generation
+    record = build_record(Move.objects.select_related('image').get(id=key))
+    with _lock:
+        if _generation == seen and _records is not None:
+            # Copy on write: readers may be iterating the current dict
+            _records = {**_records, key: record}
+    return record
+
+
+def peek(move_id) -> Optional[MoveRecord]:
+    """The record this process's catalog holds for an id, if any. Never queries."""
+    records = _records
+    return records.get(str(move_id)) if records is not None else None
+
+
+def get_moves(move_ids) -> list[MoveRecord]:
+    """MoveRecords for several ids, in order. Unknown ids raise Move.DoesNotExist."""
+    return [get_move(move_id) for move_id in move_ids]
+
+
+def all_moves() -> list[MoveRecord]:
+    """Every MoveRecord, ordered by name."""
+    return sorted(_catalog().values(), key=lambda record: record.name)
@@ -4,8 +4,11 @@ Handles move creation (curated and procedural) and core-move management.
 """
 import random
 from dataclasses import dataclass
-from typing import Optional
+from typing import Mapping, Optional
+
+from django.db import transaction
 from codex.models import Move, Core, CoreEquippedMove, ImageAsset
+from codex.services import move_catalog
 from codex.constants import (
     MOVE_STAT_RANGES,
     MOVE_FUNCTIONS,
@@ -42,6 +45,13 @@ class MoveEquipRequest:
     slot: int
 
 
+@dataclass(frozen=True)
+class LoadoutApplyRequest:
+    """Request object for replacing a core's whole loadout"""
+    core_id: str
+    slots: Mapping[int, str]  # slot -> move_id; slots not listed end up empty
+
+
 def create_move(req: MoveCreateRequest) -> Move:
     """
     Create a new move template with exact stats (curated mode).
@@ -191,14 +201,15 @@ def equip_move_to_core(req: MoveEquipRequest) -> CoreEquippedMove:
     # Get core and move
     try:
         core = Core.objects.select_related('garage', 'battle_info').get(id=req.core_id)
-        move = Move.objects.get(id=req.move_id)
+        move = move_catalog.get_move(req.move_id)
     except Core.DoesNotExist:
         raise ValueError(f"Core with ID {req.core_id} not found")
     except Move.DoesNotExist:
         raise ValueError(f"Move with ID {req.move_id} not found")
 
     # Validate slot range
-    max_slots = core.battle_info.equip_slots if core.battle_info else 4
+    battle_info = getattr(core, 'battle_info', None)
+    max_slots = battle_info.equip_slots if battle_info else 4
     if not 1 <= req.slot <= max_slots:
         raise ValueError(f"Slot must be 1-{max_slots}, got {req.slot}")
 
@@ -206,7 +217,7 @@ def equip_move_to_core(req: MoveEquipRequest) -> CoreEquippedMove:
     in_core_pool = core.moves_pool.filter(id=move.id).exists()
     in_garage_library = GarageMoveLibrary.objects.filter(
         garage=core.garage,
-        move=move
+        move_id=move.id
     ).exists()
 
     if not (in_core_pool or in_garage_library):
@@ -216,12 +227,12 @@ def equip_move_to_core(req: MoveEquipRequest) -> CoreEquippedMove:
 
     # If from garage library (not core-exclusive), check if copies available
     if in_garage_library and not in_core_pool:
-        library_entry = GarageMoveLibrary.objects.get(garage=core.garage, move=move)
+        library_entry = GarageMoveLibrary.objects.get(garage=core.garage, move_id=move.id)
 
         # Count how many cores currently have this equipped
         equipped_count = CoreEquippedMove.objects.filter(
             core__garage=core.garage,
-            move=move
+            move_id=move.id
         ).count()
 
         if equipped_count >= library_entry.copies_owned:
@@ -235,7 +246,7 @@ def equip_move_to_core(req: MoveEquipRequest) -> CoreEquippedMove:
         raise ValueError(f"Slot {req.slot} already occupied. Unequip the existing move first.")
 
     # Check if move is already equipped (database constraint will also catch this)
-    if CoreEquippedMove.objects.filter(core=core, move=move).exists():
+    if CoreEquippedMove.objects.filter(core=core, move_id=move.id).exists():
         raise ValueError(f"Move '{move.name}' is already equipped to {core.name} in another slot")
 
     # Validate type identity restrictions
@@ -252,7 +263,7 @@ def equip_move_to_core(req: MoveEquipRequest) -> CoreEquippedMove:
     try:
         equipped = CoreEquippedMove.objects.create(
             core=core,
-            move=move,
+            move_id=move.id,
             slot=req.slot
         )
     except Exception as e:
@@ -261,6 +272,109 @@ def equip_move_to_core(req: MoveEquipRequest) -> CoreEquippedMove:
     return equipped
 
 
+def apply_core_loadout(req: LoadoutApplyRequest) -> list[CoreEquippedMove]:
+    """
+    Replace a core's equipped moves with the complete slot -> move mapping
+    in `req`, all or nothing.
+
+    Runs the same checks as equip_move_to_core() for every slot, against
+    one snapshot of the core's pool, the garage library and the garage's
+    equipped rows (one query each), then applies the difference with a
+    single delete and a single bulk_create in one transaction. Slots whose
+    move does not change are left as they are.
+
+    Args:
+        req: LoadoutApplyRequest with core_id and slots
+
+    Returns:
+        list[CoreEquippedMove]: The core's equipped moves after the change, by slot
+
+    Raises:
+        ValueError: If validation fails (nothing is changed)
+    """
+    from codex.models import GarageMoveLibrary
+    from codex.services import garage_library
+
+    with transaction.atomic():
+        try:
+            core = (
+                Core.objects.select_for_update(of=('self',))
+                .select_related('battle_info').get(id=req.core_id)
+            )
+        except Core.DoesNotExist:
+            raise ValueError(f"Core with ID {req.core_id} not found")
+
+        # Snapshot
+        pool_ids = {str(move_id) for move_id in core.moves_pool.values_list('id', flat=True)}
+        copies_owned = {
+            str(move_id): copies
+            for move_id, copies in GarageMoveLibrary.objects.filter(
+                garage_id=core.garage_id
+            ).values_list('move_id', 'copies_owned')
+        }
+        current = {}
+        equipped_elsewhere = {}
+        for row in CoreEquippedMove.objects.filter(core__garage_id=core.garage_id):
+            if row.core_id == core.id:
+                current[row.slot] = row
+            else:
+                move_id = str(row.move_id)
+                equipped_elsewhere[move_id] = equipped_elsewhere.get(move_id, 0) + 1
+
+        # Validate
+        battle_info = getattr(core, 'battle_info', None)
+        max_slots = battle_info.equip_slots if battle_info else 4
+        wanted = {}
+        for slot, move_id in sorted(req.slots.items()):
+            if not 1 <= slot <= max_slots:
+                raise ValueError(f"Slot must be 1-{max_slots}, got {slot}")
+            try:
+                move = move_catalog.get_move(move_id)
+            except Move.DoesNotExist:
+                raise ValueError(f"Move with ID {move_id} not found")
+            if move.id in wanted.values():
+                raise ValueError(f"Move '{move.name}' is assigned to more than one slot")
+
+            if move.id not in pool_ids and move.id not in copies_owned:
+                raise ValueError(
+                    f"{move.name} not available. Must be in garage library or core's exclusive moves."
+                )
+            # Library copies are shared; this core's own rows are being replaced
+            if move.id not in pool_ids:
+                in_use = equipped_elsewhere.get(move.id, 0)
+                if in_use >= copies_owned[move.id]:
+                    raise ValueError(
+                        f"All copies of {move.name} are currently equipped. "
+                        f"(Owned: {copies_owned[move.id]}, Equipped: {in_use})"
+                    )
+            if move.core_type_identity and move.core_type_identity != core.type:
+                raise ValueError(
+                    f"Type identity mismatch: {move.name} requires a {move.core_type_identity} "
+                    f"Core, but {core.name} is {core.type}. Only Generic moves (empty type_identity) "
+                    f"or matching type moves can be equipped."
+                )
+            wanted[slot] = move.id
+
+        # Apply the difference
+        kept = {
+            slot: row for slot, row in current.items()
+            if wanted.get(slot) == str(row.move_id)
+        }
+        removed = [row.id for slot, row in current.items() if slot not in kept]
+        added = [
+            CoreEquippedMove(core=core, move_id=move_id, slot=slot)
+            for slot, move_id in wanted.items() if slot not in kept
+        ]
+        if removed or added:
+            with garage_library.batch(core.garage_id):
+                if removed:
+                    CoreEquippedMove.objects.filter(id__in=removed).delete()
+                if added:
+                    CoreEquippedMove.objects.bulk_create(added)
+
+    return sorted([*kept.values(), *added], key=lambda row: row.slot)
+
+
 def unequip_move_from_core(core_id: str, slot: int) -> None:
     """
     Remove a move from a core's equipped slot.
@@ -316,10 +430,10 @@ def add_move_to_garage_library(garage_id: str, move_id: str):
     Add a purchased move to the garage's shared library.
     Increments copies_owned if already present (max 2).
     """
-    from codex.models import Garage, Move, GarageMoveLibrary
+    from codex.models import Garage, GarageMoveLibrary
 
     garage = Garage.objects.get(id=garage_id)
-    move = Move.objects.get(id=move_id)
+    move = move_catalog.get_move(move_id)
 
     # Check if move is a starter (cannot be purchased)
     if move.is_starter:
@@ -332,7 +446,7 @@ def add_move_to_garage_library(garage_id: str, move_id: str):
     # Get or create library entry
     library_entry, created = GarageMoveLibrary.objects.get_or_create(
         garage=garage,
-        move=move,
+        move_id=move.id,
         defaults={'copies_owned': 1}
     )
 
@@ -381,59 +495,94 @@ def get_garage_available_moves(garage_id: str, core_id: str = None) -> list:
 
     Returns list of Move objects with availability status.
     """
-    from codex.models import Garage, Core, Move, GarageMoveLibrary, CoreEquippedMove
+    from codex.models import Garage
 
     garage = Garage.objects.get(id=garage_id)
+    if not core_id:
+        return _library_availability(garage, _equipped_pairs(garage))[0]
 
-    # Get shared library moves
-    library_moves = Move.objects.filter(
-        garagemovelibrary__garage=garage
-    ).distinct()
+    return get_garage_available_moves_by_core(garage, core_ids=[core_id]).get(str(core_id), [])
 
-    available_moves = []
 
-    # Add library moves with copy tracking
-    for move in library_moves:
-        library_entry = GarageMoveLibrary.objects.get(garage=garage, move=move)
+def get_garage_available_moves_by_core(garage, core_ids: Optional[list] = None) -> dict:
+    """
+    Available moves for every active core of a garage (or just `core_ids`),
+    keyed by core id, each list as get_garage_available_moves() returns it.
 
-        # Count how many cores currently have this equipped
-        equipped_count = CoreEquippedMove.objects.filter(
-            core__garage=garage,
-            move=move
-        ).count()
+    Built from four bulk queries (library entries, equipped rows, cores,
+    exclusive pools) into in-memory count maps, however many cores and
+    moves the garage has.
+    """
+    from codex.models import Core
+
+    equipped = _equipped_pairs(garage)
+    library, library_ids = _library_availability(garage, equipped)
+
+    cores = Core.objects.filter(garage=garage)
+    if core_ids is None:
+        cores = cores.filter(decommed=False)
+    else:
+        cores = cores.filter(id__in=core_ids)
+    core_ids = [str(core_id) for core_id in cores.values_list('id', flat=True)]
+
+    pools = {core_id: [] for core_id in core_ids}
+    for row in (
+        Core.moves_pool.through.objects.filter(core_id__in=core_ids)
+        .exclude(move_id__in=library_ids)
+        .select_related('move__image')
+    ):
+        pools[str(row.core_id)].append(row.move)
+
+    equipped_by_core = {}
+    for core_id, move_id in equipped:
+        equipped_by_core.setdefault(str(core_id), set()).add(move_id)
+
+    available = {}
+    for core_id in core_ids:
+        on_core = equipped_by_core.get(core_id, set())
+        available[core_id] = list(library) + [
+            {
+                'move': move,
+                'source': 'core_exclusive',
+                'is_starter': move.is_starter,
+                'is_signature': move.is_signature,
+                'is_equipped': False,
+                'can_equip': True
+            }
+            for move in pools[core_id] if move.id not in on_core
+        ]
+    return available
+
+
+def _equipped_pairs(garage) -> list[tuple]:
+    """(core id, move id) for every move equipped in the garage."""
+    return list(CoreEquippedMove.objects.filter(core__garage=garage).values_list('core_id', 'move_id'))
 
-        copies_available = library_entry.copies_owned - equipped_count
+
+def _library_availability(garage, equipped: list[tuple]) -> tuple[list[dict], set]:
+    """
+    Library moves with a copy left to equip, counted against `equipped`,
+    and the ids of every library move.
+    """
+    from codex.models import GarageMoveLibrary
+
+    equipped_counts = {}
+    for _, move_id in equipped:
+        equipped_counts[move_id] = equipped_counts.get(move_id, 0) + 1
+
+    available_moves = []
+    library_ids = set()
+    for entry in GarageMoveLibrary.objects.filter(garage=garage).select_related('move__image'):
+        library_ids.add(entry.move_id)
+        equipped_count = equipped_counts.get(entry.move_id, 0)
+        copies_available = entry.copies_owned - equipped_count
         if copies_available > 0:
             available_moves.append({
-                'move': move,
+                'move': entry.move,
                 'source': 'garage_library',
-                'copies_owned': library_entry.copies_owned,
+                'copies_owned': entry.copies_owned,
                 'copies_equipped': equipped_count,
                 'copies_available': copies_available,
                 'can_equip': True
             })
-
-    # If specific core provided, add core-exclusive moves
-    if core_id:
-        core = Core.objects.get(id=core_id)
-        exclusive_moves = core.moves_pool.exclude(
-            id__in=library_moves.values_list('id', flat=True)
-        )
-
-        for move in exclusive_moves:
-            is_equipped = CoreEquippedMove.objects.filter(
-                core=core,
-                move=move
-            ).exists()
-
-            if not is_equipped:
-                available_moves.append({
-                    'move': move,
-                    'source': 'core_exclusive',
-                    'is_starter': move.is_starter,
-                    'is_signature': move.is_signature,
-                    'is_equipped': False,
-                    'can_equip': True
-                })
-
-    return available_moves
+    return available_moves, library_ids
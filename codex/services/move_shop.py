@@ -0,0 +1,197 @@
+"""
+Move Shop Rotation
+The Scrapyard move shop's offer, one snapshot per rotation period.
+
+Every MOVE_SHOP_ROTATION_DAYS days (periods start on Mondays 00:00 UTC)
+the shop offers MOVE_SHOP_ROTATION_SIZE purchasable moves (not starter,
+not signature), drawn from the move catalog with the period start as the
+seed, so every process draws the same ones. The drawn entries are stored
+once per period as a MoveShopRotation row, the single source of truth.
+Every read takes the row's version and updated_at (one indexed query that
+skips the entries); the entries themselves come from Django's cache, keyed
+by period and version, so a process can never serve entries older than
+the row. GET /api/scrapyard/move-shop/ answers conditional requests
+against the row's ETag ("<period>.<version>") and Last-Modified, which
+are therefore the same on every worker.
+
+Regeneration:
+- the first read of a period with no row materializes it
+- `manage.py rotate_move_shop` materializes the current and next period
+  ahead of time (run it from cron)
+- a Move write that can change the draw (affects_rotation) regenerates
+  the current period when its transaction commits (codex/signals.py),
+  once per transaction however many Moves it writes; the version goes up
+  only if the entries actually changed
+
+Reads never rewrite an existing row: the move catalog is per process, and
+a process that has not seen a Move edit yet must not put the old entries
+back.
+"""
+import hashlib
+import json
+import random
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Optional
+
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from codex.constants import RARITY_PRICES, MOVE_SHOP_ROTATION_DAYS, MOVE_SHOP_ROTATION_SIZE
+from codex.models import MoveShopRotation
+from codex.services import move_catalog
+
+
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)  # A Monday
+
+_queued = threading.local()  # The regeneration this thread's transaction has queued
+
+
+def period_start(now: Optional[datetime] = None) -> datetime:
+    """Start of the rotation period containing `now`."""
+    elapsed = (now or timezone.now()) - EPOCH
+    return EPOCH + timedelta(days=elapsed.days // MOVE_SHOP_ROTATION_DAYS * MOVE_SHOP_ROTATION_DAYS)
+
+
+def period_end(start: datetime) -> datetime:
+    return start + timedelta(days=MOVE_SHOP_ROTATION_DAYS)
+
+
+def build_rotation(start: datetime) -> list[dict]:
+    """The period's shop entries from this process's move catalog, by rarity and name."""
+    candidates = sorted(
+        (move for move in move_catalog.all_moves() if not move.is_starter and not move.is_signature),
+        key=lambda move: move.id,
+    )
+    drawn = random.Random(start.isoformat()).sample(
+        candidates, min(MOVE_SHOP_ROTATION_SIZE, len(candidates))
+    )
+
+    return [{
+        "id": move.id,
+        "name": move.name,
+        "description": move.description,
+        "rarity": move.rarity,
+        "type": move.type,
+        "dmg_type": move.dmg_type,
+        "dmg": move.dmg,
+        "accuracy": move.accuracy,
+        "resource_cost": move.resource_cost,
+        "lvl_learned": move.lvl_learned,
+        "core_type_identity": move.core_type_identity,
+        "price": RARITY_PRICES.get(move.rarity, 100)  # Bits cost to unlock
+    } for move in sorted(drawn, key=lambda move: (move.rarity, move.name))]
+
+
+# ============================================================================
+# Snapshots
+# ============================================================================
+
+def _key(row: MoveShopRotation) -> str:
+    return f'move-shop:{row.period_start:%Y%m%d}:{row.version}'
+
+
+def _snapshot(row: MoveShopRotation, moves: list) -> dict:
+    return {
+        "period_start": row.period_start,
+        "version": row.version,
+        "etag": f'"{row.period_start:%Y%m%d}.{row.version}"',
+        "last_modified": row.updated_at,
+        "moves": moves,
+    }
+
+
+def _cache_moves(row: MoveShopRotation, moves: list) -> None:
+    timeout = (period_end(row.period_start) - timezone.now()).total_seconds()
+    if timeout > 0:
+        cache.set(_key(row), moves, int(timeout) + 1)
+
+
+def current(now: Optional[datetime] = None) -> dict:
+    """
+    The shop snapshot for the period containing `now`:
+    {period_start, version, etag, last_modified, moves}.
+    """
+    start = period_start(now)
+    row = MoveShopRotation.objects.filter(period_start=start).defer('moves', 'digest').first()
+    if row is None:
+        return regenerate(start)
+
+    moves = cache.get(_key(row))
+    if moves is None:
+        moves = row.moves  # Deferred: loaded now
+        _cache_moves(row, moves)
+    return _snapshot(row, moves)
+
+
+def regenerate(start: Optional[datetime] = None) -> dict:
+    """
+    (Re)build the period's snapshot from the move catalog and store it,
+    bumping the version if the entries changed. Returns the snapshot.
+    """
+    start = start or period_start()
+    moves = build_rotation(start)
+    digest = hashlib.sha256(json.dumps(moves, sort_keys=True).encode()).hexdigest()
+
+    with transaction.atomic():
+        row, created = MoveShopRotation.objects.select_for_update().get_or_create(
+            period_start=start, defaults={"digest": digest, "moves": moves}
+        )
+        if not created and row.digest != digest:
+            row.version += 1
+            row.digest = digest
+            row.moves = moves
+            row.save(update_fields=["version", "digest", "moves", "updated_at"])
+
+    _cache_moves(row, row.moves)
+    return _snapshot(row, row.moves)
+
+
+def affects_rotation(move, created: bool = False, deleted: bool = False,
+                     update_fields=None) -> bool:
+    """
+    Whether a write of `move` can change the current rotation. Call it
+    before the move catalog is invalidated: a move that is not a shop
+    candidate (starter or signature) matters only if it was one before the
+    write, which the catalog still remembers.
+    """
+    if not move.is_starter and not move.is_signature:
+        return True
+    if created or deleted:
+        return False
+    if update_fields is not None and not {'is_starter', 'is_signature'} & set(update_fields):
+        return False
+    previous = move_catalog.peek(move.id)
+    return previous is None or (not previous.is_starter and not previous.is_signature)
+
+
+def on_catalog_change() -> None:
+    """
+    A Move was written: regenerate the current period once the write
+    commits. Queued once per transaction, so seeding N moves regenerates
+    once rather than N times.
+    """
+    connection = transaction.get_connection()
+    queued = getattr(_queued, 'callback', None)
+    if queued is not None and connection.in_atomic_block and any(
+        # Still pending where it survives unless this write is rolled back too
+        func is queued and sids <= set(connection.savepoint_ids)
+        for sids, func, _ in connection.run_on_commit
+    ):
+        return
+
+    def regenerate_once():
+        _queued.callback = None
+        _regenerate_current()
+
+    _queued.callback = regenerate_once
+    transaction.on_commit(regenerate_once)
+
+
+def _regenerate_current() -> None:
+    try:
+        regenerate()
+    except DatabaseError:
+        # Before the first migrate; the next read materializes the period
+        pass
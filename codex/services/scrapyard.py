@@ -1,5 +1,5 @@
-from codex.models import Core, Scrapyard, Move
-from codex.constants import RARITY_PRICES
+from codex.models import Core, Scrapyard
+from codex.services import move_shop
 
 
 def decommission_core(core: Core, scrapyard: Scrapyard) -> None:
@@ -34,26 +34,10 @@ def recommission_core(core: Core, operator_bits_cost: int) -> None:
 
 def get_move_shop_rotation() -> list:
     """
-    Get the current move shop inventory for the Scrapyard.
-    MVP: Return all non-starter moves grouped by rarity.
-    Future: Implement weekly rotation logic.
+    Get the current move shop inventory for the Scrapyard: this rotation
+    period's snapshot (see codex/services/move_shop.py), served from cache.
 
     Returns:
         list: List of move dictionaries with id, name, rarity, type, dmg, cost, price
     """
-    moves = Move.objects.filter(is_starter=False).order_by('rarity', 'name')
-
-    return [{
-        "id": str(move.id),
-        "name": move.name,
-        "description": move.description,
-        "rarity": move.rarity,
-        "type": move.type,
-        "dmg_type": move.dmg_type,
-        "dmg": move.dmg,
-        "accuracy": move.accuracy,
-        "resource_cost": move.resource_cost,
-        "lvl_learned": move.lvl_learned,
-        "core_type_identity": move.core_type_identity,
-        "price": RARITY_PRICES.get(move.rarity, 100)  # Bits cost to unlock
-    } for move in moves]
+    return move_shop.current()["moves"]
@@ -1,7 +1,8 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
-from codex.models import Operator
+from codex.models import Operator, Move, Core, CoreEquippedMove, GarageMoveLibrary
+from codex.services import garage_library, move_catalog, move_shop
 from codex.services.operator_init import initialize_operator
 
 
@@ -18,3 +19,43 @@ def initialize_new_operator(sender, instance, created, **kwargs):
     """
     if created:
         initialize_operator(instance)
+
+
+@receiver(post_save, sender=Move)
+@receiver(post_delete, sender=Move)
+def invalidate_move_catalog(sender, instance, **kwargs):
+    """Drop the in-process Move catalog whenever a Move is written or deleted."""
+    # Before the catalog is dropped: it still knows the move's old flags
+    affects_shop = move_shop.affects_rotation(
+        instance,
+        created=kwargs.get('created', False),
+        deleted=kwargs['signal'] is post_delete,
+        update_fields=kwargs.get('update_fields'),
+    )
+    move_catalog.invalidate()
+    garage_library.invalidate_all()
+    if affects_shop:
+        # After the catalog is dropped, so the regenerated shop sees the write
+        move_shop.on_catalog_change()
+
+
+@receiver(post_save, sender=GarageMoveLibrary)
+@receiver(post_delete, sender=GarageMoveLibrary)
+@receiver(post_save, sender=Core)
+@receiver(post_delete, sender=Core)
+def invalidate_garage_library(sender, instance, **kwargs):
+    """Drop the garage's cached move library when its entries or cores change."""
+    garage_library.invalidate(instance.garage_id)
+
+
+@receiver(post_save, sender=CoreEquippedMove)
+@receiver(post_delete, sender=CoreEquippedMove)
+def invalidate_garage_library_equip(sender, instance, **kwargs):
+    """Drop the owning garage's cached move library when a move is equipped or unequipped."""
+    if garage_library.in_batch():
+        return  # apply_core_loadout invalidates once for all its rows
+    # Only the garage id, not a Core load per row (cascade deletes included;
+    # a deleted core's own signal covers its garage)
+    garage_library.invalidate(
+        Core.objects.filter(pk=instance.core_id).values_list('garage_id', flat=True).first()
+    )
@@ -1,3 +1,435 @@
-from django.test import TestCase
+import json
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from codex.constants import MOVE_CATALOG_CHECK_INTERVAL
+from codex.models import (
+    Operator, Move, Core, CoreBattleInfo, CoreEquippedMove, CoreUpgradeInfo, GarageMoveLibrary,
+)
+from codex.services import garage_library, move_catalog, move_shop
+from codex.services.core_factory import generate_cores, CoreBatchGenRequest
+from codex.services.move_factory import apply_core_loadout, LoadoutApplyRequest
+
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def _move(name, **fields) -> Move:
+    return Move.objects.create(name=name, dmg_type=fields.pop('dmg_type', 'PHYSICAL'), dmg=20, **fields)
+
+
+# ============================================================================
+# Move catalog
+# ============================================================================
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class MoveCatalogInvalidationTests(TestCase):
+    """A Move edited through another process reaches this one's catalog."""
+
+    def setUp(self):
+        self.move = _move('Test Catalog Move')
+        move_catalog._drop()
+        for patcher in (
+            mock.patch.object(move_catalog.time, 'monotonic', return_value=1000.0),
+            mock.patch.object(move_catalog, '_checked_at', 0.0),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(move_catalog._drop)
+
+    def edit_elsewhere(self, dmg):
+        """What another process's save does here: the row changes, the shared generation moves."""
+        Move.objects.filter(pk=self.move.pk).update(dmg=dmg)
+        move_catalog._bump_shared()
+
+    def test_edit_elsewhere_reloads_after_check_interval(self):
+        for _ in range(2):  # Loaded, then checked against the shared generation
+            self.assertEqual(move_catalog.get_move(self.move.id).dmg, 20)
+
+        self.edit_elsewhere(77)
+        self.assertEqual(move_catalog.get_move(self.move.id).dmg, 20)  # Not checked again yet
+
+        move_catalog.time.monotonic.return_value += MOVE_CATALOG_CHECK_INTERVAL
+        self.assertEqual(move_catalog.get_move(self.move.id).dmg, 77)
+
+    def test_local_save_invalidates_at_once(self):
+        move_catalog.get_move(self.move.id)
+        shared = cache.get(move_catalog.SHARED_GENERATION_KEY)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.move.dmg = 55
+            self.move.save()
+
+        self.assertEqual(move_catalog.get_move(self.move.id).dmg, 55)
+        self.assertEqual(cache.get(move_catalog.SHARED_GENERATION_KEY), shared + 2)  # Now and on commit
+
+    def test_load_racing_an_invalidation_is_not_kept(self):
+        seen = move_catalog.generation()
+        loaded = {str(self.move.id): move_catalog.build_record(self.move)}
+        move_catalog.invalidate()
+
+        self.assertIs(move_catalog._install(loaded, seen, 0), loaded)
+        self.assertIsNone(move_catalog._records)
+
+
+# ============================================================================
+# Loadouts
+# ============================================================================
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ApplyCoreLoadoutTests(TestCase):
+    """apply_core_loadout validates the whole loadout before changing anything."""
+
+    def setUp(self):
+        self.garage = Operator.objects.create(call_sign='LOADOUT').garage
+        self.core = Core.objects.create(garage=self.garage, name='Loadout Core', type='RUST')
+        CoreBattleInfo.objects.create(core=self.core, hp=100, equip_slots=3)
+        self.other = Core.objects.create(garage=self.garage, name='Other Core', type='RUST')
+
+        self.strike = _move('Test Strike')
+        self.guard = _move('Test Guard')
+        self.volt = _move('Test Volt Beam', dmg_type='ENERGY', core_type_identity='VOLT')
+        self.library = _move('Test Library Slash')
+        self.core.moves_pool.add(self.strike, self.guard, self.volt)
+        GarageMoveLibrary.objects.create(garage=self.garage, move=self.library, copies_owned=1)
+
+    def apply(self, slots):
+        return apply_core_loadout(LoadoutApplyRequest(
+            core_id=str(self.core.id), slots={slot: str(move.id) for slot, move in slots.items()}
+        ))
+
+    def equipped(self):
+        return {
+            row.slot: row.move_id
+            for row in CoreEquippedMove.objects.filter(core=self.core)
+        }
+
+    def test_applies_loadout_by_slot(self):
+        rows = self.apply({1: self.strike, 3: self.library})
+
+        self.assertEqual([row.slot for row in rows], [1, 3])
+        self.assertEqual(self.equipped(), {1: self.strike.id, 3: self.library.id})
+
+    def test_unchanged_slots_keep_their_rows(self):
+        kept = self.apply({1: self.strike, 2: self.guard})[0]
+
+        rows = self.apply({1: self.strike, 2: self.library})
+
+        self.assertEqual(rows[0].id, kept.id)
+        self.assertEqual(self.equipped(), {1: self.strike.id, 2: self.library.id})
+
+    def test_rejects_move_in_two_slots(self):
+        with self.assertRaisesMessage(ValueError, 'assigned to more than one slot'):
+            self.apply({1: self.strike, 2: self.strike})
+
+    def test_rejects_slot_past_equip_slots(self):
+        with self.assertRaisesMessage(ValueError, 'Slot must be 1-3'):
+            self.apply({4: self.strike})
+
+    def test_rejects_unknown_move(self):
+        with self.assertRaisesMessage(ValueError, 'not found'):
+            apply_core_loadout(LoadoutApplyRequest(
+                core_id=str(self.core.id), slots={1: '00000000-0000-0000-0000-000000000000'}
+            ))
+
+    def test_rejects_move_not_owned(self):
+        with self.assertRaisesMessage(ValueError, 'not available'):
+            self.apply({1: _move('Test Unowned')})
+
+    def test_rejects_library_move_with_every_copy_equipped(self):
+        CoreEquippedMove.objects.create(core=self.other, move=self.library, slot=1)
+
+        with self.assertRaisesMessage(ValueError, 'All copies of Test Library Slash'):
+            self.apply({1: self.library})
+
+    def test_rejects_type_identity_mismatch(self):
+        with self.assertRaisesMessage(ValueError, 'Type identity mismatch'):
+            self.apply({1: self.volt})
+
+    def test_failed_loadout_changes_nothing(self):
+        self.apply({1: self.strike, 2: self.guard})
+
+        with self.assertRaises(ValueError):
+            self.apply({1: self.library, 2: self.volt})
+
+        self.assertEqual(self.equipped(), {1: self.strike.id, 2: self.guard.id})
+
+    def test_core_without_battle_info_has_four_slots(self):
+        CoreBattleInfo.objects.filter(core=self.core).delete()
+
+        rows = self.apply({4: self.strike})
+
+        self.assertEqual([row.slot for row in rows], [4])
+        with self.assertRaisesMessage(ValueError, 'Slot must be 1-4'):
+            self.apply({5: self.strike})
+
+    def test_endpoint_reports_validation_errors(self):
+        response = self.client.put(
+            f'/api/cores/{self.core.id}/loadout/',
+            json.dumps({'slots': {'1': str(self.strike.id), '2': str(self.strike.id)}}),
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('more than one slot', response.json()['error'])
+
+
+# ============================================================================
+# Core generation
+# ============================================================================
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class GenerateCoresTests(TestCase):
+    """A multi-pull creates every core and charges for them, or does nothing."""
+
+    def setUp(self):
+        self.operator = Operator.objects.create(call_sign='PULLER')
+        Operator.objects.filter(pk=self.operator.pk).update(bits=1000)
+        self.garage = self.operator.garage
+        self.starter = _move('Test Starter', is_starter=True)
+
+    def pull(self, count, price=100):
+        return generate_cores(self.garage, CoreBatchGenRequest(
+            name='Pulled', rarity='Common', track='Attack', count=count, price=price,
+        ))
+
+    def state(self):
+        return (
+            Operator.objects.get(pk=self.operator.pk).bits,
+            Core.objects.filter(garage=self.garage).count(),
+            CoreBattleInfo.objects.filter(core__garage=self.garage).count(),
+        )
+
+    def test_pull_creates_and_charges_for_every_core(self):
+        bits, cores, infos = self.state()
+
+        pulled = self.pull(2)
+
+        self.assertEqual([core.name for core in pulled], ['Pulled 1', 'Pulled 2'])
+        self.assertEqual(self.state(), (bits - 200, cores + 2, infos + 2))
+        for core in pulled:
+            self.assertTrue(CoreUpgradeInfo.objects.filter(core=core).exists())
+            self.assertIn(self.starter, core.moves_pool.all())
+
+    def test_rejects_pull_it_cannot_pay_for(self):
+        before = self.state()
+
+        with self.assertRaisesMessage(ValueError, 'Insufficient credits. Need 1200'):
+            self.pull(2, price=600)
+
+        self.assertEqual(self.state(), before)
+
+    def test_rejects_pull_past_garage_capacity(self):
+        room = self.garage.capacity - Core.objects.filter(garage=self.garage, decommed=False).count()
+        before = self.state()
+
+        with self.assertRaisesMessage(ValueError, f'room for {room} more core(s), not {room + 1}'):
+            self.pull(room + 1, price=1)
+
+        self.assertEqual(self.state(), before)
+
+    def test_failure_part_way_leaves_nothing(self):
+        before = self.state()
+
+        with mock.patch.object(CoreUpgradeInfo.objects, 'bulk_create', side_effect=RuntimeError('boom')), \
+                self.assertRaises(RuntimeError):
+            self.pull(2)
+
+        self.assertEqual(self.state(), before)
+
+
+# ============================================================================
+# Garage move library
+# ============================================================================
+
+class GarageQueriesTestCase(TestCase):
+    """A garage whose library and cores can be grown between two requests."""
+
+    def setUp(self):
+        self.garage = Operator.objects.create(call_sign='QUERIES').garage
+        self.grow(1)
+
+    def grow(self, n):
+        """Add `n` cores, each with a library move equipped and an exclusive move in its pool."""
+        start = Core.objects.filter(garage=self.garage).count()
+        for i in range(start, start + n):
+            core = Core.objects.create(garage=self.garage, name=f'Query Core {i}', type='RUST')
+            library = _move(f'Test Library Move {i}')
+            GarageMoveLibrary.objects.create(garage=self.garage, move=library, copies_owned=2)
+            CoreEquippedMove.objects.create(core=core, move=library, slot=1)
+            core.moves_pool.add(_move(f'Test Exclusive Move {i}'))
+
+    def queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class GarageMoveLibraryQueryTests(GarageQueriesTestCase):
+    """GET move-library costs the same few queries however large the library is."""
+
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/garages/{self.garage.id}/move-library/'
+
+    def test_query_count_does_not_grow_with_library(self):
+        small, _ = self.queries(self.url)
+        self.grow(10)
+        garage_library.invalidate(self.garage.id)
+
+        large, body = self.queries(self.url)
+
+        self.assertEqual(large, small)
+        self.assertEqual(len(body['moves']), 11)
+        equipped_by = {entry['move']['name']: entry['equipped_by'] for entry in body['moves']}
+        self.assertEqual(equipped_by['Test Library Move 7'], ['Query Core 7'])
+
+    def test_equip_change_invalidates_without_loading_the_core(self):
+        self.queries(self.url)
+        core = Core.objects.get(garage=self.garage, name='Query Core 1')
+        move = _move('Test Equip Signal Move')
+        GarageMoveLibrary.objects.create(garage=self.garage, move=move, copies_owned=1)
+
+        with CaptureQueriesContext(connection) as queries:
+            CoreEquippedMove.objects.create(core_id=core.id, move=move, slot=2)
+        _, body = self.queries(self.url)
+
+        core_loads = [q['sql'] for q in queries.captured_queries
+                      if q['sql'].startswith('SELECT') and '"codex_core"."name"' in q['sql']]
+        self.assertEqual(core_loads, [])
+        equipped_by = {entry['move']['name']: entry['equipped_by'] for entry in body['moves']}
+        self.assertEqual(equipped_by['Test Equip Signal Move'], ['Query Core 1'])
+
+    def test_cached_library_skips_the_build(self):
+        built, _ = self.queries(self.url)
+
+        cached, _ = self.queries(self.url)
+
+        self.assertEqual(built - cached, 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class GarageAvailableMovesQueryTests(GarageQueriesTestCase):
+    """GET available-moves answers for every core from a fixed number of bulk queries."""
+
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/garages/{self.garage.id}/available-moves/'
+
+    def test_query_count_does_not_grow_with_cores_or_moves(self):
+        small, _ = self.queries(self.url)
+        self.grow(10)
+
+        large, body = self.queries(self.url)
+
+        self.assertEqual(large, small)
+        self.assertEqual(len(body['cores']), Core.objects.filter(garage=self.garage, decommed=False).count())
+
+    def test_matches_per_core_endpoint(self):
+        self.grow(2)
+        _, body = self.queries(self.url)
+
+        for core_id, moves in body['cores'].items():
+            with self.subTest(core=core_id):
+                self.assertEqual(moves, self.client.get(f'/api/cores/{core_id}/available-moves/').json())
+
+
+# ============================================================================
+# Move shop
+# ============================================================================
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class MoveShopConditionalGetTests(TestCase):
+    """GET /api/scrapyard/move-shop/ revalidates against the rotation snapshot."""
+
+    url = '/api/scrapyard/move-shop/'
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.moves = [_move(f'Test Shop Move {i}') for i in range(3)]
+
+    def test_matching_etag_returns_304(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(len(first.json()), 3)
+
+        again = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b'')
+        self.assertEqual(again['ETag'], first['ETag'])
+
+    def test_unmodified_since_returns_304(self):
+        first = self.client.get(self.url)
+
+        again = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+
+        self.assertEqual(again.status_code, 304)
+
+    def test_stale_etag_returns_200(self):
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"19700101.1"')
+
+        self.assertEqual(response.status_code, 200)
+
+    def regenerations(self, write):
+        with mock.patch.object(move_shop, '_regenerate_current') as regenerate, \
+                self.captureOnCommitCallbacks(execute=True):
+            write()
+        return regenerate.call_count
+
+    def test_one_regeneration_per_transaction(self):
+        def seed():
+            for i in range(5):
+                _move(f'Test Seeded Move {i}')
+            self.moves[0].dmg = 45
+            self.moves[0].save()
+
+        self.assertEqual(self.regenerations(seed), 1)
+
+    def test_regeneration_survives_rolled_back_savepoint(self):
+        def write():
+            try:
+                with transaction.atomic():
+                    _move('Test Rolled Back Move')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            _move('Test Kept Move')
+
+        self.assertEqual(self.regenerations(write), 1)
+
+    def test_non_candidate_writes_skip_regeneration(self):
+        def write():
+            starter = _move('Test Starter Move', is_starter=True)
+            starter.dmg = 30
+            starter.save(update_fields=['dmg'])
+            _move('Test Signature Move', is_signature=True).delete()
+
+        self.assertEqual(self.regenerations(write), 0)
+
+    def test_candidate_becoming_starter_regenerates(self):
+        move_catalog.all_moves()  # The catalog remembers the move as a candidate
+
+        def write():
+            self.moves[1].is_starter = True
+            self.moves[1].save()
+
+        self.assertEqual(self.regenerations(write), 1)
+
+    def test_move_edit_changes_etag(self):
+        first = self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.moves[0].dmg = 45
+            self.moves[0].save()
+        again = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(again.status_code, 200)
+        self.assertNotEqual(again['ETag'], first['ETag'])
+        self.assertIn(45, [move['dmg'] for move in again.json()])
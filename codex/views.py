@@ -1,23 +1,30 @@
 from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from django.db import transaction
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from codex.serializers.core import CoreSerializer, CoreGenerationRequestSerializer, CoreEquippedMoveSerializer
+from codex.serializers.core import (
+    CoreSerializer, CoreGenerationRequestSerializer, CoreBatchGenerationRequestSerializer,
+    CoreEquippedMoveSerializer
+)
 from .models import Operator, ImageAsset, Garage, Core, Scrapyard, Move
 from codex.serializers.operator import OperatorSerializer
 from codex.serializers.garage import GarageSerializer
 from codex.serializers.scrapyard import ScrapyardSerializer
 from codex.serializers.move import (
     MoveSerializer, MoveListSerializer, MoveCreateSerializer,
-    MoveGenerateSerializer, MoveEquipSerializer, MoveUnequipSerializer
+    MoveGenerateSerializer, MoveEquipSerializer, MoveUnequipSerializer, CoreLoadoutSerializer
 )
-from codex.services.core_factory import generate_core, CoreGenRequest
-from codex.services.scrapyard import decommission_core, recommission_core, get_move_shop_rotation
+from codex.services import garage_library, move_catalog, move_shop
+from codex.services.core_factory import generate_core, CoreGenRequest, generate_cores, CoreBatchGenRequest
+from codex.services.scrapyard import decommission_core, recommission_core
 from codex.services.move_factory import (
     create_move, MoveCreateRequest, generate_random_move,
-    equip_move_to_core, unequip_move_from_core, MoveEquipRequest
+    equip_move_to_core, unequip_move_from_core, MoveEquipRequest,
+    apply_core_loadout, LoadoutApplyRequest
 )
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
@@ -52,32 +59,44 @@ class GarageView(viewsets.ModelViewSet):
             ]
         }
         """
-        from codex.models import GarageMoveLibrary, CoreEquippedMove
-        from codex.serializers.move import MoveSerializer
+        garage = self.get_object()
+        library_data = garage_library.get_move_library(garage)
+
+        return Response({"moves": library_data}, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'], url_path='available-moves')
+    def available_moves(self, request, pk=None):
+        """
+        Available moves for every active core in this garage, in one response
+        (the per-core lists of GET /api/cores/{id}/available-moves/).
+        GET /api/garages/{id}/available-moves/
+
+        Returns:
+        {
+            "cores": {
+                "<core_id>": [{...move, "availability": {...}}, ...]
+            }
+        }
+        """
+        from codex.services.move_factory import get_garage_available_moves_by_core
+        from codex.serializers.move import available_move_data
 
         garage = self.get_object()
+        available = get_garage_available_moves_by_core(garage)
 
-        library_entries = GarageMoveLibrary.objects.filter(
-            garage=garage
-        ).select_related('move').prefetch_related('move__image')
-
-        library_data = []
-        for entry in library_entries:
-            # Get cores that have this move equipped
-            equipped_cores = CoreEquippedMove.objects.filter(
-                core__garage=garage,
-                move=entry.move
-            ).select_related('core').values_list('core__name', flat=True)
-
-            library_data.append({
-                "move": MoveSerializer(entry.move).data,
-                "copies_owned": entry.copies_owned,
-                "copies_equipped": len(equipped_cores),
-                "copies_available": entry.copies_owned - len(equipped_cores),
-                "equipped_by": list(equipped_cores)
-            })
+        # Library moves repeat across cores; serialize each move once
+        serialized = {}
 
-        return Response({"moves": library_data}, status=status.HTTP_200_OK)
+        def move_data(item):
+            key = (item['move'].id, item['source'])
+            if key not in serialized:
+                serialized[key] = available_move_data(item)
+            return serialized[key]
+
+        return Response(
+            {"cores": {core_id: [move_data(item) for item in items] for core_id, items in available.items()}},
+            status=status.HTTP_200_OK
+        )
 
 
 class CoreView(viewsets.ModelViewSet):
@@ -134,6 +153,44 @@ class CoreView(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=False, methods=['post'], url_path='generate-batch')
+    def generate_batch(self, request):
+        """
+        Generate several cores in one pull (same rarity and track).
+        POST /api/cores/generate-batch/
+        Request body: {name, rarity, track, garage_id, count}
+        """
+        serializer = CoreBatchGenerationRequestSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        validated_data = serializer.validated_data
+
+        try:
+            cores = generate_cores(validated_data['garage'], CoreBatchGenRequest(
+                name=validated_data['name'],
+                rarity=validated_data['rarity'],
+                track=validated_data['track'],
+                count=validated_data['count'],
+                price=validated_data['price']
+            ))
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Re-read with relations joined / prefetched so serializing stays O(1) queries
+        loaded = (
+            Core.objects.filter(id__in=[core.id for core in cores])
+            .select_related('battle_info', 'upgrade_info')
+            .prefetch_related('moves_pool', 'equipped_moves')
+            .in_bulk()
+        )
+        core_serializer = CoreSerializer([loaded[core.id] for core in cores], many=True)
+        return Response(core_serializer.data, status=status.HTTP_201_CREATED)
+
     @action(detail=True, methods=['post'], url_path='decommission')
     @transaction.atomic
     def decommission(self, request, pk=None):
@@ -271,6 +328,32 @@ class CoreView(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @action(detail=True, methods=['put'], url_path='loadout')
+    def loadout(self, request, pk=None):
+        """
+        Replace the core's equipped moves in one request, all or nothing.
+        PUT /api/cores/{id}/loadout/
+        Body: {slots: {"1": move_id, "2": move_id, ...}}  (missing or null slots are emptied)
+        """
+        core = self.get_object()
+        serializer = CoreLoadoutSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            equipped = apply_core_loadout(LoadoutApplyRequest(
+                core_id=str(core.id),
+                slots=serializer.validated_data['slots']
+            ))
+            response_serializer = CoreEquippedMoveSerializer(equipped, many=True)
+            return Response(response_serializer.data, status=status.HTTP_200_OK)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
     @action(detail=True, methods=['get'], url_path='available-moves')
     def available_moves(self, request, pk=None):
         """
@@ -281,39 +364,18 @@ class CoreView(viewsets.ModelViewSet):
         GET /api/cores/{id}/available-moves/
         """
         from codex.services.move_factory import get_garage_available_moves
-        from codex.serializers.move import MoveSerializer
+        from codex.serializers.move import available_move_data
 
         core = self.get_object()
 
         # Get combined availability data
         available = get_garage_available_moves(
-            str(core.garage.id),
+            str(core.garage_id),
             str(core.id)
         )
 
         # Format for frontend
-        response_data = []
-        for item in available:
-            move_data = MoveSerializer(item['move']).data
-            move_data['availability'] = {
-                'source': item['source'],
-                'can_equip': item.get('can_equip', False)
-            }
-
-            if item['source'] == 'garage_library':
-                move_data['availability'].update({
-                    'copies_owned': item['copies_owned'],
-                    'copies_equipped': item['copies_equipped'],
-                    'copies_available': item['copies_available']
-                })
-            else:  # core_exclusive
-                move_data['availability'].update({
-                    'is_starter': item.get('is_starter', False),
-                    'is_signature': item.get('is_signature', False),
-                    'is_equipped': item.get('is_equipped', False)
-                })
-
-            response_data.append(move_data)
+        response_data = [available_move_data(item) for item in available]
 
         return Response(response_data, status=status.HTTP_200_OK)
 
@@ -324,7 +386,7 @@ class CoreView(viewsets.ModelViewSet):
         GET /api/cores/{id}/equipped-moves/
         """
         core = self.get_object()
-        equipped = core.equipped_moves.through.objects.filter(core=core).select_related('move')
+        equipped = core.equipped_moves.through.objects.filter(core=core)
         serializer = CoreEquippedMoveSerializer(equipped, many=True)
         return Response(serializer.data)
 
@@ -351,7 +413,7 @@ class CoreView(viewsets.ModelViewSet):
             )
 
         try:
-            move = Move.objects.get(id=move_id)
+            move = move_catalog.get_move(move_id)
         except Move.DoesNotExist:
             return Response(
                 {"error": "Move not found"},
@@ -439,6 +501,21 @@ class MoveView(viewsets.ModelViewSet):
             return MoveCreateSerializer
         return MoveSerializer
 
+    def list(self, request, *args, **kwargs):
+        """
+        Filtering, search and ordering run in the database on ids only;
+        the move data itself comes from the move catalog.
+        """
+        move_ids = self.filter_queryset(self.get_queryset()).values_list('id', flat=True)
+
+        page = self.paginate_queryset(move_ids)
+        if page is not None:
+            serializer = self.get_serializer(move_catalog.get_moves(page), many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer(move_catalog.get_moves(move_ids), many=True)
+        return Response(serializer.data)
+
     @action(detail=False, methods=['post'], url_path='create-move')
     @transaction.atomic
     def create_move(self, request):
@@ -535,7 +612,17 @@ class ScrapyardView(viewsets.ReadOnlyModelViewSet):
         """
         Get available moves for purchase in the Scrapyard Move Shop.
         GET /api/scrapyard/move-shop/
-        Returns all non-starter moves with pricing.
+        Returns this rotation period's moves with pricing. Honors
+        If-None-Match / If-Modified-Since with 304 Not Modified.
         """
-        shop_moves = get_move_shop_rotation()
-        return Response(shop_moves, status=status.HTTP_200_OK)
+        shop = move_shop.current()
+        last_modified = int(shop['last_modified'].timestamp())
+
+        response = get_conditional_response(request, etag=shop['etag'], last_modified=last_modified)
+        if response is None:
+            response = Response(shop['moves'], status=status.HTTP_200_OK)
+        response['ETag'] = shop['etag']
+        response['Last-Modified'] = http_date(last_modified)
+        # Revalidate every time: a Move edit changes the snapshot mid-period
+        patch_cache_control(response, no_cache=True)
+        return response
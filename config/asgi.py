@@ -18,9 +18,14 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 # is populated before importing consumers
 django_asgi_app = get_asgi_application()
 
-from channels.routing import ProtocolTypeRouter, URLRouter
+# Load the Move catalog before the first request needs it
+from codex.services import move_catalog
+move_catalog.warm()
+
+from channels.routing import ProtocolTypeRouter
 from channels.auth import AuthMiddlewareStack
 import battle.routing
+from battle.lifespan import lifespan_application
 
 # In development, use staticfiles handler for serving static files
 if settings.DEBUG:
@@ -32,8 +37,7 @@ else:
 application = ProtocolTypeRouter({
     "http": http_application,
     "websocket": AuthMiddlewareStack(
-        URLRouter(
-            battle.routing.websocket_urlpatterns
-        )
+        battle.routing.websocket_application
     ),
+    "lifespan": lifespan_application,
 })
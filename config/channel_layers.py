@@ -0,0 +1,366 @@
+# config/channel_layers.py
+"""
+SQLite channel layer.
+
+A channel layer for running several Daphne/uvicorn processes on one host
+without an external broker. Every process opens the same SQLite file (WAL
+mode), which holds two tables:
+
+    messages(channel, owner, body, expires)   one row per undelivered message
+    groups(grp, channel, expires)             group membership
+
+send() and group_send() insert rows; receivers delete the rows they take.
+Channels created with new_channel() are process-specific
+("specific.<process token>!<random>"), so each process runs one poller that
+collects the messages for all of its own channels with one indexed query
+and hands them to the waiting receive() calls. Other channel names are
+polled directly by receive().
+
+Semantics follow the in-memory and Redis layers:
+
+    - messages older than `expiry` seconds are dropped undelivered
+    - group membership lapses after `group_expiry` seconds
+    - send() raises ChannelFull when a channel already holds `capacity`
+      (or its `channel_capacity` match) undelivered messages; group_send()
+      skips full channels
+
+Delivery latency is the poll interval: `poll_interval` right after traffic,
+backing off to `max_poll_interval` while idle. A poll that finds the file
+locked (a write burst can outlast the busy timeout even in WAL mode) is
+retried with backoff up to LOCKED_RETRY_MAX seconds, and a poller that
+dies anyway is restarted by the next receive(). Message bodies are JSON,
+with bytes values encoded so websocket binary frames survive the trip.
+
+Configure in settings:
+
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "config.channel_layers.SQLiteChannelLayer",
+            "CONFIG": {"path": BASE_DIR / "channels.sqlite3"},
+        }
+    }
+"""
+import asyncio
+import base64
+import json
+import random
+import sqlite3
+import string
+import tempfile
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel TEXT NOT NULL,
+    owner TEXT,
+    body TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_channel ON messages (channel, id);
+CREATE INDEX IF NOT EXISTS messages_owner ON messages (owner, id);
+CREATE INDEX IF NOT EXISTS messages_expires ON messages (expires);
+CREATE TABLE IF NOT EXISTS groups (
+    grp TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (grp, channel)
+);
+"""
+
+BATCH_SIZE = 100
+CLEANUP_INTERVAL = 5.0  # seconds between sweeps of expired rows
+LOCKED_RETRY_MAX = 1.0  # longest wait between polls of a locked database
+
+
+def _encode(message: dict) -> str:
+    return json.dumps(message, default=_encode_bytes, separators=(',', ':'))
+
+
+def _encode_bytes(value):
+    if isinstance(value, bytes):
+        return {'__bytes__': base64.b64encode(value).decode('ascii')}
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _decode(body: str) -> dict:
+    return json.loads(body, object_hook=_decode_bytes)
+
+
+def _decode_bytes(obj: dict):
+    if len(obj) == 1 and '__bytes__' in obj:
+        return base64.b64decode(obj['__bytes__'])
+    return obj
+
+
+class SQLiteChannelLayer(BaseChannelLayer):
+    """Channel layer on a shared SQLite file; groups and flush extensions."""
+
+    extensions = ['groups', 'flush']
+
+    def __init__(self, path=None, expiry=60, group_expiry=86400, capacity=100,
+                 channel_capacity=None, poll_interval=0.005, max_poll_interval=0.05):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity)
+        self.channel_capacity = self.compile_capacities(channel_capacity or {})
+        self.path = str(path or Path(tempfile.gettempdir()) / 'channels.sqlite3')
+        self.group_expiry = group_expiry
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.client_prefix = f'specific.{uuid.uuid4().hex}!'
+
+        # One thread owns the connection; the event loop never blocks on SQLite
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='channel-layer')
+        self._connection = None
+        self._last_cleanup = 0.0
+
+        # Process-specific channels: mailboxes of (expires, message) filled
+        # by the poller, and the receive() calls waiting on them
+        self._loop = None
+        self._mailboxes: dict[str, deque] = {}
+        self._waiters: dict[str, asyncio.Future] = {}
+        self._poller = None
+        self._last_prune = 0.0
+
+    # ------------------------------------------------------------------
+    # Database (executor thread only)
+    # ------------------------------------------------------------------
+
+    def _db(self) -> sqlite3.Connection:
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _insert(self, rows: list[tuple[str, str]], strict: bool) -> None:
+        """
+        Insert (channel, body) rows, respecting capacity. A full channel
+        raises ChannelFull when strict (send) and is skipped otherwise
+        (group_send).
+        """
+        db = self._db()
+        now = time.time()
+        channels = sorted({channel for channel, _ in rows})
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            placeholders = ','.join('?' * len(channels))
+            depth = dict(db.execute(
+                f'SELECT channel, COUNT(*) FROM messages '
+                f'WHERE channel IN ({placeholders}) AND expires > ? GROUP BY channel',
+                (*channels, now),
+            ).fetchall())
+
+            accepted = []
+            for channel, body in rows:
+                if depth.get(channel, 0) >= self.get_capacity(channel):
+                    if strict:
+                        raise ChannelFull(channel)
+                    continue
+                depth[channel] = depth.get(channel, 0) + 1
+                owner = self.non_local_name(channel) if '!' in channel else None
+                accepted.append((channel, owner, body, now + self.expiry))
+
+            db.executemany(
+                'INSERT INTO messages (channel, owner, body, expires) VALUES (?, ?, ?, ?)',
+                accepted,
+            )
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+
+    def _take(self, column: str, value: str, limit: int) -> list[tuple[str, str]]:
+        """Delete and return up to `limit` live messages, oldest first."""
+        db = self._db()
+        now = time.time()
+        self._cleanup(db, now)
+        rows = db.execute(
+            f'DELETE FROM messages WHERE id IN ('
+            f'SELECT id FROM messages WHERE {column} = ? AND expires > ? ORDER BY id LIMIT ?'
+            f') RETURNING id, channel, body',
+            (value, now, limit),
+        ).fetchall()
+        # RETURNING order is unspecified
+        return [(channel, body) for _, channel, body in sorted(rows)]
+
+    def _cleanup(self, db: sqlite3.Connection, now: float) -> None:
+        if now - self._last_cleanup < CLEANUP_INTERVAL:
+            return
+        self._last_cleanup = now
+        db.execute('DELETE FROM messages WHERE expires <= ?', (now,))
+        db.execute('DELETE FROM groups WHERE expires <= ?', (now,))
+
+    def _group_channels(self, group: str) -> list[str]:
+        return [
+            row[0] for row in self._db().execute(
+                'SELECT channel FROM groups WHERE grp = ? AND expires > ?', (group, time.time())
+            )
+        ]
+
+    def _group_add(self, group: str, channel: str) -> None:
+        self._db().execute(
+            'INSERT INTO groups (grp, channel, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (grp, channel) DO UPDATE SET expires = excluded.expires',
+            (group, channel, time.time() + self.group_expiry),
+        )
+
+    def _group_discard(self, group: str, channel: str) -> None:
+        self._db().execute('DELETE FROM groups WHERE grp = ? AND channel = ?', (group, channel))
+
+    def _flush(self) -> None:
+        db = self._db()
+        db.execute('DELETE FROM messages')
+        db.execute('DELETE FROM groups')
+
+    # ------------------------------------------------------------------
+    # Channel layer API
+    # ------------------------------------------------------------------
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_channel_name(channel)
+        assert '__asgi_channel__' not in message
+        await self._run(self._insert, [(channel, _encode(message))], True)
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+
+        if channel.startswith(self.client_prefix):
+            return await self._receive_local(channel)
+
+        delay = self.poll_interval
+        while True:
+            try:
+                rows = await self._run(self._take, 'channel', channel, 1)
+            except sqlite3.OperationalError:
+                # Locked by another process's write burst; try again
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, LOCKED_RETRY_MAX)
+                continue
+            if rows:
+                return _decode(rows[0][1])
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_poll_interval)
+
+    async def new_channel(self, prefix='specific'):
+        suffix = ''.join(random.choices(string.ascii_letters, k=12))
+        return f'{self.client_prefix}{prefix}.{suffix}'
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._run(self._group_add, group, channel)
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._run(self._group_discard, group, channel)
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_group_name(group)
+        channels = await self._run(self._group_channels, group)
+        if channels:
+            body = _encode(message)
+            await self._run(self._insert, [(channel, body) for channel in channels], False)
+
+    async def flush(self):
+        self._mailboxes.clear()
+        await self._run(self._flush)
+
+    async def close(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+
+    # ------------------------------------------------------------------
+    # Poller for this process's channels
+    # ------------------------------------------------------------------
+
+    async def _receive_local(self, channel: str) -> dict:
+        while True:
+            # Every wait, not just the first: a poller that died must not strand receivers
+            self._ensure_poller()
+            mailbox = self._mailboxes.get(channel)
+            now = time.time()
+            while mailbox:
+                expires, message = mailbox.popleft()
+                if expires > now:
+                    if not mailbox:
+                        del self._mailboxes[channel]
+                    return message
+            self._mailboxes.pop(channel, None)
+
+            waiter = self._waiters[channel] = self._loop.create_future()
+            try:
+                await waiter
+            finally:
+                if self._waiters.get(channel) is waiter:
+                    del self._waiters[channel]
+
+    def _ensure_poller(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Waiters belong to a loop; start over on a new one (tests, reloads)
+            self._loop = loop
+            self._mailboxes = {}
+            self._waiters = {}
+            self._poller = None
+        if self._poller is None or self._poller.done():
+            self._poller = loop.create_task(self._poll())
+            self._poller.add_done_callback(self._poller_done)
+
+    def _poller_done(self, task: asyncio.Task) -> None:
+        """The poller ended: wake every waiter so its receive() starts a new one."""
+        if task.cancelled():
+            return
+        task.exception()  # Retrieved here; the next poller takes over
+        for waiter in self._waiters.values():
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def _poll(self) -> None:
+        delay = self.poll_interval
+        while True:
+            try:
+                rows = await self._run(self._take, 'owner', self.client_prefix, BATCH_SIZE)
+            except sqlite3.OperationalError:
+                # Locked by another process's write burst; try again
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, LOCKED_RETRY_MAX)
+                continue
+            expires = time.time() + self.expiry
+            for channel, body in rows:
+                self._mailboxes.setdefault(channel, deque()).append((expires, _decode(body)))
+                waiter = self._waiters.get(channel)
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(None)
+            self._prune()
+
+            if len(rows) == BATCH_SIZE:
+                delay = self.poll_interval
+                continue
+            delay = self.poll_interval if rows else min(delay * 2, self.max_poll_interval)
+            await asyncio.sleep(delay)
+
+    def _prune(self) -> None:
+        """Drop mailboxes nobody has read from within `expiry` (closed consumers)."""
+        now = time.time()
+        if now - self._last_prune < CLEANUP_INTERVAL:
+            return
+        self._last_prune = now
+        for channel in [c for c, box in self._mailboxes.items() if box[-1][0] <= now]:
+            del self._mailboxes[channel]
@@ -79,9 +79,29 @@ WSGI_APPLICATION = "config.wsgi.application"
 ASGI_APPLICATION = "config.asgi.application"
 
 # Channels configuration
+# SQLite-backed layer (config/channel_layers.py): group messages reach every
+# server process on this host without an external broker.
 CHANNEL_LAYERS = {
     "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer"
+        "BACKEND": "config.channel_layers.SQLiteChannelLayer",
+        "CONFIG": {
+            "path": BASE_DIR / "channels.sqlite3",
+            "expiry": 60,
+            "capacity": 100,
+        },
+    }
+}
+
+
+# Cache
+# Shared by every server process on this host, like the channel layer: the
+# garage move library, move shop and move catalog generation are cached
+# here and invalidated from whichever process wrote the change.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / ".django_cache",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
     }
 }
 
@@ -7,6 +7,7 @@ import battleWebSocket from '../services/battleWebSocket';
 import {
   setConnected,
   setBattleState,
+  applyStatePatch,
   setTurnStart,
   setResourceDice,
   setDiceAllocated,
@@ -129,6 +130,7 @@ const Battle = () => {
       const actions = {
         setConnected,
         setBattleState,
+        applyStatePatch,
         setTurnStart,
         setResourceDice,
         setDiceAllocated,
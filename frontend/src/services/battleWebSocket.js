@@ -10,9 +10,16 @@ class BattleWebSocketService {
     this.socket = null;
     this.dispatch = null;
     this.battleId = null;
+    this.stateVersion = 0;
+    this.lastSeq = null;
+    this.turnNumber = null;
+    this.redirectUrl = null;
+    this.redirects = 0;
     this.reconnectAttempts = 0;
     this.maxReconnectAttempts = 5;
     this.reconnectDelay = 1000;
+    this.reconnectTimer = null;
+    this.catchUpPending = false;
   }
 
   /**
@@ -22,42 +29,71 @@ class BattleWebSocketService {
    * @param {object} actions - Redux action creators
    */
   connect(battleId, dispatch, actions) {
+    if (battleId !== this.battleId) {
+      this.lastSeq = null;
+    }
     this.battleId = battleId;
     this.dispatch = dispatch;
     this.actions = actions;
 
-    const url = `${WS_BASE_URL}/ws/battle/${battleId}/`;
+    // A worker_redirect points at the server process that owns the battle;
+    // use it once, later reconnects go through the load balancer again
+    const url = this.redirectUrl || `${WS_BASE_URL}/ws/battle/${battleId}/`;
+    this.redirectUrl = null;
+
+    // One connection attempt at a time: drop any scheduled retry
+    clearTimeout(this.reconnectTimer);
+    this.reconnectTimer = null;
 
-    this.socket = new WebSocket(url);
+    const socket = new WebSocket(url);
+    this.socket = socket;
 
-    this.socket.onopen = () => {
+    socket.onopen = () => {
+      if (socket !== this.socket) return;
       console.log('Battle WebSocket connected');
       this.reconnectAttempts = 0;
+      this.catchUpPending = false;
       dispatch(actions.setConnected(true));
 
-      // Request initial battle state
-      this.send({ type: 'battle_init' });
+      if (this.lastSeq === null) {
+        // Request initial battle state
+        this.send({ type: 'battle_init' });
+      } else {
+        // Back after a drop: only the messages missed since lastSeq
+        this.requestCatchUp(this.lastSeq);
+      }
     };
 
-    this.socket.onmessage = (event) => {
+    socket.onmessage = (event) => {
+      if (socket !== this.socket) return;
       this.handleMessage(event);
     };
 
-    this.socket.onclose = (event) => {
+    socket.onclose = (event) => {
+      // A socket already replaced (or disconnected) must not reconnect again
+      if (socket !== this.socket) return;
       console.log('Battle WebSocket closed:', event.code);
       dispatch(actions.setConnected(false));
 
+      if (this.redirectUrl) {
+        this.connect(battleId, dispatch, actions);
+        return;
+      }
+
       // Attempt reconnect if not a normal close
-      if (event.code !== 1000 && this.reconnectAttempts < this.maxReconnectAttempts) {
+      if (event.code !== 1000 && !this.reconnectTimer
+          && this.reconnectAttempts < this.maxReconnectAttempts) {
         this.reconnectAttempts++;
         console.log(`Reconnect attempt ${this.reconnectAttempts}/${this.maxReconnectAttempts}`);
-        setTimeout(() => {
+        this.reconnectTimer = setTimeout(() => {
+          this.reconnectTimer = null;
           this.connect(battleId, dispatch, actions);
         }, this.reconnectDelay * this.reconnectAttempts);
       }
     };
 
-    this.socket.onerror = (error) => {
+    socket.onerror = (error) => {
+      if (socket !== this.socket) return;
       console.error('Battle WebSocket error:', error);
       dispatch(actions.setError('WebSocket connection error'));
     };
@@ -67,11 +103,15 @@ class BattleWebSocketService {
    * Disconnect from the websocket.
    */
   disconnect() {
+    clearTimeout(this.reconnectTimer);
+    this.reconnectTimer = null;
     if (this.socket) {
       this.socket.close(1000, 'Client disconnect');
       this.socket = null;
     }
     this.battleId = null;
+    this.lastSeq = null;
+    this.catchUpPending = false;
     this.dispatch = null;
   }
 
@@ -87,6 +127,17 @@ class BattleWebSocketService {
     }
   }
 
+  /**
+   * Ask for the messages after lastSeq (or, with null, a full state),
+   * unless a catch-up is already on its way.
+   * @param {number|null} lastSeq - The last seq processed
+   */
+  requestCatchUp(lastSeq) {
+    if (this.catchUpPending) return;
+    this.catchUpPending = true;
+    this.send({ type: 'reconnect', last_seq: lastSeq });
+  }
+
   /**
    * Send a player action (move, switch, pass, gain_resource).
    * @param {string} actionType - 'move' | 'switch' | 'pass' | 'gain_resource'
@@ -95,6 +146,7 @@ class BattleWebSocketService {
   sendAction(actionType, actionData = {}) {
     this.send({
       type: 'action',
+      turn_number: this.turnNumber,
       action_type: actionType,
       action_data: actionData,
     });
@@ -107,6 +159,7 @@ class BattleWebSocketService {
   sendDiceAllocation(allocations) {
     this.send({
       type: 'dice_allocation',
+      turn_number: this.turnNumber,
       allocations,
     });
   }
@@ -118,6 +171,7 @@ class BattleWebSocketService {
   sendKoSwitchChoice(coreIndex) {
     this.send({
       type: 'ko_switch_choice',
+      turn_number: this.turnNumber,
       new_core_index: coreIndex,
     });
   }
@@ -132,12 +186,70 @@ class BattleWebSocketService {
 
     if (!dispatch || !actions) return;
 
+    // Game messages are sequenced per battle; replies (errors) are not
+    if (data.type === 'battle_state') {
+      this.lastSeq = data.seq;
+      this.catchUpPending = false;
+    } else if (data.seq !== undefined) {
+      if (data.seq <= this.lastSeq) {
+        // Already processed (catch-up overlapping live messages)
+        return;
+      }
+      if (data.seq !== this.lastSeq + 1) {
+        // Missed messages: the server resends them from lastSeq on
+        console.warn(`Message gap (${this.lastSeq} -> ${data.seq}), catching up`);
+        this.requestCatchUp(this.lastSeq);
+        return;
+      }
+      this.lastSeq = data.seq;
+      this.catchUpPending = false;
+    }
+
+    // Turn commands carry the turn they were made on; the server drops stale ones
+    if (data.type === 'battle_state') {
+      this.turnNumber = data.current_turn;
+    } else if (data.type === 'turn_start') {
+      this.turnNumber = data.turn_number;
+    }
+
+    if (data.type === 'battle_state') {
+      this.stateVersion = data.state_version;
+    } else if (data.state_patch) {
+      if (data.state_version !== this.stateVersion + 1) {
+        // Patch chain broken: ask for a fresh full state instead of patching
+        console.warn(`State version gap (${this.stateVersion} -> ${data.state_version}), resyncing`);
+        this.requestCatchUp(null);
+      } else {
+        this.stateVersion = data.state_version;
+        dispatch(actions.applyStatePatch(data));
+      }
+    }
+
     switch (data.type) {
+      case 'worker_redirect':
+        // The server closes this socket next; onclose reconnects here.
+        // Workers briefly disagree while one joins or leaves: after a few
+        // hops, fall back to the normal reconnect backoff.
+        if (this.redirects < 3) {
+          this.redirects++;
+          this.redirectUrl = data.url;
+        }
+        break;
+
+      case 'state_sync':
+        // State changed with no game message; the patch is applied above
+        break;
+
+      case 'command_coalesced':
+        // A retried command merged into the one already in progress
+        break;
+
       case 'connection_established':
         console.log('Connection established for battle:', data.battle_id);
         break;
 
       case 'battle_state':
+        this.redirects = 0;
         dispatch(actions.setBattleState(data));
         break;
 
@@ -0,0 +1,34 @@
+// frontend/src/services/statePatch.js
+/**
+ * Apply JSON-patch ops (replace / add / remove) from the battle server.
+ * Mutates `doc` in place, so it works on Immer drafts inside reducers.
+ */
+
+const unescape = (part) => part.replace(/~1/g, '/').replace(/~0/g, '~');
+
+export function applyPatch(doc, ops) {
+  for (const op of ops) {
+    const parts = op.path.split('/').slice(1).map(unescape);
+    let parent = doc;
+    for (const part of parts.slice(0, -1)) {
+      parent = Array.isArray(parent) ? parent[Number(part)] : parent[part];
+    }
+    const last = parts[parts.length - 1];
+
+    if (Array.isArray(parent)) {
+      if (op.op === 'add') {
+        if (last === '-') parent.push(op.value);
+        else parent.splice(Number(last), 0, op.value);
+      } else if (op.op === 'remove') {
+        parent.splice(Number(last), 1);
+      } else {
+        parent[Number(last)] = op.value;
+      }
+    } else if (op.op === 'remove') {
+      delete parent[last];
+    } else {
+      parent[last] = op.value;
+    }
+  }
+  return doc;
+}
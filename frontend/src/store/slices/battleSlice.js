@@ -1,6 +1,7 @@
 // frontend/src/store/slices/battleSlice.js
 import { createSlice, createAsyncThunk } from '@reduxjs/toolkit';
 import api from '../../services/api';
+import { applyPatch } from '../../services/statePatch';
 
 // Async thunk to start a battle
 export const startBattle = createAsyncThunk(
@@ -24,6 +25,7 @@ const initialState = {
   enemyTeam: null,
 
   currentTurn: 0,
+  stateVersion: 0,
   pendingDiceRolls: [],
   turnLog: [],
 
@@ -76,12 +78,29 @@ const battleSlice = createSlice({
       state.currentTurn = data.current_turn;
       state.npcId = data.npc_id;
       state.npcName = data.npc_name;
+      state.stateVersion = data.state_version;
 
       if (data.status === 'COMPLETED') {
         state.status = 'ended';
       }
     },
 
+    // Apply a versioned state patch (sent alongside game messages)
+    applyStatePatch: (state, action) => {
+      const { state_version, state_patch } = action.payload;
+      const doc = {
+        status: null,
+        current_turn: state.currentTurn,
+        player_team: state.playerTeam,
+        enemy_team: state.enemyTeam,
+      };
+      applyPatch(doc, state_patch);
+      state.playerTeam = doc.player_team;
+      state.enemyTeam = doc.enemy_team;
+      state.currentTurn = doc.current_turn;
+      state.stateVersion = state_version;
+    },
+
     // Turn start - free resource turn (turn 1) goes to dice phase, normal turns go to action select
     setTurnStart: (state, action) => {
       const { turn_number, is_free_resource_turn, player_dice, enemy_dice } = action.payload;
@@ -113,16 +132,10 @@ const battleSlice = createSlice({
     },
 
     // Dice allocated - on turn 1 server will start turn 2; on turn 2+ server will send action_result
-    setDiceAllocated: (state, action) => {
-      const { player_pools, enemy_pools, battle_state } = action.payload;
+    // (pools arrive in the message's state patch)
+    setDiceAllocated: (state) => {
       state.pendingDiceRolls = [];
       state.phase = 'action_select';
-
-      // Update pools from battle_state
-      if (battle_state) {
-        state.playerTeam = battle_state.player_team;
-        state.enemyTeam = battle_state.enemy_team;
-      }
     },
 
     // Move selected by player
@@ -132,17 +145,11 @@ const battleSlice = createSlice({
 
     // Action result received
     setActionResult: (state, action) => {
-      const { player_action, enemy_action, battle_state } = action.payload;
+      const { player_action, enemy_action } = action.payload;
       state.lastPlayerAction = player_action;
       state.lastEnemyAction = enemy_action;
       state.phase = 'resolution';
 
-      // Update battle state
-      if (battle_state) {
-        state.playerTeam = battle_state.player_team;
-        state.enemyTeam = battle_state.enemy_team;
-      }
-
       // Add to turn log
       state.turnLog.push({
         type: 'action',
@@ -192,17 +199,12 @@ const battleSlice = createSlice({
 
     // Battle ended
     setBattleEnd: (state, action) => {
-      const { result, rewards, battle_state } = action.payload;
+      const { result, rewards } = action.payload;
       state.result = result;
       state.rewards = rewards;
       state.status = 'ended';
       state.phase = 'waiting';
 
-      if (battle_state) {
-        state.playerTeam = battle_state.player_team;
-        state.enemyTeam = battle_state.enemy_team;
-      }
-
       state.turnLog.push({
         type: 'battle_end',
         result,
@@ -211,23 +213,10 @@ const battleSlice = createSlice({
       });
     },
 
-    // Status effect tick events (regen, expirations)
+    // Status effect tick events (regen, expirations); HP changes arrive in the state patch
     setEffectTick: (state, action) => {
       const { events } = action.payload;
 
-      // Update HP from heal events
-      for (const evt of events || []) {
-        if (evt.type === 'heal') {
-          if (evt.team === 'player' && state.playerTeam) {
-            const core = state.playerTeam.cores.find(c => c.name === evt.core_name);
-            if (core) core.current_hp = Math.min(core.max_hp, core.current_hp + evt.amount);
-          } else if (evt.team === 'enemy' && state.enemyTeam) {
-            const core = state.enemyTeam.cores.find(c => c.name === evt.core_name);
-            if (core) core.current_hp = Math.min(core.max_hp, core.current_hp + evt.amount);
-          }
-        }
-      }
-
       if (events && events.length > 0) {
         state.turnLog.push({
           type: 'effect_tick',
@@ -271,6 +260,7 @@ export const {
   setConnected,
   setBattleId,
   setBattleState,
+  applyStatePatch,
   setTurnStart,
   setResourceDice,
   setDiceAllocated,
@@ -292,6 +282,7 @@ export const selectBattleStatus = (state) => state.battle.status;
 export const selectBattlePhase = (state) => state.battle.phase;
 export const selectPlayerTeam = (state) => state.battle.playerTeam;
 export const selectEnemyTeam = (state) => state.battle.enemyTeam;
+export const selectStateVersion = (state) => state.battle.stateVersion;
 export const selectCurrentTurn = (state) => state.battle.currentTurn;
 export const selectPendingDiceRolls = (state) => state.battle.pendingDiceRolls;
 export const selectTurnLog = (state) => state.battle.turnLog;